@@ -9,12 +9,17 @@ from prompt_toolkit.key_binding.bindings.auto_suggest import load_auto_suggest_b
 from prompt_toolkit.application import Application
 from prompt_toolkit.key_binding.bindings.focus import focus_next
 from prompt_toolkit.filters import Condition, has_focus
-from logging.handlers import RotatingFileHandler
 from cyanodbc import datasources
 from .sidebar import myDBConn, myDBObject
 from .conn import sqlConnection
+from .cache import resultCache
+from .keepalive import keepalive
+from .jobs import jobManager
+from .querylog import get_query_log
 from .completion.mssqlcompleter import MssqlCompleter
-from .config import get_config, config_location, ensure_dir_exists
+from .config import config_location, get_config, get_query_timeout, get_spool_dir, initialize_logging
+from .capabilities import capabilityStore
+from .mdcache import get_metadata_cache
 from .odbcstyle import style_factory
 from .layout import sqlAppLayout
 
@@ -30,13 +35,38 @@ class sqlApp:
         self.initialize_logging()
         self.set_default_pager(c)
         self.preview_limit_rows = c["main"].as_int("preview_limit_rows")
+        self.preview_cache = resultCache(
+                ttl = c["main"].as_float("preview_cache_ttl"),
+                max_bytes = c["main"].as_int("preview_cache_mb") * 1024 * 1024) \
+            if c["main"].as_bool("preview_cache") else None
+        self.preview_memory_pages = c["main"].as_int("preview_memory_pages")
+        self.spool_dir = get_spool_dir(c)
         self.pager_reserve_lines = c["main"].as_int("pager_reserve_lines")
+        self.external_pager = c["main"].as_bool("external_pager")
         self.table_format = c["main"]["table_format"]
+        self.fetch_batch_size = c["main"].as_int("fetch_batch_size")
+        self.fetch_buffer_mb = c["main"].as_int("fetch_buffer_mb")
+        self.fetch_target_latency = c["main"].as_float("fetch_target_latency")
+        self.prefetch_pages = c["main"].as_int("prefetch_pages")
+        self.max_column_width = c["main"].as_int("max_column_width")
         self.timing_enabled = c["main"].as_bool("timing")
+        # Phase breakdown after every query; see \timing verbose
+        self.timing_verbose = False
+        self.query_log = get_query_log(c)
         self.syntax_style = c["main"]["syntax_style"]
         self.cli_style = c["colors"]
         self.multiline: bool = c["main"].as_bool("multi_line")
         self.min_num_menu_lines = c["main"].as_int("min_num_menu_lines")
+        self.metadata_connection = c["main"].as_bool("metadata_connection")
+        self.prepared_cache_size = c["main"].as_int("prepared_cache_size")
+        self.load_batch_size = c["main"].as_int("load_batch_size")
+        self.load_commit_interval = c["main"].as_int("load_commit_interval")
+        self.keepalive_interval = c["main"].as_float("keepalive_interval")
+        self.reconnect_max_backoff = c["main"].as_float("reconnect_max_backoff")
+        self.capability_store = capabilityStore(config_location() + "capabilities.json")
+        self.metadata_cache = get_metadata_cache(c)
+        # Statements registered with \prepare, by name
+        self.statements = {}
 
         self.show_exit_confirmation: bool = False
         self.exit_message: str = "Do you really want to exit?"
@@ -46,6 +76,7 @@ class sqlApp:
         self.show_sidebar: bool = True
         self.show_login_prompt: bool = False
         self.show_preview: bool = False
+        self.show_results: bool = False
         self.show_disconnect_dialog: bool = False
         self.active_conn = None
         self.obj_list = []
@@ -55,7 +86,13 @@ class sqlApp:
         for dsn in dsns:
             self.obj_list.append(myDBConn(
                 my_app = self,
-                conn = sqlConnection(dsn = dsn),
+                conn = sqlConnection(
+                    dsn = dsn,
+                    metadata_conn = self.metadata_connection,
+                    prepared_cache_size = self.prepared_cache_size,
+                    query_timeout = get_query_timeout(c, dsn),
+                    capability_store = self.capability_store,
+                    metadata_cache = self.metadata_cache),
                 name = dsn,
                 otype = "Connection"))
         for i in range(len(self.obj_list) - 1):
@@ -66,6 +103,23 @@ class sqlApp:
         self.completer = MssqlCompleter(smart_completion=True, my_app = self)
 
         self.application = self._create_application()
+        self.keepalive = keepalive(
+                conns = lambda: [obj.conn for obj in self.obj_list],
+                interval = self.keepalive_interval,
+                max_backoff = self.reconnect_max_backoff,
+                on_change = self.application.invalidate)
+        if self.keepalive_interval > 0:
+            self.keepalive.start()
+        self.jobs = jobManager(
+                batch_size = self.fetch_batch_size,
+                spool_dir = self.spool_dir,
+                on_change = self.application.invalidate)
+
+    def log_query(self, sql_conn, source: str) -> None:
+        """ Record the statement last executed on sql_conn in the query log,
+            if enabled """
+        if self.query_log is not None:
+            self.query_log.log(sql_conn.metrics, sql_conn.current_catalog(), source)
 
     @property
     def selected_object(self) -> myDBObject:
@@ -130,44 +184,7 @@ class sqlApp:
             os.environ["LESS"] = "-SRXF"
 
     def initialize_logging(self):
-        log_file = self.config['main']['log_file']
-        if log_file == 'default':
-            log_file = config_location() + 'odbcli.log'
-        ensure_dir_exists(log_file)
-        log_level = self.config['main']['log_level']
-
-        # Disable logging if value is NONE by switching to a no-op handler.
-        # Set log level to a high value so it doesn't even waste cycles getting
-        # called.
-        if log_level.upper() == 'NONE':
-            handler = logging.NullHandler()
-        else:
-            # creates a log buffer with max size of 20 MB and 5 backup files
-            handler = RotatingFileHandler(os.path.expanduser(log_file),
-                    encoding='utf-8', maxBytes=1024*1024*20, backupCount=5)
-
-        level_map = {'CRITICAL': logging.CRITICAL,
-                     'ERROR': logging.ERROR,
-                     'WARNING': logging.WARNING,
-                     'INFO': logging.INFO,
-                     'DEBUG': logging.DEBUG,
-                     'NONE': logging.CRITICAL
-                     }
-
-        log_level = level_map[log_level.upper()]
-
-        formatter = logging.Formatter(
-            '%(asctime)s (%(process)d/%(threadName)s) '
-            '%(name)s %(levelname)s - %(message)s')
-
-        handler.setFormatter(formatter)
-
-        root_logger = logging.getLogger('odbcli')
-        root_logger.addHandler(handler)
-        root_logger.setLevel(log_level)
-
-        root_logger.info('Initializing odbcli logging.')
-        root_logger.debug('Log file %r.', log_file)
+        initialize_logging(self.config)
         self.logger = logging.getLogger(__name__)
 
     def _create_application(self) -> Application:
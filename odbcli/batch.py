@@ -0,0 +1,172 @@
+""" Non-interactive execution: connect to a single DSN, execute a query or
+    script and stream the results to stdout.  Deliberately does not import
+    prompt_toolkit, or anything in the interactive client (app, layout,
+    completion). """
+import sys
+from logging import getLogger
+from time import thread_time
+from typing import IO, Optional
+from cyanodbc import ConnectError
+from .conn import sqlConnection, executionStatus
+from .writers import get_writer, check_format, binaryWriterClasses
+from .export import export_query, format_for_path, ExportError
+from .config import config_location, get_query_timeout
+from .capabilities import capabilityStore
+from .querylog import get_query_log
+from .script import run_script
+
+logger = getLogger(__name__)
+
+def run_batch(
+        config,
+        dsn: str,
+        query: Optional[str] = None,
+        script: Optional[str] = None,
+        username: str = "",
+        password: str = "",
+        format_name: Optional[str] = None,
+        output_file: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_error: str = "stop",
+        output: IO = sys.stdout,
+        errors: IO = sys.stderr) -> int:
+    """ Returns the process exit code.  timeout, in seconds, overrides the
+        configured query timeout for the DSN.  Scripts are split into
+        batches on GO lines and executed one batch at a time; on_error,
+        stop or continue, decides what happens after a batch fails. """
+    batch_size = config["main"].as_int("fetch_batch_size")
+    if format_name is not None:
+        try:
+            check_format(format_name)
+        except ValueError as e:
+            errors.write("%s\n" % str(e))
+            return 2
+    if output_file is None and format_name in binaryWriterClasses.keys():
+        errors.write("%s output needs a file; use -o\n" % format_name)
+        return 2
+    if script is not None and output_file is not None:
+        # Result sets of a script may differ in shape; only text formats
+        # can hold more than one
+        format_name = format_name or format_for_path(
+                output_file, config["main"]["table_format"])
+        if format_name in binaryWriterClasses.keys():
+            errors.write("Unable to write the results of a script as %s; "
+                    "use -e, or a text format\n" % format_name)
+            return 2
+
+    query_log = get_query_log(config)
+    sql_conn = sqlConnection(
+            dsn = dsn,
+            query_timeout = get_query_timeout(config, dsn) if timeout is None else timeout,
+            capability_store = capabilityStore(config_location() + "capabilities.json"))
+    try:
+        sql_conn.connect(username = username, password = password)
+    except ConnectError as e:
+        errors.write("Unable to connect to %s: %s\n" % (dsn, str(e)))
+        return 2
+
+    try:
+        if script is not None:
+            format_name = format_name or config["main"]["table_format"]
+            max_col_width = config["main"].as_int("max_column_width")
+            with open(script, "r", encoding = "utf-8") as f:
+                if output_file is None:
+                    return _run_script(sql_conn, f, format_name, batch_size,
+                            max_col_width, on_error == "stop", query_log,
+                            output, errors)
+                with open(output_file, "w", newline = "", encoding = "utf-8") as out:
+                    return _run_script(sql_conn, f, format_name, batch_size,
+                            max_col_width, on_error == "stop", query_log,
+                            out, errors)
+        if output_file is not None:
+            try:
+                export_query(
+                    sql_conn,
+                    query = query,
+                    path = output_file,
+                    format_name = format_name,
+                    default_format = config["main"]["table_format"],
+                    batch_size = batch_size)
+            except (ExportError, ValueError, OSError) as e:
+                errors.write("%s\n" % str(e))
+                return 1
+            return 0
+        format_name = format_name or config["main"]["table_format"]
+        max_col_width = config["main"].as_int("max_column_width")
+        return _execute(sql_conn, query, format_name, batch_size,
+                max_col_width, output, errors)
+    except KeyboardInterrupt:
+        errors.write("Cancelling query...\n")
+        sql_conn.cancel()
+        return 130
+    finally:
+        if query_log is not None:
+            query_log.log(sql_conn.metrics, sql_conn.current_catalog(), "batch")
+            query_log.close()
+        sql_conn.close_cursor()
+        sql_conn.close()
+
+def _execute(sql_conn, query, format_name, batch_size, max_col_width, output, errors) -> int:
+    crsr = sql_conn.async_execute(query)
+    if sql_conn.execution_status == executionStatus.FAIL:
+        errors.write("Query error: %s\n" % sql_conn.execution_err)
+        return 1
+    if not crsr.description:
+        return 0
+    _write_results(sql_conn, crsr, format_name, batch_size, max_col_width, output)
+    return 0
+
+def _write_results(sql_conn, crsr, format_name, batch_size, max_col_width, output) -> bool:
+    """ Stream the result set of crsr to output.  Returns False if output
+        was closed before all rows were written. """
+    cols = [col.name for col in crsr.description]
+    writer = get_writer(format_name, output, cols, crsr.description,
+            max_col_width = max_col_width)
+    try:
+        writer.write_header()
+        while True:
+            rows = sql_conn.async_fetchmany(batch_size)
+            if len(rows) < 1:
+                break
+            start = thread_time()
+            writer.write_rows(rows)
+            if sql_conn.metrics is not None:
+                sql_conn.metrics.format_time += thread_time() - start
+        writer.close()
+    except BrokenPipeError:
+        # Downstream consumer (head, for example) went away; not an error
+        logger.debug("Output closed after %d rows", writer.rows_written)
+        sql_conn.cancel()
+        return False
+    logger.debug("Wrote %d rows", writer.rows_written)
+    return True
+
+def _run_script(sql_conn, f, format_name, batch_size, max_col_width,
+        stop_on_error, query_log, output, errors) -> int:
+    """ Execute the batches of the script in f, writing each result set to
+        output, and a line per batch to errors """
+    def _on_result(batch, crsr):
+        try:
+            if sql_conn.execution_status == executionStatus.FAIL \
+                    or not crsr.description:
+                return True
+            return _write_results(sql_conn, crsr, format_name, batch_size,
+                    max_col_width, output)
+        finally:
+            if query_log is not None:
+                query_log.log(sql_conn.metrics, sql_conn.current_catalog(), "batch")
+
+    def _progress(n, batch, elapsed, err):
+        if err is None:
+            errors.write("Batch %d (line %d): %0.3fs\n" % (n, batch.line, elapsed))
+        else:
+            errors.write("Batch %d (line %d): %0.3fs, query error: %s\n" % (
+                n, batch.line, elapsed, err))
+        errors.flush()
+
+    res = run_script(sql_conn, f, stop_on_error = stop_on_error,
+            on_result = _on_result, progress = _progress)
+    errors.write("%d batches, %d failed, %0.3fs%s\n" % (
+        res.batches, res.failed, res.elapsed,
+        " (stopped)" if res.stopped and res.failed else ""))
+    return 1 if res.failed else 0
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from typing import Hashable, List, Optional
+from .fetch import estimate_row_bytes
+
+class cacheEntry:
+    """ Rows fetched so far for a query.  complete is set once the result
+        set has been exhausted. """
+    def __init__(self, cols: List[str]) -> None:
+        self.cols = cols
+        self.rows: list = []
+        self.nbytes: int = 0
+        self.complete: bool = False
+        self.created: float = time()
+
+    @property
+    def age(self) -> float:
+        return time() - self.created
+
+class resultCache:
+    """ Size bounded, least recently used, cache of query results.  Entries
+        older than ttl seconds are dropped on access; least recently used
+        entries are evicted once the estimated size of all cached rows
+        exceeds max_bytes. """
+    def __init__(self, ttl: float = 300, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.nbytes: int = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[cacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.age > self.ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def start(self, key: Hashable, cols: List[str]) -> cacheEntry:
+        """ New, empty, entry for key, replacing any existing one """
+        with self._lock:
+            self._remove(key)
+            entry = cacheEntry(cols)
+            self._entries[key] = entry
+            return entry
+
+    def extend(self, key: Hashable, rows: list, complete: bool = False) -> None:
+        nbytes = int(estimate_row_bytes(rows) * len(rows))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.rows.extend(rows)
+            entry.nbytes += nbytes
+            entry.complete = complete
+            self.nbytes += nbytes
+            self._entries.move_to_end(key)
+            while self.nbytes > self.max_bytes and len(self._entries):
+                # Evicts key itself if it alone exceeds the budget
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
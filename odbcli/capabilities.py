@@ -0,0 +1,58 @@
+""" Persisted driver capability profiles.  Everything sqlConnection learns
+    about a driver / server through SQLGetInfo at connect is saved here, so
+    that later connections to the same DSN skip the probing. """
+import json
+import os
+from logging import getLogger
+from threading import Lock
+from typing import Optional
+from .config import ensure_dir_exists
+
+class capabilityStore:
+    """ JSON file of profiles, each a dict of SQLGetInfo name to value.
+        Profiles are keyed by DSN, driver name and version, and DBMS
+        version: upgrading either makes for a new profile. """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.logger = getLogger(__name__)
+        self._lock = Lock()
+        self._profiles: Optional[dict] = None
+
+    @staticmethod
+    def key(dsn: str, driver_name, driver_ver, dbms_ver) -> str:
+        return "|".join(str(v) for v in (dsn, driver_name, driver_ver, dbms_ver))
+
+    def _load(self) -> dict:
+        """ Expects _lock to be held """
+        if self._profiles is None:
+            self._profiles = {}
+            try:
+                with open(self.path, "r", encoding = "utf-8") as f:
+                    profiles = json.load(f)
+                if isinstance(profiles, dict):
+                    self._profiles = profiles
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                self.logger.warning("Ignoring capability cache %s: %s", self.path, str(e))
+        return self._profiles
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            profile = self._load().get(key)
+        return dict(profile) if profile is not None else None
+
+    def put(self, key: str, profile: dict) -> None:
+        """ Failing to save is logged, not raised: the profile is then
+            probed again next time """
+        with self._lock:
+            profiles = self._load()
+            profiles[key] = profile
+            tmp = self.path + ".tmp"
+            try:
+                ensure_dir_exists(self.path)
+                with open(tmp, "w", encoding = "utf-8") as f:
+                    json.dump(profiles, f, indent = 1, sort_keys = True)
+                os.replace(tmp, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                self.logger.warning("Unable to save capability cache %s: %s", self.path, str(e))
@@ -4,18 +4,126 @@ A simple example of a calculator program.
 This could be used as inspiration for a REPL.
 """
 import os
-from sys import stderr
+import sys
 from time import time
-from cyanodbc import DatabaseError, datasources
+import click
 from click import echo_via_pager, secho
-from prompt_toolkit.patch_stdout import patch_stdout
-from prompt_toolkit.utils import get_cwidth
-from .app import sqlApp, ExitEX
-from .layout import sqlAppLayout
 from .conn import connStatus, executionStatus
+from .fetch import fetchSizer
+from .config import get_config, initialize_logging
 
 
-def main():
+@click.command()
+@click.option("--dsn", default = None,
+        help = "Data source to connect to; required with -e / -f.")
+@click.option("-u", "--username", default = "", help = "Username.")
+@click.option("-p", "--password", default = "", envvar = "ODBCLI_PASSWORD",
+        help = "Password (or set ODBCLI_PASSWORD).")
+@click.option("-e", "--execute", "query", default = None,
+        help = "Execute the query, write the results to stdout and exit.")
+@click.option("-f", "--file", "script", default = None,
+        type = click.Path(exists = True, dir_okay = False),
+        help = "Execute the script, batch by batch (split on GO lines), "
+        "write the results to stdout and exit.")
+@click.option("--format", "format_name", default = None,
+        help = "Output format in batch mode: csv, tsv, jsonl, parquet, arrow "
+        "or any table_format.  Defaults to table_format.")
+@click.option("-o", "--output", "output_file", default = None,
+        type = click.Path(dir_okay = False, writable = True),
+        help = "In batch mode, write the results to this file instead of "
+        "stdout.  Format is inferred from the extension unless --format "
+        "is given.")
+@click.option("--timeout", default = None, type = float,
+        help = "In batch mode, cancel statements executing for longer than "
+        "this many seconds.  Defaults to the configured query_timeout.")
+@click.option("--on-error", default = None,
+        type = click.Choice(["stop", "continue"]),
+        help = "With -f, whether to stop at the first failing batch, or "
+        "carry on with the rest of the script.  Defaults to stop.")
+@click.option("--report", is_flag = True, default = False,
+        help = "Print a slow query report from the query log and exit.")
+@click.option("--since", default = 0, type = float,
+        help = "With --report, only include queries from the last this many "
+        "days.")
+@click.option("--top", default = 20, type = int,
+        help = "With --report, number of statements to list.")
+def main(dsn, username, password, query, script, format_name, output_file,
+        timeout, on_error, report, since, top):
+    if report:
+        from .slowlog import slow_query_report
+        from .querylog import query_log_path
+        click.echo(slow_query_report(
+            query_log_path(get_config()), since_days = since, top = top))
+        return
+
+    if query is not None and script is not None:
+        raise click.UsageError("-e and -f are mutually exclusive")
+    if query is None and script is None:
+        batch_only = [opt for opt, value in (
+            ("--format", format_name), ("-o / --output", output_file),
+            ("--timeout", timeout), ("--on-error", on_error))
+            if value is not None]
+        if len(batch_only):
+            raise click.UsageError("%s only apply with -e / -f" %
+                    ", ".join(batch_only))
+
+    if query is not None or script is not None:
+        if dsn is None:
+            raise click.UsageError("--dsn is required with -e / -f")
+        from .batch import run_batch
+        config = get_config()
+        initialize_logging(config)
+        sys.exit(run_batch(
+            config,
+            dsn = dsn,
+            query = query,
+            script = script,
+            username = username,
+            password = password,
+            format_name = format_name,
+            output_file = output_file,
+            timeout = timeout,
+            on_error = on_error or "stop"))
+
+    interactive()
+
+
+def show_results(my_app: "sqlApp", sql_conn, crsr) -> None:
+    """ Page through the results of the query last executed on sql_conn """
+    if sql_conn.execution_status == executionStatus.FAIL:
+        err = sql_conn.execution_err
+        secho("Query error: %s\n" % err, err = True, fg = "red")
+        return
+    if crsr.description:
+        cols = [col.name for col in crsr.description]
+    else:
+        cols = []
+    if len(cols):
+        ht = my_app.application.output.get_size()[0]
+        page_size = ht - 3 - my_app.pager_reserve_lines
+        sizer = fetchSizer(
+                initial = page_size,
+                max_bytes = my_app.fetch_buffer_mb * 1024 * 1024,
+                target_latency = my_app.fetch_target_latency)
+        formatted = sql_conn.formatted_fetch(
+                page_size, cols, my_app.table_format, sizer,
+                prefetch_pages = my_app.prefetch_pages,
+                max_col_width = my_app.max_column_width)
+        sql_conn.status = connStatus.FETCHING
+        start = time()
+        echo_via_pager(formatted)
+        if sql_conn.metrics is not None:
+            sql_conn.metrics.pager_time = time() - start
+    else:
+        secho("No rows returned\n", err = False)
+    if my_app.timing_verbose and sql_conn.metrics is not None:
+        print(sql_conn.metrics.summary())
+
+
+def interactive():
+    # Imported here: batch mode should not pay for prompt_toolkit
+    from .app import sqlApp, ExitEX
+    from . import special
 
     my_app = sqlApp()
 #    with patch_stdout():
@@ -23,16 +131,52 @@ def main():
         try:
             app_res = my_app.application.run()
         except ExitEX:
+            my_app.keepalive.stop()
+            my_app.jobs.close()
+            if my_app.query_log is not None:
+                my_app.query_log.close()
+            if my_app.metadata_cache is not None:
+                my_app.metadata_cache.close()
             for i in range(len(my_app.obj_list)):
                 my_app.obj_list[i].conn.close()
             return
         else:
-            # If it's a preview query we need an indication
-            # of where to run the query
-            if(app_res[0] == "preview"):
-                sql_conn = my_app.selected_object.conn
-            else:
-                sql_conn = my_app.active_conn
+            if special.is_special_command(app_res[1]):
+                # Commands that execute a query return the connection and
+                # cursor, for us to page through the results
+                res = None
+                try:
+                    res = special.execute(my_app, app_res[1])
+                    if res is not None:
+                        show_results(my_app, *res)
+                except special.CommandError as e:
+                    secho(str(e), err = True, fg = "red")
+                except KeyboardInterrupt:
+                    # Commands cancel the statements they wait on, and
+                    # release their connection, themselves; see
+                    # special._interruptible.  Here, it can only be the
+                    # results of one that were interrupted.
+                    if res is not None:
+                        secho("Cancelling query...", err = True, fg = "red")
+                        res[0].cancel()
+                        secho("Query cancelled.", err = True, fg = "red")
+                    else:
+                        secho("Command interrupted.", err = True, fg = "red")
+                if res is not None:
+                    my_app.log_query(res[0], "main")
+                    res[0].status = connStatus.IDLE
+                    res[0].close_cursor()
+                continue
+            # Table previews, and with external_pager off queries too, are
+            # executed without leaving the application; see preview and
+            # viewer
+            sql_conn = my_app.active_conn
+            if sql_conn is not None and \
+                    my_app.jobs.running_on(sql_conn) is not None:
+                secho("%s is busy with background job %d; see \\jobs" %
+                        (sql_conn.dsn, my_app.jobs.running_on(sql_conn).id),
+                        err = True, fg = "red")
+                continue
             if sql_conn is not None:
                 #TODO also check that it is connected
                 try:
@@ -41,29 +185,13 @@ def main():
                     crsr = sql_conn.async_execute(app_res[1])
                     execution = time() - start
                     secho("Query execution...done", err = False)
-                    if(app_res[0] == "preview"):
-                        continue
                     if my_app.timing_enabled:
                         print("Time: %0.03fs" % execution)
-
-                    if sql_conn.execution_status == executionStatus.FAIL:
-                        err = sql_conn.execution_err
-                        secho("Query error: %s\n" % err, err = True, fg = "red")
-                    else:
-                        if crsr.description:
-                            cols = [col.name for col in crsr.description]
-                        else:
-                            cols = []
-                        if len(cols):
-                            ht = my_app.application.output.get_size()[0]
-                            formatted = sql_conn.formatted_fetch(ht - 3 - my_app.pager_reserve_lines, cols, my_app.table_format)
-                            sql_conn.status = connStatus.FETCHING
-                            echo_via_pager(formatted)
-                        else:
-                            secho("No rows returned\n", err = False)
+                    show_results(my_app, sql_conn, crsr)
                 except KeyboardInterrupt:
                     secho("Cancelling query...", err = True, fg = "red")
                     sql_conn.cancel()
                     secho("Query cancelled.", err = True, fg = "red")
+                my_app.log_query(sql_conn, "main")
                 sql_conn.status = connStatus.IDLE
                 sql_conn.close_cursor()
@@ -20,6 +20,7 @@ from .parseutils.utils import last_word
 from .parseutils.tables import TableReference
 from .mssqlliterals.main import get_literals
 from .prioritization import PrevalenceCounter
+from .. import special
 # from mssqlcli.util import decode
 
 Match = namedtuple('Match', ['completion', 'priority'])
@@ -910,8 +911,7 @@ class MssqlCompleter(Completer):
             yield Match(completion=c, priority=(0,))
 
     def get_special_matches(self, _, word_before_cursor):
-#        commands = special.main.COMMANDS
-        commands = {}
+        commands = special.COMMANDS
         cmds = commands.keys()
         cmds = [Candidate(cmd, 0, commands[cmd].description) for cmd in cmds]
         return self.find_matches(word_before_cursor, cmds, mode='strict')
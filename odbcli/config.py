@@ -2,6 +2,8 @@ import errno
 import shutil
 import os
 import platform
+import logging
+from logging.handlers import RotatingFileHandler
 from os.path import expanduser, exists, dirname
 from configobj import ConfigObj
 
@@ -55,3 +57,62 @@ def get_config(odbclirc_file=None):
     write_default_config(default_config, odbclirc_file)
 
     return load_config(odbclirc_file, default_config)
+
+
+def initialize_logging(config):
+    log_file = config['main']['log_file']
+    if log_file == 'default':
+        log_file = config_location() + 'odbcli.log'
+    ensure_dir_exists(log_file)
+    log_level = config['main']['log_level']
+
+    # Disable logging if value is NONE by switching to a no-op handler.
+    # Set log level to a high value so it doesn't even waste cycles getting
+    # called.
+    if log_level.upper() == 'NONE':
+        handler = logging.NullHandler()
+    else:
+        # creates a log buffer with max size of 20 MB and 5 backup files
+        handler = RotatingFileHandler(os.path.expanduser(log_file),
+                encoding='utf-8', maxBytes=1024*1024*20, backupCount=5)
+
+    level_map = {'CRITICAL': logging.CRITICAL,
+                 'ERROR': logging.ERROR,
+                 'WARNING': logging.WARNING,
+                 'INFO': logging.INFO,
+                 'DEBUG': logging.DEBUG,
+                 'NONE': logging.CRITICAL
+                 }
+
+    log_level = level_map[log_level.upper()]
+
+    formatter = logging.Formatter(
+        '%(asctime)s (%(process)d/%(threadName)s) '
+        '%(name)s %(levelname)s - %(message)s')
+
+    handler.setFormatter(formatter)
+
+    root_logger = logging.getLogger('odbcli')
+    root_logger.addHandler(handler)
+    root_logger.setLevel(log_level)
+
+    root_logger.info('Initializing odbcli logging.')
+    root_logger.debug('Log file %r.', log_file)
+
+
+def get_query_timeout(config, dsn):
+    """ Query timeout, in seconds, for dsn: from the [timeouts] section if
+        listed there, query_timeout otherwise """
+    if dsn in config["timeouts"].keys():
+        return config["timeouts"].as_float(dsn)
+    return config["main"].as_float("query_timeout")
+
+
+def get_spool_dir(config):
+    """ Directory for result spool files; None for the system default """
+    spool_dir = config["main"]["spool_dir"]
+    if spool_dir == "default":
+        return None
+    spool_dir = expanduser(spool_dir)
+    os.makedirs(spool_dir, exist_ok=True)
+    return spool_dir
@@ -1,20 +1,113 @@
 from enum import Enum
+from collections import OrderedDict
+from concurrent.futures import Future
 from cyanodbc import connect, Connection, SQLGetInfo, Cursor, DatabaseError, ConnectError
 from typing import Optional
 from cli_helpers.tabular_output import TabularOutputFormatter
 from logging import getLogger
-from re import sub
-from threading import Lock, Event, Thread
+from re import sub, compile as re_compile, IGNORECASE
+from contextlib import contextmanager
+from threading import Lock, local
+from time import time, thread_time
 from enum import IntEnum
+from .worker import connWorker
+from .fetch import fetchSizer, prefetch
+from .tableformat import streamingTableFormatter
+from .watchdog import get_watchdog
+from .metrics import queryMetrics, error_class, sqlstate
+from .capabilities import capabilityStore
+from .mdcache import metadataCache, tableRow, columnRow
+from sqlparse import parse as sqlparse_parse
 
 formatter = TabularOutputFormatter()
 
+# Statements after which the current catalog may have changed; erring on
+# the side of matching too much only costs one more driver call
+_attr_stmts = ("USE", "SET", "ALTER SESSION")
+# Statements after which cached catalog metadata may be out of date
+_ddl_stmts = ("CREATE", "DROP", "ALTER", "RENAME")
+# Cheap test for whether a query is worth parsing for the above
+_stmt_kw_re = re_compile(r"\b(?:use|set|alter|create|drop|rename)\b",
+        IGNORECASE)
+
+
+def _leading_keywords(query: str) -> list:
+    """ The first two words of every statement in query, comments skipped,
+        upper cased and joined by a space """
+    if not _stmt_kw_re.search(query):
+        return []
+    res = []
+    for stmt in sqlparse_parse(query):
+        idx, first = stmt.token_next(-1, skip_ws = True, skip_cm = True)
+        if first is None:
+            continue
+        _, second = stmt.token_next(idx, skip_ws = True, skip_cm = True)
+        words = [first.normalized.upper()]
+        if second is not None:
+            words.append(second.normalized.upper())
+        res.append(" ".join(words))
+    return res
+
+
+def _matches(keywords: list, stmts: tuple) -> bool:
+    return any(k == s or k.startswith(s + " ") for k in keywords for s in stmts)
+
+# SQLGetInfo values gathered into a connection's capability profile; these
+# depend on the driver and server only, not on the session.  Names missing
+# from the installed cyanodbc's SQLGetInfo are skipped.
+capabilityInfo = [
+    "SQL_DBMS_NAME", "SQL_DBMS_VER", "SQL_DRIVER_NAME", "SQL_DRIVER_VER",
+    "SQL_DRIVER_ODBC_VER", "SQL_IDENTIFIER_QUOTE_CHAR",
+    "SQL_SEARCH_PATTERN_ESCAPE", "SQL_CATALOG_NAME",
+    "SQL_CATALOG_NAME_SEPARATOR", "SQL_CATALOG_TERM", "SQL_SCHEMA_TERM",
+    "SQL_TABLE_TERM", "SQL_PROCEDURE_TERM", "SQL_MAX_CATALOG_NAME_LEN",
+    "SQL_MAX_SCHEMA_NAME_LEN", "SQL_MAX_TABLE_NAME_LEN",
+    "SQL_MAX_COLUMN_NAME_LEN", "SQL_MAX_IDENTIFIER_LEN", "SQL_ASYNC_MODE",
+    "SQL_MAX_ASYNC_CONCURRENT_STATEMENTS", "SQL_MAX_CONCURRENT_ACTIVITIES",
+    "SQL_TXN_CAPABLE", "SQL_DEFAULT_TXN_ISOLATION", "SQL_MULTIPLE_ACTIVE_TXN"
+]
+# Read at every connect, to pick the profile
+capabilityKeyInfo = ["SQL_DRIVER_NAME", "SQL_DRIVER_VER", "SQL_DBMS_VER"]
+
+def format_pages(
+        pages,
+        cols,
+        format_name,
+        description = None,
+        max_col_width = 0,
+        metrics: queryMetrics = None):
+    """ Generator of formatted pages.  If the format supports it, pages are
+        rendered by a streamingTableFormatter with column widths fixed by the
+        first page, truncating values wider than max_col_width, if > 0.  CPU
+        time spent formatting is added to metrics.format_time, if given. """
+    streaming = format_name in streamingTableFormatter.styles
+    table = None
+    for page in pages:
+        start = thread_time()
+        if streaming:
+            if table is None:
+                table = streamingTableFormatter(
+                        cols, page, description,
+                        format_name = format_name,
+                        max_col_width = max_col_width)
+            res = table.format_page(page)
+        else:
+            res = "\n".join(
+                    formatter.format_output(
+                        page,
+                        cols,
+                        format_name = format_name))
+        if metrics is not None:
+            metrics.format_time += thread_time() - start
+        yield res
+
 class connStatus(Enum):
     DISCONNECTED = 0
     IDLE = 1
     EXECUTING = 2
     FETCHING = 3
     ERROR = 4
+    RECONNECTING = 5
 
 class executionStatus(IntEnum):
     OK = 0
@@ -22,12 +115,20 @@ class executionStatus(IntEnum):
     OKWRESULTS = 2
 
 class sqlConnection:
+    # Cheap statement used to check that the connection is alive; see ping
+    probe_query = "SELECT 1"
+
     def __init__(
         self,
         dsn: str,
         conn: Optional[Connection] = Connection(),
         username: Optional[str] = "",
-        password: Optional[str] = ""
+        password: Optional[str] = "",
+        metadata_conn: Optional[bool] = False,
+        prepared_cache_size: Optional[int] = 16,
+        query_timeout: Optional[float] = 0,
+        capability_store: Optional[capabilityStore] = None,
+        metadata_cache: Optional[metadataCache] = None
     ) -> None:
         self.dsn = dsn
         self.conn = conn
@@ -40,6 +141,22 @@ class sqlConnection:
         self._quotechar = None
         self._search_escapechar = None
         self._search_escapepattern = None
+        # Snapshot of connection attributes read through the driver: the
+        # current catalog, catalog support and get_info values.  Some
+        # drivers turn these into server round trips, and the prompt asks
+        # for the catalog on every redraw.  Filled at connect, cleared on
+        # close, and the catalog re-read only after statements that can
+        # change it, once their cursor is closed; see _attr_stmts
+        self._attrs: dict = {}
+        self._catalog_stale = False
+        # SQLGetInfo name to value, gathered in one pass at connect, or
+        # loaded from capability_store if this driver / server has been
+        # seen before; see _load_capabilities
+        self.capability_store = capability_store
+        self.capabilities: dict = {}
+        # Results of catalog calls, kept across sessions; see _metadata
+        self.metadata_cache = metadata_cache
+        self._fresh_metadata = local()
         # Lock to be held by database interaction that happens
         # in the main process.  Recall, main-buffer as well as preview
         # buffer queries get executed in a separate process, however
@@ -50,6 +167,36 @@ class sqlConnection:
         # multiple auto-completion result queries before each has had a chance
         # to return.
         self._lock = Lock()
+        # Optional, lazily opened, second connection dedicated to catalog
+        # calls (auto-completion, object browser).  With it, these no longer
+        # have to wait on _lock while a long running query holds the primary
+        # connection.
+        self.use_metadata_conn = metadata_conn
+        self._md_conn: Connection = None
+        self._md_lock = Lock()
+        # Main-buffer and preview queries, and fetches, are handed to this
+        # long lived thread; see async_execute / async_fetchmany
+        self._worker = connWorker(name = "connWorker-" + dsn)
+        # Cursors of parameterised statements, keyed by statement text, kept
+        # open (least recently used first) so that executing the same
+        # statement with new values re-uses the statement prepared on the
+        # server; see execute_prepared
+        self.prepared_cache_size = prepared_cache_size
+        self._prepared: OrderedDict = OrderedDict()
+        # Whether the result set of self.cursor has been read to the end (or
+        # there is none); a prepared cursor is only kept for re-use if so
+        self._exhausted: bool = True
+        # Seconds a statement may execute for before it is cancelled; 0 for
+        # no limit
+        self.query_timeout = query_timeout
+        # Time of the last statement known to have succeeded, and whether
+        # the last one failed; the keepalive probes connections when either
+        # suggests it should
+        self.last_activity: float = time()
+        self.suspect: bool = False
+        self.reconnect_attempts: int = 0
+        # Phase timings of the last statement executed
+        self.metrics: queryMetrics = None
         self._fetch_res: list = None
         self._execution_status: executionStatus = executionStatus.OK
         self._execution_err: str = None
@@ -74,7 +221,7 @@ class sqlConnection:
     @property
     def quotechar(self) -> str:
         if self._quotechar is None:
-            self._quotechar = self.conn.get_info(
+            self._quotechar = self.get_info(
                     SQLGetInfo.SQL_IDENTIFIER_QUOTE_CHAR)
             # pyodbc note
             # self._quotechar = self.conn.getinfo(
@@ -83,7 +230,7 @@ class sqlConnection:
     @property
     def search_escapechar(self) -> str:
         if self._search_escapechar is None:
-            self._search_escapechar = self.conn.get_info(
+            self._search_escapechar = self.get_info(
                     SQLGetInfo.SQL_SEARCH_PATTERN_ESCAPE)
         return self._search_escapechar
 
@@ -103,6 +250,14 @@ class sqlConnection:
             res = term
         return res
 
+    def _conn_str(self) -> str:
+        conn_str = "DSN=" + self.dsn + ";"
+        if len(self.username):
+            conn_str = conn_str + "UID=" + self.username + ";"
+        if len(self.password):
+            conn_str = conn_str + "PWD=" + self.password + ";"
+        return conn_str
+
     def connect(
             self,
             username: str = "",
@@ -110,92 +265,387 @@ class sqlConnection:
             force: bool = False) -> None:
         uid = username or self.username
         pwd = password or self.password
-        conn_str = "DSN=" + self.dsn + ";"
         if len(uid):
             self.username = uid
-            conn_str = conn_str + "UID=" + uid + ";"
         if len(pwd):
             self.password = pwd
-            conn_str = conn_str + "PWD=" + pwd + ";"
         if force or not self.conn.connected():
             try:
-                self.conn = connect(dsn = conn_str, timeout = 5)
+                self.conn = connect(dsn = self._conn_str(), timeout = 5)
                 self.status = connStatus.IDLE
             except ConnectError as e:
                 self.logger.error("Error while connecting: %s", str(e))
                 raise ConnectError(e)
+            self._on_connect()
+
+    def _on_connect(self) -> None:
+        """ Forget what was known about the previous connection """
+        # Credentials may have changed; re-open lazily when needed
+        self._close_metadata_conn()
+        self._clear_prepared()
+        self._attrs.clear()
+        self._catalog_stale = False
+        self._load_capabilities()
+        self._snapshot_catalog()
+
+    def _catalog_conn(self):
+        """ Returns the (connection, lock) pair catalog calls should use.
+            If use_metadata_conn is set, this is a second connection to the
+            same DSN, opened on first use.  If it can not be established we
+            fall back to the primary connection for the rest of the session.
+            """
+        if not self.use_metadata_conn or not self.conn.connected():
+            return self.conn, self._lock
+        with self._md_lock:
+            if self._md_conn is None or not self._md_conn.connected():
+                try:
+                    self.logger.debug("Opening metadata connection")
+                    self._md_conn = connect(dsn = self._conn_str(), timeout = 5)
+                except ConnectError as e:
+                    self.logger.warning(
+                        "Unable to open metadata connection, "
+                        "falling back to primary: %s", str(e))
+                    self._md_conn = None
+                    self.use_metadata_conn = False
+                    return self.conn, self._lock
+        return self._md_conn, self._md_lock
+
+    def _close_metadata_conn(self) -> None:
+        with self._md_lock:
+            if self._md_conn is not None and self._md_conn.connected():
+                try:
+                    self._md_conn.close()
+                except DatabaseError as e:
+                    self.logger.debug("Closing metadata connection: %s", str(e))
+            self._md_conn = None
+
+    def _catalog_arg(self, conn, catalog: str) -> str:
+        """ An empty catalog argument is relative to the connection's current
+            catalog.  The metadata connection does not follow USE statements
+            issued on the primary one, so for it we spell the catalog out. """
+        if conn is not self.conn and not catalog:
+            return self.current_catalog() or catalog
+        return catalog
+
+    def _catalog_query(self, query) -> list:
+        """ Execute a catalog query and return all rows.  On either
+            connection we use a throw-away cursor, leaving the cursor
+            holding the user's results, and the query, status and metrics
+            that go with it, untouched.  Raises DatabaseError. """
+        conn, lock = self._catalog_conn()
+        with lock:
+            crsr = conn.cursor()
+            try:
+                crsr.execute(query)
+                res = crsr.fetchall()
+            finally:
+                crsr.close()
+        return res
 
-    def fetchmany(self, size, event: Event = None) -> list:
+    def fetchmany(self, size) -> list:
         with self._lock:
             if self.cursor:
+                start = time()
                 self._fetch_res = self.cursor.fetchmany(size)
+                if len(self._fetch_res) < size:
+                    self._exhausted = True
+                if self.metrics is not None:
+                    self.metrics.record_fetch(self._fetch_res, time() - start)
             else:
                 self._fetch_res = []
-            if event is not None:
-                event.set()
         return self._fetch_res
 
     def async_fetchmany(self, size) -> list:
-        """ async_ is a misnomer here.  It does execute fetch in a new thread
-            however it will also wait for execution to complete. At this time
-            this helps us with registering KeyboardInterrupt during cyanodbc.
-            fetchmany only; it may evolve to have more true async-like behavior.
+        """ async_ is a misnomer here.  It does execute fetch in the
+            connection's worker thread, however it will also wait for
+            execution to complete. At this time this helps us with
+            registering KeyboardInterrupt during cyanodbc.fetchmany only;
+            it may evolve to have more true async-like behavior.
             """
-        exec_event = Event()
-        t = Thread(
-                target = self.fetchmany,
-                kwargs = {"size": size, "event": exec_event},
-                daemon = True)
-        t.start()
+        fut = self._worker.submit(self.fetchmany, size = size)
         # Will block but can be interrupted
-        exec_event.wait()
-        return self._fetch_res
+        return fut.result()
+
+    def _probe(self, conn: Connection) -> None:
+        """ Raises DatabaseError if probe_query fails on conn """
+        crsr = conn.cursor()
+        try:
+            crsr.execute(self.probe_query)
+            crsr.fetchall()
+        finally:
+            crsr.close()
+
+    def ping(self) -> Optional[bool]:
+        """ Execute probe_query on a throw-away cursor.  Returns None,
+            without probing, if the connection is in use: a query is being
+            executed, or its results are still being read.  Only errors
+            with a connection exception SQLSTATE (class 08), or none at
+            all, count as the connection being lost: the server answered
+            otherwise.  The metadata connection, if open and not busy, is
+            probed too, and dropped if it fails, to be re-opened on next
+            use. """
+        if self.status != connStatus.IDLE or self.cursor is not None:
+            return None
+        if not self._lock.acquire(blocking = False):
+            return None
+        try:
+            self._probe(self.conn)
+        except DatabaseError as e:
+            state = sqlstate(e)
+            if state is None or state.startswith("08"):
+                self.logger.warning("Connection probe failed: %s", str(e))
+                return False
+            self.logger.debug("Connection probe: %s", str(e))
+        finally:
+            self._lock.release()
+        self.last_activity = time()
+        self.suspect = False
+        self._ping_metadata_conn()
+        return True
+
+    def _ping_metadata_conn(self) -> None:
+        if not self._md_lock.acquire(blocking = False):
+            return
+        try:
+            if self._md_conn is None:
+                return
+            try:
+                self._probe(self._md_conn)
+                return
+            except DatabaseError as e:
+                state = sqlstate(e)
+                if state is not None and not state.startswith("08"):
+                    return
+                self.logger.warning("Metadata connection probe failed: %s", str(e))
+            try:
+                self._md_conn.close()
+            except DatabaseError:
+                pass
+            self._md_conn = None
+        finally:
+            self._md_lock.release()
+
+    def reconnect(self) -> bool:
+        """ Re-establish a broken connection with the stored credentials.
+            On failure the connection stays RECONNECTING.  _lock is not
+            held while connecting, which can take up to the driver's login
+            timeout: meanwhile, catalog calls find the connection closed
+            and return nothing. """
+        with self._lock:
+            if self.status == connStatus.DISCONNECTED:
+                # Closed by the user in the meantime
+                return False
+            self.status = connStatus.RECONNECTING
+            self.reconnect_attempts += 1
+            self.cursor = None
+            self.query = None
+            try:
+                self.conn.close()
+            except DatabaseError:
+                pass
+        try:
+            conn = connect(dsn = self._conn_str(), timeout = 5)
+        except ConnectError as e:
+            self.logger.debug("Reconnecting: %s", str(e))
+            return False
+        with self._lock:
+            if self.status == connStatus.DISCONNECTED:
+                conn.close()
+                return False
+            self.conn = conn
+            self.status = connStatus.IDLE
+            self._on_connect()
+            self.logger.info("Reconnected to %s after %d attempt(s)",
+                    self.dsn, self.reconnect_attempts)
+            self.reconnect_attempts = 0
+            self.last_activity = time()
+            self.suspect = False
+            return True
+
+    def _on_timeout(self) -> None:
+        """ Called on the watchdog thread """
+        self.logger.warning("Query timeout, cancelling")
+        self.cancel()
+
+    def _execute_cursor(self, query, parameters, timeout = None) -> bool:
+        """ Execute on self.cursor; expects _lock to be held.  If timeout
+            (query_timeout unless given) is > 0, a watchdog cancels the
+            statement once it has run for that many seconds. """
+        timeout = self.query_timeout if timeout is None else timeout
+        handle = None
+        timed_out = False
+        self.metrics = queryMetrics(self.dsn, query)
+        start = time()
+        try:
+            self._execution_err = None
+            self.status = connStatus.EXECUTING
+            if timeout and timeout > 0:
+                handle = get_watchdog().arm(timeout, self._on_timeout)
+            try:
+                self.cursor.execute(query, parameters)
+            finally:
+                self.metrics.execute_time = time() - start
+                if handle is not None:
+                    timed_out = not get_watchdog().disarm(handle)
+            if timed_out:
+                # Fired just as execute returned: the statement has been
+                # cancelled regardless
+                raise DatabaseError("Query timeout")
+            self.status = connStatus.IDLE
+            self._execution_status = executionStatus.OK
+            self._exhausted = not self.cursor.description
+            self.query = query
+            self.last_activity = time()
+            self.suspect = False
+            keywords = _leading_keywords(query)
+            if _matches(keywords, _attr_stmts):
+                # Results may be pending; re-read in close_cursor
+                self._catalog_stale = True
+            if self.metadata_cache is not None and _matches(keywords, _ddl_stmts):
+                self.metadata_cache.expire(self.dsn)
+            return True
+        except DatabaseError as e:
+            self._execution_status = executionStatus.FAIL
+            self.suspect = True
+            if timed_out:
+                self._execution_err = "Query cancelled after running for " \
+                    "%0.1fs (timeout %gs)" % (time() - start, timeout)
+            else:
+                self._execution_err = str(e)
+            self.metrics.error = self._execution_err
+            self.metrics.error_class = "timeout" if timed_out else error_class(e)
+            self.logger.warning("Execution error: %s", str(e))
+            return False
 
-    def execute(self, query, parameters = None, event: Event = None) -> Cursor:
+    def execute(self, query, parameters = None, timeout = None) -> Cursor:
         self.logger.debug("Execute: %s", query)
         with self._lock:
             self.close_cursor()
             self.cursor = self.conn.cursor()
+            self._execute_cursor(query, parameters, timeout)
+        return self.cursor
+
+    def execute_prepared(self, query, parameters = None, timeout = None) -> Cursor:
+        """ Like execute, but the cursor is taken from, and returned to, the
+            prepared statement cache.  Re-executing the same statement text
+            then binds the new parameters to the already prepared statement,
+            skipping the server's parse / plan step. """
+        if self.prepared_cache_size < 1:
+            return self.execute(query, parameters, timeout)
+        self.logger.debug("Execute prepared: %s", query)
+        with self._lock:
+            self.close_cursor()
+            self.cursor = self._prepared_cursor(query)
+            if not self._execute_cursor(query, parameters, timeout):
+                # Do not re-use a cursor in an unknown state; close_cursor
+                # will close it
+                self._prepared.pop(query, None)
+        return self.cursor
+
+    def executemany(self, query, seq_of_parameters) -> None:
+        """ Array-bound execution of query, once for every parameter tuple.
+            The cursor comes from the prepared statement cache, so that
+            successive batches of the same statement are not re-prepared.
+            Unlike execute, DatabaseError is raised to the caller. """
+        with self._lock:
+            self.close_cursor()
+            if self.prepared_cache_size > 0:
+                self.cursor = self._prepared_cursor(query)
+            else:
+                self.cursor = self.conn.cursor()
+            self.status = connStatus.EXECUTING
             try:
-                self._execution_err = None
-                self.status = connStatus.EXECUTING
-                self.cursor.execute(query, parameters)
+                self.cursor.executemany(query, seq_of_parameters)
+                self._exhausted = True
+            except DatabaseError:
+                self._prepared.pop(query, None)
+                raise
+            finally:
                 self.status = connStatus.IDLE
-                self._execution_status = executionStatus.OK
-                self.query = query
+
+    def set_autocommit(self, on: bool) -> bool:
+        """ Turn autocommit (on by default, per ODBC) on or off.  Returns
+            False, leaving it as it was, if the cyanodbc in use does not
+            expose the setting. """
+        with self._lock:
+            if not hasattr(self.conn, "autocommit"):
+                return False
+            self.conn.autocommit = on
+            return True
+
+    def commit(self) -> None:
+        with self._lock:
+            self.conn.commit()
+
+    def rollback(self) -> None:
+        with self._lock:
+            self.conn.rollback()
+
+    def _prepared_cursor(self, query) -> Cursor:
+        """ Cursor cached for query, or a new one added to the cache, which
+            becomes the most recently used entry; expects _lock to be held """
+        crsr = self._prepared.pop(query, None)
+        if crsr is None:
+            crsr = self.conn.cursor()
+        else:
+            self.logger.debug("Prepared statement cache hit")
+        self._prepared[query] = crsr
+        while len(self._prepared) > self.prepared_cache_size:
+            _, evicted = self._prepared.popitem(last = False)
+            evicted.close()
+        return crsr
+
+    def _is_prepared(self, crsr) -> bool:
+        return any(c is crsr for c in self._prepared.values())
+
+    def _evict_prepared(self, crsr) -> None:
+        for query, c in list(self._prepared.items()):
+            if c is crsr:
+                del self._prepared[query]
+
+    def _clear_prepared(self) -> None:
+        for crsr in self._prepared.values():
+            try:
+                crsr.close()
             except DatabaseError as e:
-                self._execution_status = executionStatus.FAIL
-                self._execution_err = str(e)
-                self.logger.warning("Execution error: %s", str(e))
-            if event is not None:
-                event.set()
-        return self.cursor
+                self.logger.debug("Closing prepared cursor: %s", str(e))
+        self._prepared.clear()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """ Run fn on this connection's worker thread, after any database
+            work already queued there """
+        return self._worker.submit(fn, *args, **kwargs)
 
-    def async_execute(self, query) -> Cursor:
-        """ async_ is a misnomer here.  It does execute fetch in a new thread
-            however it will also wait for execution to complete. At this time
-            this helps us with registering KeyboardInterrupt during cyanodbc.
-            execute only; it may evolve to have more true async-like behavior.
+    def async_execute(
+            self,
+            query,
+            parameters = None,
+            prepared = False,
+            timeout = None) -> Cursor:
+        """ async_ is a misnomer here.  It does execute in the connection's
+            worker thread, however it will also wait for execution to
+            complete. At this time this helps us with registering
+            KeyboardInterrupt during cyanodbc.execute only; it may evolve to
+            have more true async-like behavior.
+            prepared: use execute_prepared
+            timeout: overrides query_timeout for this statement
             """
-        exec_event = Event()
-        t = Thread(
-                target = self.execute,
-                kwargs = {"query": query, "parameters": None, "event": exec_event},
-                daemon = True)
-        t.start()
+        fut = self._worker.submit(
+                self.execute_prepared if prepared else self.execute,
+                query = query, parameters = parameters, timeout = timeout)
         # Will block but can be interrupted
-        exec_event.wait()
-        return self.cursor
+        return fut.result()
 
-    def list_catalogs(self) -> list:
+    def _list_catalogs(self) -> list:
         # pyodbc note
         # return conn.cursor().tables(catalog = "%").fetchall()
         res = []
         try:
-            if self.conn.connected():
+            conn, lock = self._catalog_conn()
+            if conn.connected():
                 self.logger.debug("Calling list_catalogs...")
-                with self._lock:
-                    res = self.conn.list_catalogs()
+                with lock:
+                    res = conn.list_catalogs()
                 self.logger.debug("list_catalogs: done")
         except DatabaseError as e:
             self.status = connStatus.ERROR
@@ -203,7 +653,7 @@ class sqlConnection:
 
         return res
 
-    def list_schemas(self, catalog = None) -> list:
+    def _list_schemas(self, catalog = None) -> list:
         res = []
 
         # We only trust this generic implementation if attempting to list
@@ -212,10 +662,17 @@ class sqlConnection:
             return res
 
         try:
-            if self.conn.connected():
+            conn, lock = self._catalog_conn()
+            # list_schemas is relative to the connection's current catalog;
+            # if the user switched catalogs on the primary connection, the
+            # metadata connection can not answer for it.
+            if conn is not self.conn and \
+                    conn.catalog_name != self.current_catalog():
+                conn, lock = self.conn, self._lock
+            if conn.connected():
                 self.logger.debug("Calling list_schemas...")
-                with self._lock:
-                    res = self.conn.list_schemas()
+                with lock:
+                    res = conn.list_schemas()
                 self.logger.debug("list_schemas: done")
         except DatabaseError as e:
             self.status = connStatus.ERROR
@@ -223,7 +680,7 @@ class sqlConnection:
 
         return res
 
-    def find_tables(
+    def _find_tables(
             self,
             catalog = "",
             schema = "",
@@ -232,11 +689,13 @@ class sqlConnection:
         res = []
 
         try:
-            if self.conn.connected():
+            conn, lock = self._catalog_conn()
+            catalog = self._catalog_arg(conn, catalog)
+            if conn.connected():
                 self.logger.debug("Calling find_tables: %s, %s, %s, %s",
                         catalog, schema, table, type)
-                with self._lock:
-                    res = self.conn.find_tables(
+                with lock:
+                    res = conn.find_tables(
                         catalog = catalog,
                         schema = schema,
                         table = table,
@@ -247,7 +706,7 @@ class sqlConnection:
 
         return res
 
-    def find_columns(
+    def _find_columns(
             self,
             catalog = "",
             schema = "",
@@ -256,11 +715,13 @@ class sqlConnection:
         res = []
 
         try:
-            if self.conn.connected():
+            conn, lock = self._catalog_conn()
+            catalog = self._catalog_arg(conn, catalog)
+            if conn.connected():
                 self.logger.debug("Calling find_columns: %s, %s, %s, %s",
                         catalog, schema, table, column)
-                with self._lock:
-                    res = self.conn.find_columns(
+                with lock:
+                    res = conn.find_columns(
                             catalog = catalog,
                             schema = schema,
                             table = table,
@@ -271,35 +732,185 @@ class sqlConnection:
 
         return res
 
+    def _metadata(self, kind: str, args: list, fetch, row_type = None) -> list:
+        """ Catalog call through the metadata cache, if there is one.  The
+            current catalog is part of the key: calls are relative to it.
+            Stale entries are refreshed in the background only if catalog
+            calls go to the metadata connection: on the primary one, a
+            refresh would contend with the user's queries, and fetches,
+            at unpredictable times. """
+        if self.metadata_cache is None:
+            return fetch()
+        fields = row_type._fields if row_type is not None else None
+
+        def _fetch():
+            res = fetch()
+            if fields is None:
+                return list(res)
+            return [[getattr(r, f, None) for f in fields] for r in res]
+        rows = self.metadata_cache.lookup(
+                self.dsn, kind, [self.current_catalog()] + list(args), _fetch,
+                background = self.use_metadata_conn,
+                fresh = getattr(self._fresh_metadata, "on", False))
+        if row_type is None:
+            return rows
+        return [row_type(*r) for r in rows]
+
+    @contextmanager
+    def fresh_metadata(self):
+        """ Catalog calls made on this thread meanwhile go to the driver,
+            bypassing (and updating) the metadata cache; for when stale
+            answers would do harm, not just look out of date """
+        self._fresh_metadata.on = True
+        try:
+            yield
+        finally:
+            self._fresh_metadata.on = False
+
+    def list_catalogs(self) -> list:
+        return self._metadata("catalogs", [], self._list_catalogs)
+
+    def list_schemas(self, catalog = None) -> list:
+        return self._metadata("schemas", [catalog],
+                lambda: self._list_schemas(catalog = catalog))
+
+    def find_tables(
+            self,
+            catalog = "",
+            schema = "",
+            table = "",
+            type = "") -> list:
+        return self._metadata("tables", [catalog, schema, table, type],
+                lambda: self._find_tables(
+                    catalog = catalog, schema = schema, table = table, type = type),
+                tableRow)
+
+    def find_columns(
+            self,
+            catalog = "",
+            schema = "",
+            table = "",
+            column = "") -> list:
+        return self._metadata("columns", [catalog, schema, table, column],
+                lambda: self._find_columns(
+                    catalog = catalog, schema = schema, table = table, column = column),
+                columnRow)
+
+    def _probe_capabilities(self) -> dict:
+        res = {}
+        for name in capabilityInfo:
+            code = getattr(SQLGetInfo, name, None)
+            if code is None:
+                continue
+            try:
+                res[name] = self.conn.get_info(code)
+            except DatabaseError as e:
+                self.logger.debug("get_info %s: %s", name, str(e))
+                res[name] = None
+        return res
+
+    def _load_capabilities(self) -> None:
+        """ Fill the get_info cache from the capability profile """
+        try:
+            ids = [self.conn.get_info(getattr(SQLGetInfo, name))
+                    for name in capabilityKeyInfo]
+        except (DatabaseError, AttributeError) as e:
+            self.logger.warning("Unable to identify driver: %s", str(e))
+            return
+        key = capabilityStore.key(self.dsn, *ids)
+        profile = None
+        if self.capability_store is not None:
+            profile = self.capability_store.get(key)
+        if profile is None:
+            self.logger.debug("Probing capabilities of %s", key)
+            profile = self._probe_capabilities()
+            if self.capability_store is not None:
+                self.capability_store.put(key, profile)
+        self.capabilities = profile
+        for name, value in profile.items():
+            code = getattr(SQLGetInfo, name, None)
+            if code is not None and value is not None:
+                self._attrs[("info", code)] = value
+
+    def _snapshot_catalog(self) -> None:
+        try:
+            self._attrs["catalog"] = self.conn.catalog_name
+        except DatabaseError as e:
+            self.logger.warning("Reading current catalog: %s", str(e))
+            self._attrs.pop("catalog", None)
+
     def current_catalog(self) -> str:
-        if self.conn.connected():
-            return self.conn.catalog_name
-        return None
+        if "catalog" not in self._attrs:
+            if not self.conn.connected():
+                return None
+            self._snapshot_catalog()
+        return self._attrs.get("catalog")
 
     def connected(self) -> bool:
         return self.conn.connected()
 
     def catalog_support(self) -> bool:
-        res = self.conn.get_info(SQLGetInfo.SQL_CATALOG_NAME)
+        res = self.get_info(SQLGetInfo.SQL_CATALOG_NAME)
         return res == True or res == 'Y'
         # pyodbc note
         # return self.conn.getinfo(pyodbc.SQL_CATALOG_NAME) == True or self.conn.getinfo(pyodbc.SQL_CATALOG_NAME) == 'Y'
 
     def get_info(self, code: int) -> str:
-        return self.conn.get_info(code)
+        """ Cached for the life of the connection """
+        key = ("info", code)
+        if key not in self._attrs:
+            self._attrs[key] = self.conn.get_info(code)
+        return self._attrs[key]
 
     def close(self) -> None:
         # TODO: When disconnecting
         # We likely don't want to allow any exception to
         # propagate.  Catch DatabaseError?
+        self._close_metadata_conn()
+        self._worker.shutdown()
+        self._clear_prepared()
+        self._attrs.clear()
+        self.status = connStatus.DISCONNECTED
         if self.conn.connected():
             self.conn.close()
 
+    def detach(self) -> Connection:
+        """ Hand the open connection over to another sqlConnection (see
+            adopt), shutting down everything else.  This one is left
+            disconnected. """
+        self._close_metadata_conn()
+        self._worker.shutdown()
+        self._clear_prepared()
+        self.status = connStatus.DISCONNECTED
+        conn = self.conn
+        self.conn = Connection()
+        return conn
+
+    def adopt(self, other: "sqlConnection") -> None:
+        """ Take over other's open connection, along with what is known
+            about it, without connecting again """
+        self.capabilities = other.capabilities
+        self._attrs = dict(other._attrs)
+        self.conn = other.detach()
+        self.status = connStatus.IDLE
+
     def close_cursor(self) -> None:
         if self.cursor:
-            self.cursor.close()
+            # Cursors in the prepared statement cache stay open, provided
+            # their results have been read to the end: drivers need not
+            # discard a pending result set on re-execute, and without MARS
+            # it would block every other statement on the connection
+            if self._is_prepared(self.cursor) and not self._exhausted:
+                self._evict_prepared(self.cursor)
+            if not self._is_prepared(self.cursor):
+                self.cursor.close()
             self.cursor = None
+        self._exhausted = True
         self.query = None
+        if self._catalog_stale:
+            self._catalog_stale = False
+            if self.conn.connected():
+                self._snapshot_catalog()
 
     def cancel(self) -> None:
         if self.cursor:
@@ -312,17 +923,52 @@ class sqlConnection:
             qry = qry + " LIMIT " + str(limit)
         return qry
 
-    def formatted_fetch(self, size, cols, format_name = "psql"):
+    def fetch_pages(self, size, sizer: fetchSizer = None):
+        """ Yields pages of (at most) size rows.  Display page size and the
+            number of rows requested per round trip are independent: the
+            latter is decided by sizer, and pages are sliced out of the
+            larger buffer. """
+        if sizer is None:
+            sizer = fetchSizer(initial = size)
+        buf = []
+        pos = 0
+        done = False
         while True:
-            res = self.async_fetchmany(size)
-            if len(res) < 1:
+            while not done and len(buf) - pos < size:
+                start = time()
+                res = self.async_fetchmany(sizer.size)
+                sizer.observe(res, time() - start)
+                if len(res) < 1:
+                    done = True
+                else:
+                    # Drop consumed rows before growing the buffer
+                    buf = buf[pos:] + res
+                    pos = 0
+            if pos >= len(buf):
                 break
-            else:
-                yield "\n".join(
-                        formatter.format_output(
-                            res,
-                            cols,
-                            format_name = format_name))
+            yield buf[pos:pos + size]
+            pos += size
+
+    def formatted_fetch(
+            self,
+            size,
+            cols,
+            format_name = "psql",
+            sizer: fetchSizer = None,
+            prefetch_pages: int = 0,
+            max_col_width: int = 0):
+        """ Generator of formatted pages of size rows.  If prefetch_pages >
+            0, pages are fetched and formatted in the background, up to
+            prefetch_pages ahead of the consumer.  If the format supports it,
+            pages are rendered by a streamingTableFormatter with column
+            widths fixed for the whole result set; see format_pages. """
+        description = self.cursor.description if self.cursor else None
+        pages = format_pages(
+                self.fetch_pages(size, sizer), cols, format_name,
+                description, max_col_width, metrics = self.metrics)
+        if prefetch_pages > 0:
+            return prefetch(pages, prefetch_pages, on_cancel = self.cancel)
+        return pages
 
 connWrappers = {}
 
@@ -353,7 +999,6 @@ class MSSQL(sqlConnection):
     def list_schemas(self, catalog = None) -> list:
         """ Optimization for listing out-of-database schemas by
             always querying catalog.sys.schemas. """
-        res = []
         qry = "SELECT name FROM {catalog}.sys.schemas " \
               "WHERE name NOT IN ('db_owner', 'db_accessadmin', " \
               "'db_securityadmin', 'db_ddladmin', 'db_backupoperator', " \
@@ -366,11 +1011,9 @@ class MSSQL(sqlConnection):
         if catalog:
             try:
                 self.logger.debug("Calling list_schemas...")
-                crsr = self.execute(qry.format(catalog = catalog))
-                res = crsr.fetchall()
-                crsr.close()
+                schemas = self._metadata("mssql_schemas", [catalog],
+                        lambda: [r[0] for r in self._catalog_query(qry.format(catalog = catalog))])
                 self.logger.debug("Calling list_schemas: done")
-                schemas = [r[0] for r in res]
                 if len(schemas):
                     return schemas
             except DatabaseError as e:
@@ -500,8 +1143,27 @@ class Snowflake(sqlConnection):
                 table = table,
                 type = type)
 
+class Oracle(sqlConnection):
+    probe_query = "SELECT 1 FROM DUAL"
+
+class DB2(sqlConnection):
+    probe_query = "SELECT 1 FROM SYSIBM.SYSDUMMY1"
+
+class Firebird(sqlConnection):
+    probe_query = "SELECT 1 FROM RDB$DATABASE"
+
 connWrappers["MySQL"] = MySQL
 connWrappers["Microsoft SQL Server"] = MSSQL
 connWrappers["SQLite"] = SQLite
 connWrappers["PostgreSQL"] = PSSQL
 connWrappers["Snowflake"] = Snowflake
+connWrappers["Oracle"] = Oracle
+connWrappers["DB2"] = DB2
+connWrappers["Firebird"] = Firebird
+
+def get_conn_wrapper(dbms: str):
+    """ sqlConnection class for the SQL_DBMS_NAME reported by the driver.
+        Some embed the platform: DB2/LINUXX8664, DB2/NT64 ... """
+    if dbms in connWrappers.keys():
+        return connWrappers[dbms]
+    return connWrappers.get(str(dbms).split("/")[0], sqlConnection)
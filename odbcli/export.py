@@ -0,0 +1,108 @@
+import os
+from os.path import splitext
+from time import time
+from typing import Callable, Iterable, List, Optional
+from .conn import sqlConnection, connStatus, executionStatus
+from .writers import get_writer, check_format, binaryWriterClasses, _import_pyarrow
+
+# File extension to writer format
+exportFormats = {
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow"
+}
+
+class ExportError(Exception):
+    pass
+
+def format_for_path(path: str, default_format: str = "csv") -> str:
+    return exportFormats.get(splitext(path)[1].lower(), default_format)
+
+def export_query(
+        sql_conn: sqlConnection,
+        query: str,
+        path: str,
+        format_name: Optional[str] = None,
+        default_format: str = "csv",
+        batch_size: int = 5000,
+        progress: Optional[Callable] = None) -> int:
+    """ Execute query and stream the results to path, batch_size rows at a
+        time.  Unless format_name is given, format is picked from the file
+        extension, default_format otherwise.  Text formats hold only one
+        batch in memory at any time; columnar ones one row group.
+        progress, if given, is called after every batch with
+        (rows, bytes written, elapsed seconds) and once more with
+        final = True.  Returns the number of rows written. """
+    format_name = format_name or format_for_path(path, default_format)
+    # Fail before executing the query, and truncating path, if the format
+    # is unknown or pyarrow is missing
+    check_format(format_name)
+    if format_name in binaryWriterClasses.keys():
+        _import_pyarrow()
+    start = time()
+    crsr = sql_conn.async_execute(query)
+    if sql_conn.execution_status == executionStatus.FAIL:
+        raise ExportError("Query error: %s" % sql_conn.execution_err)
+    if not crsr.description:
+        raise ExportError("Query did not return a result set")
+    cols = [col.name for col in crsr.description]
+
+    sql_conn.status = connStatus.FETCHING
+    def _batches():
+        while True:
+            rows = sql_conn.async_fetchmany(batch_size)
+            if len(rows) < 1:
+                break
+            yield rows
+    return write_file(path, format_name, cols, crsr.description, _batches(),
+            progress = progress, start = start)
+
+def export_rows(
+        batches: Iterable,
+        cols: List[str],
+        description,
+        path: str,
+        format_name: Optional[str] = None,
+        default_format: str = "csv",
+        progress: Optional[Callable] = None) -> int:
+    """ Like export_query, for rows already fetched (a job's spool, for
+        example) """
+    format_name = format_name or format_for_path(path, default_format)
+    check_format(format_name)
+    if format_name in binaryWriterClasses.keys():
+        _import_pyarrow()
+    return write_file(path, format_name, cols, description, batches,
+            progress = progress)
+
+def write_file(
+        path: str,
+        format_name: str,
+        cols: List[str],
+        description,
+        batches: Iterable,
+        progress: Optional[Callable] = None,
+        start: Optional[float] = None) -> int:
+    start = start or time()
+    if format_name in binaryWriterClasses.keys():
+        f = open(path, "wb")
+    else:
+        f = open(path, "w", newline = "", encoding = "utf-8")
+    with f:
+        writer = get_writer(format_name, f, cols, description)
+        writer.write_header()
+        nbytes = 0
+        for rows in batches:
+            writer.write_rows(rows)
+            if progress is not None:
+                f.flush()
+                nbytes = os.fstat(f.fileno()).st_size
+                progress(writer.rows_written, nbytes, time() - start)
+        writer.close()
+        nbytes = os.fstat(f.fileno()).st_size
+    if progress is not None:
+        progress(writer.rows_written, nbytes, time() - start, final = True)
+    return writer.rows_written
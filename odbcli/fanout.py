@@ -0,0 +1,142 @@
+""" Run one query on several connections at once.  Each connection executes
+    and fetches on its own worker thread; batches are merged, in arrival
+    order, into a single stream of rows whose first column is the DSN the
+    row came from. """
+from queue import Queue, Empty, Full
+from threading import Event
+from time import time
+from typing import List, Optional
+from .conn import sqlConnection, connStatus, executionStatus
+
+class fanoutResult:
+    """ Per-connection outcome of a fan-out query """
+    def __init__(self, dsn: str) -> None:
+        self.dsn = dsn
+        self.rows: int = 0
+        self.execute_time: float = 0
+        self.total_time: float = 0
+        self.error: Optional[str] = None
+        self.done: bool = False
+
+    @property
+    def status(self) -> str:
+        if not self.done:
+            return "cancelled"
+        return "error" if self.error is not None else "ok"
+
+_DONE = object()
+
+class fanoutQuery:
+    """ Iterating yields batches of rows, each prefixed with the DSN.  cols
+        (with the leading "dsn" column) is known once the first result set
+        arrives; connections returning a result set with other columns are
+        reported as errors and their rows dropped.  results holds one
+        fanoutResult per connection, final once iteration is over. """
+    def __init__(
+            self,
+            conns: List[sqlConnection],
+            query: str,
+            batch_size: int = 5000,
+            depth: int = 2) -> None:
+        self.conns = conns
+        self.query = query
+        self.batch_size = batch_size
+        self.cols: Optional[List[str]] = None
+        self.results = [fanoutResult(c.dsn) for c in conns]
+        self._queue: Queue = Queue(maxsize = max(depth, 1) * len(conns))
+        self._stop = Event()
+        self._started = False
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout = 0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _run(self, sql_conn: sqlConnection, res: fanoutResult) -> None:
+        """ Executed on sql_conn's worker thread """
+        start = time()
+        try:
+            if self._stop.is_set():
+                return
+            crsr = sql_conn.execute(self.query)
+            res.execute_time = time() - start
+            if sql_conn.execution_status == executionStatus.FAIL:
+                # Unless it failed because we cancelled it
+                if not self._stop.is_set():
+                    res.error = sql_conn.execution_err
+                return
+            cols = [col.name for col in crsr.description] \
+                if crsr.description else []
+            # First result set to arrive decides the shape
+            self._put(("cols", (res, cols)))
+            sql_conn.status = connStatus.FETCHING
+            prefix = (sql_conn.dsn, )
+            # Stop fetching once rejected, see __iter__
+            while not self._stop.is_set() and res.error is None:
+                rows = sql_conn.fetchmany(self.batch_size)
+                if len(rows) < 1:
+                    break
+                res.rows += len(rows)
+                if not self._put(("rows", (res, [prefix + tuple(r) for r in rows]))):
+                    break
+        except Exception as e:
+            res.error = str(e)
+        finally:
+            res.total_time = time() - start
+            res.done = not self._stop.is_set() or res.error is not None
+            sql_conn.status = connStatus.IDLE
+            sql_conn.close_cursor()
+            self._put((_DONE, res))
+
+    def cancel(self) -> None:
+        self._stop.set()
+        for c in self.conns:
+            c.cancel()
+
+    def __iter__(self):
+        if self._started:
+            raise RuntimeError("fanoutQuery can only be iterated once")
+        self._started = True
+        futures = [c.submit(self._run, c, r)
+                for c, r in zip(self.conns, self.results)]
+        pending = len(futures)
+        finished = []
+        try:
+            while pending and not self._stop.is_set():
+                try:
+                    kind, payload = self._queue.get(timeout = 0.1)
+                except Empty:
+                    continue
+                if kind is _DONE:
+                    pending -= 1
+                    finished.append(payload)
+                elif kind == "cols":
+                    res, cols = payload
+                    if self.cols is None and len(cols):
+                        self.cols = ["dsn"] + cols
+                    elif self.cols is not None and len(cols) and \
+                            cols != self.cols[1:]:
+                        res.error = "Result set columns (%s) differ from " \
+                            "(%s)" % (", ".join(cols), ", ".join(self.cols[1:]))
+                elif kind == "rows":
+                    res, rows = payload
+                    if res.error is not None:
+                        continue
+                    yield rows
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        finally:
+            # Closed early (pager exited) or interrupted: unblock producers,
+            # cancel statements still executing, and wait for every worker
+            # to release its cursor
+            self._stop.set()
+            for c, r in zip(self.conns, self.results):
+                if not any(r is f for f in finished):
+                    c.cancel()
+            for f in futures:
+                f.exception()
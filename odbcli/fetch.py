@@ -0,0 +1,128 @@
+from queue import Queue, Full
+from sys import getsizeof
+from threading import Event, Thread
+from typing import Callable, Iterable, List, Optional
+
+def estimate_row_bytes(rows: List, sample_rows: int = 20) -> float:
+    """ Average in-memory size of a row, estimated from a sample """
+    if not len(rows):
+        return 0
+    step = max(len(rows) // sample_rows, 1)
+    sample = rows[::step]
+    total = sum(getsizeof(v) for row in sample for v in row)
+    return total / len(sample)
+
+class fetchSizer:
+    """ Decides how many rows to request per fetchmany round trip.
+
+        We start at `initial` rows (typically one display page, so that the
+        first page is on screen as fast as before) and double the request
+        after every round trip that completed within `target_latency`
+        seconds; a round trip taking more than twice that halves it.  The
+        request is capped both by `max_rows` and by `max_bytes` worth of
+        rows, estimated from the observed average row width.
+        """
+    def __init__(
+            self,
+            initial: int,
+            max_rows: int = 100000,
+            max_bytes: int = 32 * 1024 * 1024,
+            target_latency: float = 0.5) -> None:
+        self.min_rows = max(initial, 1)
+        self.max_rows = max(max_rows, self.min_rows)
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.row_bytes: float = 0
+        self._size = self.min_rows
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def observe(self, rows: List, elapsed: float) -> None:
+        """ Record the outcome of a round trip requesting self.size rows """
+        if not len(rows):
+            return
+        width = estimate_row_bytes(rows)
+        # Exponential moving average; row width can vary a lot between
+        # batches (think NULL heavy vs. populated text columns)
+        self.row_bytes = width if not self.row_bytes else \
+            0.7 * self.row_bytes + 0.3 * width
+
+        if elapsed < self.target_latency and len(rows) >= self._size:
+            size = self._size * 2
+        elif elapsed > 2 * self.target_latency:
+            size = self._size // 2
+        else:
+            size = self._size
+        if self.row_bytes > 0:
+            size = min(size, int(self.max_bytes / self.row_bytes))
+        self._size = min(max(size, self.min_rows), self.max_rows)
+
+def repage(batches: Iterable, size: int):
+    """ Re-slice an iterable of row batches, of any size, into pages of size
+        rows (the last one possibly shorter) """
+    buf = []
+    for batch in batches:
+        buf.extend(batch)
+        while len(buf) >= size:
+            yield buf[:size]
+            buf = buf[size:]
+    if len(buf):
+        yield buf
+
+_DONE = object()
+
+def prefetch(
+        iterable: Iterable,
+        depth: int,
+        on_cancel: Optional[Callable] = None):
+    """ Generator yielding the items of iterable, which is consumed on a
+        producer thread that stays up to depth items ahead of us.  This lets
+        fetching (and formatting) the next pages overlap with the pager
+        displaying the current one.
+
+        On KeyboardInterrupt, or when we are closed early because the pager
+        was exited, the producer is stopped and, if it is still busy,
+        on_cancel (for example sqlConnection.cancel) is called: it may be
+        stuck in a slow fetch.  We then wait for the producer to wind down,
+        so that no one is using the cursor once we return. """
+    queue: Queue = Queue(maxsize = max(depth, 1))
+    stop = Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout = 0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in iterable:
+                if not _put((item, None)):
+                    return
+            _put((_DONE, None))
+        except BaseException as e:
+            _put((None, e))
+
+    t = Thread(target = _produce, name = "prefetch", daemon = True)
+    t.start()
+    exhausted = False
+    try:
+        while True:
+            item, err = queue.get()
+            if err is not None:
+                exhausted = True
+                raise err
+            if item is _DONE:
+                exhausted = True
+                break
+            yield item
+    finally:
+        stop.set()
+        if not exhausted and t.is_alive() and on_cancel is not None:
+            on_cancel()
+        t.join()
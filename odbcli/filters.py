@@ -4,6 +4,8 @@ from re import sub, findall
 
 class SqlAppFilter(Filter):
     def __init__(self, sql_app: "sqlApp") -> None:
+        # Sets up the &, | caches in recent prompt_toolkit versions
+        super().__init__()
         self.my_app = sql_app
 
     def __call__(self) -> bool:
@@ -21,6 +23,10 @@ class ShowPreview(SqlAppFilter):
     def __call__(self) -> bool:
         return self.my_app.show_preview
 
+class ShowResults(SqlAppFilter):
+    def __call__(self) -> bool:
+        return self.my_app.show_results
+
 class ShowDisconnectDialog(SqlAppFilter):
     def __call__(self) -> bool:
         return self.my_app.show_disconnect_dialog
@@ -0,0 +1,153 @@
+""" Background query jobs.  A job executes on its connection's worker
+    thread and spools the complete result set to disk, while the client
+    stays responsive; the results can be paged through or exported once the
+    job is done. """
+from enum import Enum
+from logging import getLogger
+from threading import Lock
+from time import time
+from typing import Callable, List, Optional
+from .conn import sqlConnection, connStatus, executionStatus
+from .spool import rowSpool
+
+class jobStatus(Enum):
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class queryJob:
+    def __init__(self, job_id: int, sql_conn: sqlConnection, query: str) -> None:
+        self.id = job_id
+        self.conn = sql_conn
+        self.query = query
+        self.status = jobStatus.RUNNING
+        self.cols: List[str] = []
+        self.description = None
+        self.error: Optional[str] = None
+        self.spool: Optional[rowSpool] = None
+        self.start: float = time()
+        self.end: Optional[float] = None
+        self._cancel = False
+
+    @property
+    def dsn(self) -> str:
+        return self.conn.dsn
+
+    @property
+    def rows(self) -> int:
+        return self.spool.rows if self.spool is not None else 0
+
+    @property
+    def elapsed(self) -> float:
+        return (self.end or time()) - self.start
+
+    @property
+    def finished(self) -> bool:
+        return self.status != jobStatus.RUNNING
+
+class jobManager:
+    """ Runs and keeps track of background jobs.  on_change, if given, is
+        called (from the connection's worker thread) whenever a job
+        finishes. """
+    def __init__(
+            self,
+            batch_size: int = 5000,
+            spool_dir: Optional[str] = None,
+            on_change: Optional[Callable] = None) -> None:
+        self.batch_size = batch_size
+        self.spool_dir = spool_dir
+        self.on_change = on_change
+        self.logger = getLogger(__name__)
+        self.jobs: List[queryJob] = []
+        # Finished jobs the user has not looked at yet
+        self.unseen: List[queryJob] = []
+        self._lock = Lock()
+        self._next_id = 1
+        # Set by close: jobs still running remove their own spool
+        self._closed = False
+
+    def submit(self, sql_conn: sqlConnection, query: str) -> queryJob:
+        with self._lock:
+            job = queryJob(self._next_id, sql_conn, query)
+            self._next_id += 1
+            self.jobs.append(job)
+        sql_conn.submit(self._run, job)
+        return job
+
+    def get(self, job_id: int) -> Optional[queryJob]:
+        for job in self.jobs:
+            if job.id == job_id:
+                return job
+        return None
+
+    def running_on(self, sql_conn: sqlConnection) -> Optional[queryJob]:
+        for job in self.jobs:
+            if job.conn is sql_conn and not job.finished:
+                return job
+        return None
+
+    def cancel(self, job: queryJob) -> None:
+        if not job.finished:
+            job._cancel = True
+            job.conn.cancel()
+
+    def drop(self, job: queryJob) -> None:
+        """ Forget a finished job and remove its spool """
+        with self._lock:
+            self.jobs.remove(job)
+            if job in self.unseen:
+                self.unseen.remove(job)
+        if job.spool is not None:
+            job.spool.close()
+
+    def seen(self) -> None:
+        self.unseen = []
+
+    def close(self) -> None:
+        """ Cancel running jobs, and remove the spools of all.  A running
+            job may still be writing to its spool: that one is removed by
+            the job itself, once it has finished. """
+        with self._lock:
+            self._closed = True
+            jobs = list(self.jobs)
+        for job in jobs:
+            self.cancel(job)
+            if job.finished and job.spool is not None:
+                job.spool.close()
+
+    def _run(self, job: queryJob) -> None:
+        """ Executed on the job connection's worker thread """
+        sql_conn = job.conn
+        try:
+            crsr = sql_conn.execute(job.query)
+            if sql_conn.execution_status == executionStatus.FAIL:
+                job.error = sql_conn.execution_err
+                job.status = jobStatus.CANCELLED if job._cancel else jobStatus.FAILED
+                return
+            job.spool = rowSpool(self.spool_dir)
+            if crsr.description:
+                job.description = crsr.description
+                job.cols = [col.name for col in crsr.description]
+                sql_conn.status = connStatus.FETCHING
+                while not job._cancel:
+                    rows = sql_conn.fetchmany(self.batch_size)
+                    if len(rows) < 1:
+                        break
+                    job.spool.append(rows)
+            job.status = jobStatus.CANCELLED if job._cancel else jobStatus.DONE
+        except Exception as e:
+            self.logger.warning("Job %d: %s", job.id, str(e))
+            job.error = str(e)
+            job.status = jobStatus.CANCELLED if job._cancel else jobStatus.FAILED
+        finally:
+            job.end = time()
+            sql_conn.status = connStatus.IDLE
+            sql_conn.close_cursor()
+            with self._lock:
+                self.unseen.append(job)
+                closed = self._closed
+            if closed and job.spool is not None:
+                job.spool.close()
+            if self.on_change is not None:
+                self.on_change()
@@ -0,0 +1,85 @@
+from logging import getLogger
+from threading import Event, Thread
+from time import time
+from typing import Callable, List, Optional
+from .conn import sqlConnection, connStatus
+
+class keepalive:
+    """ Background thread watching over connections.
+
+        Connections that have been idle for interval seconds, or whose last
+        statement failed, are probed with their dialect's probe_query (see
+        sqlConnection.ping).  A connection failing the probe is marked
+        RECONNECTING and re-established with the stored credentials,
+        retrying with exponential backoff, capped at max_backoff seconds.
+        on_change, if given, is called whenever a connection changes state,
+        for example to redraw the status bar. """
+    def __init__(
+            self,
+            conns: Callable[[], List[sqlConnection]],
+            interval: float = 60,
+            max_backoff: float = 300,
+            on_change: Optional[Callable] = None,
+            tick: float = 1) -> None:
+        self.conns = conns
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.on_change = on_change
+        self.tick = tick
+        self.logger = getLogger(__name__)
+        # sqlConnection -> time of the next reconnect attempt
+        self._next_attempt: dict = {}
+        self._stop = Event()
+        self._thread: Thread = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target = self._run, name = "keepalive", daemon = True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def backoff(self, attempts: int) -> float:
+        return min(2 ** max(attempts - 1, 0), self.max_backoff)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.tick):
+            try:
+                self.check(time())
+            except Exception as e:
+                self.logger.warning("keepalive: %s", repr(e))
+
+    def check(self, now: float) -> None:
+        """ One round over all connections """
+        conns = self.conns()
+        for conn in list(self._next_attempt.keys()):
+            if conn not in conns or conn.status != connStatus.RECONNECTING:
+                del self._next_attempt[conn]
+        for conn in conns:
+            if conn.status == connStatus.RECONNECTING:
+                if now >= self._next_attempt.get(conn, 0):
+                    self._reconnect(conn, now)
+            elif conn.status == connStatus.IDLE and conn.connected() and \
+                    (conn.suspect or now - conn.last_activity >= self.interval):
+                if conn.ping() is False:
+                    self.logger.warning("%s: connection lost, reconnecting", conn.dsn)
+                    conn.status = connStatus.RECONNECTING
+                    self._changed()
+                    self._reconnect(conn, now)
+
+    def _reconnect(self, conn: sqlConnection, now: float) -> None:
+        if conn.reconnect():
+            self._next_attempt.pop(conn, None)
+        else:
+            delay = self.backoff(conn.reconnect_attempts)
+            self.logger.info("%s: reconnect attempt %d failed, next in %gs",
+                    conn.dsn, conn.reconnect_attempts, delay)
+            self._next_attempt[conn] = now + delay
+        self._changed()
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
@@ -24,6 +24,7 @@ from .sidebar import sql_sidebar, sql_sidebar_help, show_sidebar_button_info, sq
 from .loginprompt import login_prompt
 from .disconnect_dialog import disconnect_dialog
 from .preview import preview_element
+from .viewer import resultsViewer
 from .filters import ShowLoginPrompt, ShowSidebar, MultilineFilter
 from .utils import if_mousedown
 from .conn import connStatus
@@ -108,6 +109,10 @@ def get_connection_fragments(my_app: "sqlApp") -> StyleAndTextTuples:
     elif status == connStatus.ERROR:
         token = "class:status-toolbar.conn-executing"
         status_text = "Unexpected Error"
+    elif status == connStatus.RECONNECTING:
+        token = "class:status-toolbar.conn-executing"
+        status_text = "Reconnecting (attempt %d)" % \
+            (my_app.active_conn.reconnect_attempts + 1)
     elif status == connStatus.DISCONNECTED:
         token = "class:status-toolbar.conn-fetching"
         status_text = "Disconnected"
@@ -121,6 +126,19 @@ def get_connection_fragments(my_app: "sqlApp") -> StyleAndTextTuples:
     append((token, " " + status_text))
     return result
 
+def get_jobs_fragments(my_app: "sqlApp") -> StyleAndTextTuples:
+    """ Running background jobs, and those finished since \\jobs was last
+        looked at """
+    result: StyleAndTextTuples = []
+    running = sum(1 for job in my_app.jobs.jobs if not job.finished)
+    if running:
+        result.append(("class:status-toolbar.conn-executing",
+            " %d job%s running " % (running, "s" if running > 1 else "")))
+    for job in my_app.jobs.unseen:
+        result.append(("class:status-toolbar.conn-fetching",
+            " Job %d %s " % (job.id, job.status.value)))
+    return result
+
 def exit_confirmation(
     my_app: "sqlApp", style = "class:exit-confirmation"
 ) -> Container:
@@ -162,6 +180,8 @@ def status_bar(my_app: "sqlApp") -> Container:
         result.extend(get_inputmode_fragments(my_app))
         append((TB, " "))
         result.extend(get_connection_fragments(my_app))
+        append((TB, " "))
+        result.extend(get_jobs_fragments(my_app))
 
 
         return result
@@ -238,6 +258,7 @@ class sqlAppLayout:
 
         self.lprompt = login_prompt(self.my_app)
         self.preview = preview_element(self.my_app)
+        self.results = resultsViewer(self.my_app)
         self.disconnect_dialog = disconnect_dialog(self.my_app)
         container = HSplit([
             VSplit([
@@ -261,6 +282,9 @@ class sqlAppLayout:
                         Float(
                             content = self.preview,
                             ),
+                        Float(
+                            content = self.results,
+                            ),
                         Float(
                             content = self.disconnect_dialog,
                             ),
@@ -293,6 +317,13 @@ class sqlAppLayout:
 
         def accept(buff):
             app = get_app()
+            sql_conn = self.my_app.active_conn
+            if not self.my_app.external_pager and \
+                    not buff.text.strip().startswith("\\") and \
+                    sql_conn is not None and sql_conn.status == connStatus.IDLE and \
+                    self.my_app.jobs.running_on(sql_conn) is None:
+                self.results.run(sql_conn, buff.text)
+                return False
             app.exit(result = ["non-preview", buff.text])
             app.pre_run_callables.append(buff.reset)
             return True
@@ -0,0 +1,243 @@
+""" Bulk load of CSV / TSV / JSON lines files into an existing table.  The
+    file is streamed; values are converted according to the table's column
+    types, as reported by find_columns, and inserted batch_size rows at a
+    time with array-bound executemany. """
+import csv
+import json
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+from os.path import splitext
+from time import time
+from typing import Callable, IO, Iterator, List, Optional, Tuple
+from cyanodbc import DatabaseError
+from .conn import sqlConnection
+
+# File extension to format
+loadFormats = {
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".txt": "tsv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl"
+}
+
+class LoadError(Exception):
+    pass
+
+# ODBC SQL data types, see sql.h / sqlext.h
+_int_types = (-6, 5, 4, -5)
+_bit_types = (-7, )
+_decimal_types = (2, 3)
+_float_types = (6, 7, 8)
+_date_types = (9, 91)
+_time_types = (10, 92)
+_timestamp_types = (11, 93)
+
+_true = ("1", "t", "true", "y", "yes")
+_false = ("0", "f", "false", "n", "no")
+
+def _to_bit(s: str) -> int:
+    v = s.strip().lower()
+    if v in _true:
+        return 1
+    if v in _false:
+        return 0
+    raise ValueError(s)
+
+def _parser(data_type: int) -> Optional[Callable]:
+    """ Function converting a string to a value appropriate for the column,
+        None to pass strings through """
+    if data_type in _int_types:
+        return int
+    if data_type in _bit_types:
+        return _to_bit
+    if data_type in _decimal_types:
+        return Decimal
+    if data_type in _float_types:
+        return float
+    if data_type in _date_types:
+        return date.fromisoformat
+    if data_type in _time_types:
+        return dtime.fromisoformat
+    if data_type in _timestamp_types:
+        return datetime.fromisoformat
+    return None
+
+def column_converter(data_type: int) -> Callable:
+    """ Converter for values read from the file.  Values already typed (JSON
+        numbers, booleans, null) are passed as is; an empty string is NULL
+        for any but character columns. """
+    parse = _parser(data_type)
+    if parse is None:
+        return lambda v: v
+    def convert(v):
+        if not isinstance(v, str):
+            return v
+        if not len(v):
+            return None
+        return parse(v.strip())
+    return convert
+
+def parse_table_name(name: str) -> Tuple[Optional[str], Optional[str], str]:
+    """ [[catalog.]schema.]table -> (catalog, schema, table), with quotes
+        removed """
+    parts = [p.strip().strip('"[]`') for p in name.split(".")]
+    if len(parts) > 3 or not all(len(p) for p in parts):
+        raise LoadError("Invalid table name: %s" % name)
+    parts = [None] * (3 - len(parts)) + parts
+    return parts[0], parts[1], parts[2]
+
+def read_rows(f: IO, format_name: str) -> Tuple[List[str], Iterator[list]]:
+    """ Column names and an iterator of rows.  CSV / TSV files must have a
+        header line; with JSON lines, the keys of the first object name the
+        columns. """
+    if format_name in ("csv", "tsv"):
+        reader = csv.reader(f, delimiter = "\t" if format_name == "tsv" else ",")
+        cols = next(reader, None)
+        if cols is None:
+            raise LoadError("File is empty")
+        return cols, reader
+
+    def _objects():
+        for line in f:
+            if len(line.strip()):
+                obj = json.loads(line)
+                if not isinstance(obj, dict):
+                    raise LoadError("Expected one JSON object per line")
+                yield obj
+    objects = _objects()
+    first = next(objects, None)
+    if first is None:
+        raise LoadError("File is empty")
+    cols = list(first.keys())
+    def _rows():
+        yield [first.get(c) for c in cols]
+        for obj in objects:
+            yield [obj.get(c) for c in cols]
+    return cols, _rows()
+
+def _resolve_schema(sql_conn: sqlConnection, catalog: str, name: str, table: str) -> Optional[str]:
+    """ Schema of the one table called name, None if the DBMS does not have
+        schemas.  find_columns would otherwise merge the columns of same
+        named tables in different schemas. """
+    tables = sql_conn.find_tables(
+            catalog = catalog,
+            schema = "%",
+            table = sql_conn.sanitize_search_string(name),
+            type = "")
+    if not len(tables):
+        raise LoadError("Table %s not found" % table)
+    schemas = sorted(set(t.schema or "" for t in tables))
+    if len(schemas) > 1:
+        raise LoadError("%s is ambiguous, found in schemas %s; qualify it "
+                "with the schema" % (table, ", ".join(schemas)))
+    return schemas[0] or None
+
+def load_file(
+        sql_conn: sqlConnection,
+        path: str,
+        table: str,
+        format_name: Optional[str] = None,
+        batch_size: int = 5000,
+        commit_interval: int = 50000,
+        progress: Optional[Callable] = None) -> int:
+    """ Insert the rows of the file at path into table, with autocommit
+        off, committing every commit_interval rows (and at the end).  On
+        error, the uncommitted part is rolled back and LoadError raised.  If
+        autocommit can not be turned off, every batch is committed as it is
+        inserted, and nothing is rolled back.  progress, if given, is called
+        after every batch with (rows, elapsed seconds) and once more with
+        final = True.  Returns the number of rows loaded. """
+    format_name = format_name or loadFormats.get(splitext(path)[1].lower())
+    if format_name is None:
+        raise LoadError("Unable to infer the file format from %s; "
+                "expected one of %s" % (path, ", ".join(loadFormats.keys())))
+
+    catalog, schema, name = parse_table_name(table)
+    if catalog is None:
+        catalog = sql_conn.current_catalog() or ""
+    # Not from the metadata cache: the table may have been altered, or
+    # re-created, since
+    with sql_conn.fresh_metadata():
+        if schema is None:
+            schema = _resolve_schema(sql_conn, catalog, name, table)
+        meta = sql_conn.find_columns(
+                catalog = catalog,
+                schema = sql_conn.sanitize_search_string(schema) if schema else "%",
+                table = sql_conn.sanitize_search_string(name),
+                column = "%")
+    if not len(meta):
+        raise LoadError("Table %s not found" % table)
+    by_name = dict((m.column.lower(), m) for m in meta)
+
+    with open(path, "r", newline = "", encoding = "utf-8") as f:
+        cols, rows = read_rows(f, format_name)
+        unknown = [c for c in cols if c.lower() not in by_name.keys()]
+        if len(unknown):
+            raise LoadError("Columns not in %s: %s" % (table, ", ".join(unknown)))
+        col_meta = [by_name[c.lower()] for c in cols]
+        converters = [column_converter(m.data_type) for m in col_meta]
+        # SQL_IDENTIFIER_QUOTE_CHAR is a space if quoting is not supported
+        q = sql_conn.quotechar.strip()
+        query = "INSERT INTO %s (%s) VALUES (%s)" % (
+                table,
+                ", ".join(q + m.column + q for m in col_meta),
+                ", ".join("?" * len(cols)))
+
+        try:
+            transactional = sql_conn.submit(sql_conn.set_autocommit, False).result()
+        except DatabaseError as e:
+            raise LoadError("Unable to turn autocommit off: %s" % str(e))
+        start = time()
+        loaded = 0
+        uncommitted = 0
+        batch = []
+        nrow = 0
+        try:
+            try:
+                for row in rows:
+                    nrow += 1
+                    if len(row) != len(cols):
+                        raise LoadError("Row %d: %d values, expected %d" %
+                                (nrow, len(row), len(cols)))
+                    try:
+                        batch.append(tuple(fn(v) for fn, v in zip(converters, row)))
+                    except (ValueError, ArithmeticError) as e:
+                        raise LoadError("Row %d: %s" % (nrow, str(e)))
+                    if len(batch) >= batch_size:
+                        sql_conn.submit(sql_conn.executemany, query, batch).result()
+                        loaded += len(batch)
+                        uncommitted += len(batch) if transactional else 0
+                        batch = []
+                        if uncommitted >= commit_interval:
+                            sql_conn.submit(sql_conn.commit).result()
+                            uncommitted = 0
+                        if progress is not None:
+                            progress(loaded, time() - start)
+                if len(batch):
+                    sql_conn.submit(sql_conn.executemany, query, batch).result()
+                    loaded += len(batch)
+                    uncommitted += len(batch) if transactional else 0
+                if transactional:
+                    sql_conn.submit(sql_conn.commit).result()
+            except KeyboardInterrupt:
+                sql_conn.cancel()
+                if transactional:
+                    sql_conn.submit(sql_conn.rollback).result()
+                raise
+            except (LoadError, DatabaseError, ValueError) as e:
+                if transactional:
+                    sql_conn.submit(sql_conn.rollback).result()
+                raise LoadError("%s (%d rows committed)" %
+                        (str(e), loaded - uncommitted))
+        finally:
+            try:
+                sql_conn.close_cursor()
+            finally:
+                # Even if interrupted again while rolling back; queued
+                # behind the rollback on the worker
+                if transactional:
+                    sql_conn.submit(sql_conn.set_autocommit, True).result()
+    if progress is not None:
+        progress(loaded, time() - start, final = True)
+    return loaded
@@ -5,7 +5,7 @@ from prompt_toolkit.widgets import TextArea
 from prompt_toolkit.layout.containers import HSplit, ConditionalContainer, WindowAlign, Window
 from prompt_toolkit.filters import is_done
 from cyanodbc import ConnectError, DatabaseError, SQLGetInfo
-from .conn import connWrappers, sqlConnection
+from .conn import get_conn_wrapper
 from .filters import ShowLoginPrompt
 
 def login_prompt(my_app: "sqlApp"):
@@ -15,18 +15,24 @@ def login_prompt(my_app: "sqlApp"):
         obj = my_app.selected_object
         try:
             obj.conn.connect(username = uidTextfield.text, password = pwdTextfield.text)
-            # Query the type of back-end and instantiate an appropriate class
+            # Query the type of back-end (answered from the capability
+            # profile gathered at connect) and instantiate an appropriate
+            # class
             dbms = obj.conn.get_info(SQLGetInfo.SQL_DBMS_NAME)
-            # Now clone object
-            cls = connWrappers[dbms] if dbms in connWrappers.keys() else sqlConnection
-            newConn = cls(
-                    dsn = obj.conn.dsn,
-                    conn = obj.conn.conn,
-                    username = obj.conn.username,
-                    password = obj.conn.password)
-            obj.conn.close()
-            newConn.connect()
-            obj.conn = newConn
+            cls = get_conn_wrapper(dbms)
+            if type(obj.conn) is not cls:
+                # Clone object, handing over the open connection
+                newConn = cls(
+                        dsn = obj.conn.dsn,
+                        username = obj.conn.username,
+                        password = obj.conn.password,
+                        metadata_conn = obj.conn.use_metadata_conn,
+                        prepared_cache_size = obj.conn.prepared_cache_size,
+                        query_timeout = obj.conn.query_timeout,
+                        capability_store = obj.conn.capability_store,
+                        metadata_cache = obj.conn.metadata_cache)
+                newConn.adopt(obj.conn)
+                obj.conn = newConn
             my_app.active_conn = obj.conn
             # OG some thread locking may be needed here
             my_app.completer.reset_completions()
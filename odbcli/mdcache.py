@@ -0,0 +1,187 @@
+""" Persistent cache of catalog calls (SQLTables, SQLColumns, schema and
+    catalog lists), so that auto-completion and the object browser have
+    metadata to work with as soon as a session starts, rather than after
+    the first, on large databases slow, round trips.
+
+    Results are kept in a SQLite file, per DSN, keyed by the call and its
+    arguments, each with the time it was fetched.  Entries older than
+    refresh_after seconds are still served, and re-fetched in the
+    background; entries older than max_age are not served at all. """
+import json
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from threading import Lock
+from time import time
+from typing import Callable, List, Optional, Tuple
+from os.path import expanduser
+from .config import config_location, ensure_dir_exists
+
+# What is kept of find_tables / find_columns results, which are returned
+# from the cache as these
+tableRow = namedtuple("tableRow", ["catalog", "schema", "name", "type", "remarks"])
+columnRow = namedtuple("columnRow", [
+    "catalog", "schema", "table", "column", "data_type", "type_name",
+    "column_size", "buffer_length", "decimal_digits",
+    "numeric_precision_radix", "nullable", "remarks", "default",
+    "sql_data_type", "sql_datetime_subtype", "char_octet_length"])
+
+_schema = """
+CREATE TABLE IF NOT EXISTS entries (
+    dsn TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    PRIMARY KEY (dsn, kind, args)
+);
+"""
+
+class metadataCache:
+    def __init__(
+            self,
+            path: str,
+            refresh_after: float = 3600,
+            max_age: float = 7 * 86400) -> None:
+        self.path = path
+        self.refresh_after = refresh_after
+        self.max_age = max_age
+        self.logger = getLogger(__name__)
+        self._lock = Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._refreshing: set = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        """ Expects _lock to be held """
+        if self._db is None:
+            ensure_dir_exists(self.path)
+            self._db = sqlite3.connect(self.path, check_same_thread = False)
+            self._db.executescript(_schema)
+        return self._db
+
+    def get(self, dsn: str, kind: str, args: list) -> Optional[Tuple[list, float]]:
+        """ (rows, age in seconds), None if not cached """
+        try:
+            with self._lock:
+                row = self._conn().execute(
+                    "SELECT rows, fetched FROM entries "
+                    "WHERE dsn = ? AND kind = ? AND args = ?",
+                    (dsn, kind, json.dumps(args))).fetchone()
+        except sqlite3.Error as e:
+            self.logger.warning("Metadata cache %s: %s", self.path, str(e))
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), time() - row[1]
+
+    def put(self, dsn: str, kind: str, args: list, rows: list) -> None:
+        try:
+            data = json.dumps(rows, default = str)
+            with self._lock:
+                db = self._conn()
+                with db:
+                    db.execute(
+                        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                        (dsn, kind, json.dumps(args), data, time()))
+        except sqlite3.Error as e:
+            self.logger.warning("Metadata cache %s: %s", self.path, str(e))
+
+    def lookup(
+            self,
+            dsn: str,
+            kind: str,
+            args: list,
+            fetch: Callable[[], list],
+            background: bool = True,
+            fresh: bool = False) -> List:
+        """ Cached rows for the call, fetch() ones otherwise.  Empty
+            results are not cached: catalog calls also return nothing
+            when they fail.  Entries due for a refresh are re-fetched in
+            the background, and served meanwhile, if background is set;
+            otherwise right away, falling back to the cached rows if the
+            fetch comes back empty.  With fresh, the cache is only
+            updated, never served from. """
+        entry = self.get(dsn, kind, args) if not fresh else None
+        if entry is not None:
+            rows, age = entry
+            if age <= self.max_age:
+                if age <= self.refresh_after:
+                    return rows
+                if background:
+                    self._refresh_later(dsn, kind, args, fetch)
+                    return rows
+                fresh = fetch()
+                if not len(fresh):
+                    return rows
+                self.put(dsn, kind, args, fresh)
+                return fresh
+        rows = fetch()
+        if len(rows):
+            self.put(dsn, kind, args, rows)
+        return rows
+
+    def _refresh_later(self, dsn: str, kind: str, args: list, fetch: Callable) -> None:
+        key = (dsn, kind, json.dumps(args))
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                        max_workers = 1, thread_name_prefix = "mdcache")
+        self._executor.submit(self._refresh, key, dsn, kind, args, fetch)
+
+    def _refresh(self, key, dsn: str, kind: str, args: list, fetch: Callable) -> None:
+        try:
+            rows = fetch()
+            if len(rows):
+                self.put(dsn, kind, args, rows)
+        except Exception as e:
+            self.logger.warning("Refreshing %s %s: %s", kind, str(args), str(e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def expire(self, dsn: str) -> None:
+        """ Have all of dsn's entries refreshed when next used; after DDL,
+            for example """
+        try:
+            with self._lock:
+                db = self._conn()
+                with db:
+                    db.execute(
+                        "UPDATE entries SET fetched = MIN(fetched, ?) WHERE dsn = ?",
+                        (time() - self.refresh_after - 1, dsn))
+        except sqlite3.Error as e:
+            self.logger.warning("Metadata cache %s: %s", self.path, str(e))
+
+    def clear(self, dsn: str) -> None:
+        try:
+            with self._lock:
+                db = self._conn()
+                with db:
+                    db.execute("DELETE FROM entries WHERE dsn = ?", (dsn, ))
+        except sqlite3.Error as e:
+            self.logger.warning("Metadata cache %s: %s", self.path, str(e))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait = False)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+def get_metadata_cache(config) -> Optional[metadataCache]:
+    """ metadataCache as configured, None if disabled """
+    if not config["main"].as_bool("metadata_cache"):
+        return None
+    path = config["main"]["metadata_cache_file"]
+    if path == "default":
+        path = config_location() + "metadata.db"
+    return metadataCache(
+            expanduser(path),
+            refresh_after = config["main"].as_float("metadata_cache_refresh"),
+            max_age = config["main"].as_float("metadata_cache_max_age"))
@@ -0,0 +1,66 @@
+import re
+from time import time
+from typing import List, Optional
+from .fetch import estimate_row_bytes
+
+# Five character SQLSTATE, with at least one digit, e.g. 42S02 or HYT00, as
+# framed in driver manager / nanodbc messages: "[08S01] ...", "(08S01) ...",
+# "('08S01', ...", "...: 08S01: ..." or at the very start, followed by ":".
+# Not just any five character token: ORA-00942, or numbers in the text of
+# the message, would otherwise pass for one.
+_sqlstate_re = re.compile(
+        r"(?:^|[\[(']|:\s)(?=[0-9A-Z]*[0-9])([0-9A-Z]{5})(?=[\])':])")
+
+def sqlstate(e: Exception) -> Optional[str]:
+    """ SQLSTATE found in the error message, None if there is none """
+    m = _sqlstate_re.search(str(e))
+    return m.group(1) if m else None
+
+def error_class(e: Exception) -> str:
+    return sqlstate(e) or type(e).__name__
+
+class queryMetrics:
+    """ Where the time went for one statement.  All times are in seconds:
+        first_row_time is measured from the start of execution;
+        fetch_time is the time spent in fetchmany round trips; format_time
+        is CPU time spent rendering pages; pager_time is the wall time the
+        results were on screen. """
+    def __init__(self, dsn: str, query: str) -> None:
+        self.dsn = dsn
+        self.query = query
+        self.start: float = time()
+        self.execute_time: float = 0
+        self.first_row_time: Optional[float] = None
+        self.fetch_time: float = 0
+        self.fetches: int = 0
+        self.rows: int = 0
+        self.nbytes: int = 0
+        self.format_time: float = 0
+        self.pager_time: float = 0
+        self.error: Optional[str] = None
+        # SQLSTATE if the driver reported one, "timeout", or the exception
+        # class otherwise
+        self.error_class: Optional[str] = None
+        # Set once written to the query log
+        self.logged: bool = False
+
+    def record_fetch(self, rows: List, elapsed: float) -> None:
+        self.fetch_time += elapsed
+        self.fetches += 1
+        if len(rows):
+            if self.first_row_time is None:
+                self.first_row_time = time() - self.start
+            self.rows += len(rows)
+            self.nbytes += int(estimate_row_bytes(rows) * len(rows))
+
+    def summary(self) -> str:
+        lines = [
+            "Execute:   %0.3fs" % self.execute_time,
+            "First row: %s" % ("%0.3fs" % self.first_row_time
+                if self.first_row_time is not None else "-"),
+            "Fetch:     %0.3fs (%d rows, %0.1f MB, %d round trips)" % (
+                self.fetch_time, self.rows, self.nbytes / 1024 / 1024, self.fetches),
+            "Format:    %0.3fs CPU" % self.format_time]
+        if self.pager_time > 0:
+            lines.append("Pager:     %0.3fs" % self.pager_time)
+        return "\n".join(lines)
@@ -0,0 +1,87 @@
+""" Paging through a forward only result set in both directions. """
+from collections import OrderedDict
+from typing import Callable, List, Optional
+from .spool import rowSpool
+
+class pageWindow:
+    """ Pages of a result set read with fetch(n), which returns at most n
+        rows and fewer only once the result set is exhausted.
+
+        Every fetched row is written through to a rowSpool, so that paging
+        back never re-executes the query; the max_pages most recently shown
+        pages are also kept in memory, so that flipping between neighbouring
+        pages does not touch the spool either.  on_fetch(rows, complete), if
+        given, is called with every batch of newly fetched rows. """
+    def __init__(
+            self,
+            fetch: Callable[[int], list],
+            spool_dir: Optional[str] = None,
+            max_pages: int = 8,
+            on_fetch: Optional[Callable] = None) -> None:
+        self.fetch = fetch
+        self.spool_dir = spool_dir
+        self.max_pages = max_pages
+        self.on_fetch = on_fetch
+        # Top row of the page shown
+        self.pos: int = 0
+        self.fetched: int = 0
+        self.complete: bool = False
+        self._spool: Optional[rowSpool] = None
+        self._pages: OrderedDict = OrderedDict()
+
+    def page(self, start: int, size: int) -> List:
+        """ Rows start to start + size, fetching as many as needed; fewer
+            at the end of the result set """
+        key = (start, size)
+        if key in self._pages:
+            self._pages.move_to_end(key)
+            return self._pages[key]
+        new_start = self.fetched
+        new = []
+        while not self.complete and self.fetched < start + size:
+            want = start + size - self.fetched
+            rows = self.fetch(want)
+            self.complete = len(rows) < want
+            if len(rows):
+                if self._spool is None:
+                    self._spool = rowSpool(self.spool_dir)
+                self._spool.append(rows)
+                self.fetched += len(rows)
+                new.extend(rows)
+            if self.on_fetch is not None:
+                self.on_fetch(rows, self.complete)
+        if start >= new_start:
+            # Forward: just fetched, no need to read it back
+            res = new[start - new_start:start - new_start + size]
+        else:
+            res = self._spool.read(start, min(start + size, self.fetched))
+        self._pages[key] = res
+        if len(self._pages) > self.max_pages:
+            self._pages.popitem(last = False)
+        return res
+
+    def current(self, size: int) -> List:
+        return self.page(self.pos, size)
+
+    def forward(self, size: int) -> Optional[List]:
+        """ The next page, None if already on the last one """
+        if self.complete and self.pos + size >= self.fetched:
+            return None
+        rows = self.page(self.pos + size, size)
+        if not len(rows):
+            return None
+        self.pos += size
+        return rows
+
+    def back(self, size: int) -> Optional[List]:
+        """ The previous page, None if already on the first one """
+        if self.pos == 0:
+            return None
+        self.pos = max(self.pos - size, 0)
+        return self.page(self.pos, size)
+
+    def close(self) -> None:
+        self._pages.clear()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
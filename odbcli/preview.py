@@ -7,11 +7,13 @@ from prompt_toolkit.layout.dimension import Dimension as D
 from prompt_toolkit.widgets import Button, TextArea, SearchToolbar, Box, Shadow, Frame
 from prompt_toolkit.layout.containers import Window, VSplit, HSplit, ConditionalContainer
 from prompt_toolkit.filters import is_done
+from prompt_toolkit.key_binding import KeyBindings
 from cyanodbc import ConnectError, DatabaseError
 from cli_helpers.tabular_output import TabularOutputFormatter
-from functools import partial
+from asyncio import wrap_future
 from .filters import ShowPreview
 from .conn import connWrappers, connStatus, executionStatus
+from .pagewindow import pageWindow
 from logging import getLogger
 
 def preview_element(my_app: "sqlApp"):
@@ -19,8 +21,21 @@ def preview_element(my_app: "sqlApp"):
     Press Enter in the input box to page through the table.
     Alternatively, enter a filtering SQL statement and then press Enter
     to page through the results.
+    PageUp / PageDown page back and forth.
+    Press Ctrl-R to re-run the query, bypassing the preview cache.
     """
     formatter = TabularOutputFormatter()
+    # The query being previewed, identified by its preview cache key; when
+    # served from the cache, the top row of the page shown (None before the
+    # first), otherwise the pageWindow over its results, the connection it
+    # reads from, and the row to start from once created.  running is set
+    # while a query or fetch is under way; seq changes whenever the preview
+    # is reset, telling a fetch that finishes afterwards to discard its
+    # results.
+    state = {"key": None, "new": False, "cached": False, "pos": None,
+            "window": None, "resume": 0, "running": False, "conn": None,
+            "seq": 0}
+    kb = KeyBindings()
     input_buffer = Buffer(
             name = "previewbuffer",
             tempfile_suffix = ".sql",
@@ -30,7 +45,8 @@ def preview_element(my_app: "sqlApp"):
     input_control = BufferControl(
             buffer = input_buffer,
             include_default_input_processors = False,
-            preview_search = False
+            preview_search = False,
+            key_bindings = kb
     )
     input_window = Window(
             input_control,
@@ -56,34 +72,148 @@ def preview_element(my_app: "sqlApp"):
             ]
             )
 
-    def refresh_results(window_height) -> bool:
-        sql_conn = my_app.selected_object.conn
+    def set_output(output: str) -> None:
+        output_field.buffer.set_document(Document(
+            text = output, cursor_position = 0), True)
+
+    def reset(**kwargs) -> None:
+        window = state["window"]
+        if window is not None:
+            # On the worker thread, which may still be reading through it
+            state["conn"].submit(window.close)
+        state.update(window = None, resume = 0, pos = None, seq = state["seq"] + 1)
+        state.update(**kwargs)
+
+    def release(sql_conn) -> None:
+        """ On the worker thread, after the query and fetches queued there """
+        sql_conn.close_cursor()
+        sql_conn.status = connStatus.IDLE
 
+    def cache_writer(key, cols, new: bool):
+        """ on_fetch for a pageWindow: adds the rows fetched to the preview
+            cache, starting the entry over first if new """
+        started = [not new]
+
+        def _on_fetch(rows, complete) -> None:
+            cache = my_app.preview_cache
+            if cache is None or key is None:
+                return
+            if not started[0]:
+                cache.start(key, cols)
+                started[0] = True
+            cache.extend(key, rows, complete = complete)
+        return _on_fetch
+
+    def page_text(sql_conn, window, window_height, step, key, new, resume):
+        """ Runs on the connection's worker thread: fetches the page and
+            returns it formatted, None if there is no page to move to, along
+            with the pageWindow read through.  If window is None, one is
+            created, starting at row resume; it is up to the caller, on the
+            event loop, to keep or close it. """
         if sql_conn.execution_status == executionStatus.FAIL:
             # Let's display the error message to the user
-            output = sql_conn.execution_err
+            return sql_conn.execution_err, window
+        crsr = sql_conn.cursor
+        if crsr.description:
+            cols = [col.name for col in crsr.description]
         else:
-            crsr = sql_conn.cursor
-            if crsr.description:
-                cols = [col.name for col in crsr.description]
-            else:
-                cols = []
-            if len(cols):
-                sql_conn.status = connStatus.FETCHING
-                res = sql_conn.async_fetchmany(size = window_height - 4)
-                output = formatter.format_output(res, cols, format_name = "psql")
-                output = "\n".join(output)
-            else:
-                sql_conn.status = connStatus.IDLE
-                output = "No rows returned\n"
-
-        # Add text to output buffer.
-        output_field.buffer.set_document(Document(
-            text = output, cursor_position = 0), True)
+            cols = []
+        if not len(cols):
+            sql_conn.status = connStatus.IDLE
+            return "No rows returned\n", window
+        sql_conn.status = connStatus.FETCHING
+        size = window_height - 4
+        if window is None:
+            window = pageWindow(
+                    fetch = sql_conn.fetchmany,
+                    spool_dir = my_app.spool_dir,
+                    max_pages = my_app.preview_memory_pages,
+                    on_fetch = cache_writer(key, cols, new))
+            window.pos = resume
+            res = window.current(size)
+            if not len(res) and window.pos > 0:
+                # Resumed past the end of the result set
+                window.pos = max(window.fetched - size, 0)
+                res = window.current(size)
+        elif step < 0:
+            res = window.back(size)
+        else:
+            res = window.forward(size)
+        if res is None:
+            # First or last page already shown
+            return None, window
+        output = formatter.format_output(res, cols, format_name = "psql")
+        return "\n".join(output), window
+
+    def run(sql_conn, query, window_height, step) -> None:
+        """ Execute query, if given, and show the next page (previous, with
+            a negative step), without leaving the application: the work
+            is done on the connection's worker thread """
+        state["conn"] = sql_conn
+        seq = state["seq"]
+        window = state["window"]
+        args = (state["key"], state["new"], state["resume"])
 
+        async def _run():
+            state["running"] = True
+            try:
+                if query is not None:
+                    set_output("Executing query...")
+                    await wrap_future(sql_conn.submit(sql_conn.execute, query))
+                    if seq != state["seq"]:
+                        return
+                output, new_window = await wrap_future(sql_conn.submit(
+                    page_text, sql_conn, window, window_height, step, *args))
+            except Exception as e:
+                # Dropped connection, failed fetch ...: nothing to page
+                # through any more
+                if seq == state["seq"]:
+                    reset(key = None, new = False, cached = False)
+                    set_output("Error: %s" % str(e))
+                sql_conn.submit(release, sql_conn)
+                return
+            finally:
+                state["running"] = False
+            if seq != state["seq"]:
+                # Closed, or replaced, while fetching: nobody is going to
+                # page through, or close, a window created meanwhile
+                if new_window is not None and new_window is not window:
+                    sql_conn.submit(new_window.close)
+                return
+            if new_window is not window:
+                state.update(window = new_window, new = False, resume = 0)
+            if output is not None:
+                set_output(output)
+                # Logged once, after the first page
+                my_app.log_query(sql_conn, "preview")
+
+        my_app.application.create_background_task(_run())
+
+    def show_cached_page(entry, window_height, step = 1) -> bool:
+        """ Next, or with a negative step previous, page from the preview
+            cache.  Returns False, if the cache has run out of rows for an
+            incomplete result set. """
+        size = window_height - 4
+        pos = state["pos"]
+        if pos is None:
+            new = 0
+        elif (step < 0 and pos == 0) or \
+                (step > 0 and entry.complete and pos + size >= len(entry.rows)):
+            # First or last page already shown
+            return True
+        else:
+            new = max(pos + step * size, 0)
+        if new >= len(entry.rows) and not entry.complete:
+            state["resume"] = new
+            return False
+        res = entry.rows[new:new + size]
+        state["pos"] = new
+        output = formatter.format_output(res, entry.cols, format_name = "psql")
+        set_output("-- cached %ds ago; Ctrl-R to refresh --\n" % entry.age +
+                "\n".join(output))
         return True
 
-    def accept(buff: Buffer) -> bool:
+    def preview_query() -> str:
         obj = my_app.selected_object
         sql_conn = obj.conn
         catalog = None
@@ -104,27 +234,76 @@ def preview_element(my_app: "sqlApp"):
             schema =  (sql_conn.quotechar + "%s" + sql_conn.quotechar) % schema
         name = (sql_conn.quotechar + "%s" + sql_conn.quotechar) % obj.name
         identifier = ".".join(list(filter(None, [catalog, schema, obj.name])))
-        query = sql_conn.preview_query(table = identifier, filter_query = buff.text,
+        return sql_conn.preview_query(table = identifier, filter_query = input_buffer.text,
                 limit = my_app.preview_limit_rows)
 
-        func = partial(refresh_results,
-                window_height = output_field.window.render_info.window_height)
+    def accept(buff: Buffer, refresh: bool = False, step: int = 1) -> bool:
+        sql_conn = my_app.selected_object.conn
+        cache = my_app.preview_cache
+        query = preview_query()
+        info = output_field.window.render_info
+        if info is not None:
+            window_height = info.window_height
+        else:
+            # Not rendered yet
+            window_height = my_app.application.output.get_size()[0] - 10
+        key = (sql_conn.dsn, sql_conn.current_catalog(), query)
+
+        if cache is not None and not refresh:
+            if state["key"] != key:
+                entry = cache.get(key)
+                if entry is not None:
+                    reset(key = key, new = False, cached = True)
+            if state["key"] == key and state["cached"]:
+                entry = cache.get(key)
+                if entry is not None and show_cached_page(entry, window_height, step):
+                    return True
+                # Expired, or paged past what was cached: run the query,
+                # picking up from the requested page
+                refresh = True
+
+        if state["running"]:
+            return True
+        job = my_app.jobs.running_on(sql_conn)
+        if job is not None:
+            # Would only queue up behind the job on the worker
+            set_output("%s is busy with background job %d; see \\jobs" %
+                    (sql_conn.dsn, job.id))
+            return True
         # If status is IDLE, this is the first time we are executing.
-        if sql_conn.query != query or sql_conn.status == connStatus.IDLE:
-            # Exit the app to execute the query
-            my_app.application.exit(result = ["preview", query])
-            my_app.application.pre_run_callables.append(func)
+        if refresh or sql_conn.query != query or sql_conn.status == connStatus.IDLE:
+            resume = state["resume"] if state["key"] == key else 0
+            reset(key = key, new = True, cached = False, resume = resume)
+            run(sql_conn, query, window_height, step)
         else:
-            # No need to exit let's just go and fetch
-            func()
+            # Already executed, just go and fetch
+            run(sql_conn, None, window_height, step)
         return True # Keep filter text
 
+    @kb.add("c-r")
+    def _(event):
+        " Re-run the preview query, bypassing the cache "
+        accept(input_buffer, refresh = True)
+
+    @kb.add("pagedown")
+    def _(event):
+        " Next page "
+        accept(input_buffer)
+
+    @kb.add("pageup")
+    def _(event):
+        " Previous page "
+        accept(input_buffer, step = -1)
+
     input_buffer.accept_handler = accept
 
     def cancel_handler() -> None:
         sql_conn = my_app.selected_object.conn
-        sql_conn.close_cursor()
-        sql_conn.status = connStatus.IDLE
+        if state["running"]:
+            # Otherwise release waits, behind the query, on the worker
+            sql_conn.cancel()
+        reset(key = None, new = False, cached = False)
+        sql_conn.submit(release, sql_conn)
         input_buffer.text = ""
         output_field.buffer.set_document(Document(
             text = help_text, cursor_position = 0
@@ -0,0 +1,115 @@
+""" Structured query log: one JSON object per executed statement, appended
+    to a file for consumption by external tooling (and \\slowlog).  Queries
+    are identified by a fingerprint, the statement with comments removed,
+    literals replaced by ? and white space collapsed, so that runs of the
+    same statement with different values group together. """
+import json
+import re
+from logging import getLogger
+from datetime import datetime, timezone
+from hashlib import sha1
+from os.path import expanduser
+from threading import Lock
+from typing import Optional
+from sqlparse import parse as sqlparse_parse
+from sqlparse.tokens import Comment, Literal, Whitespace, Newline
+from .config import config_location, ensure_dir_exists
+from .metrics import queryMetrics
+
+logger = getLogger(__name__)
+
+# (?, ?, ?) -> (?), so that IN lists of any length group together
+_placeholder_list_re = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+def fingerprint(query: str) -> str:
+    parts = []
+    for stmt in sqlparse_parse(query):
+        for tok in stmt.flatten():
+            ttype = tok.ttype
+            if ttype in Comment:
+                continue
+            if ttype in Whitespace or ttype in Newline:
+                if len(parts) and parts[-1] != " ":
+                    parts.append(" ")
+            elif (ttype in Literal.String and ttype not in Literal.String.Symbol) \
+                    or ttype in Literal.Number:
+                parts.append("?")
+            else:
+                parts.append(tok.normalized)
+    res = "".join(parts).strip().rstrip(";").strip()
+    return _placeholder_list_re.sub("(?)", res)
+
+def fingerprint_id(fp: str) -> str:
+    return sha1(fp.encode("utf-8")).hexdigest()[:16]
+
+def _round(v: Optional[float]) -> Optional[float]:
+    return round(v, 6) if v is not None else None
+
+class queryLog:
+    """ Appends entries to the JSON lines file at path.  Statement text is
+        only logged if include_text is set; the fingerprint always is. """
+    def __init__(self, path: str, include_text: bool = False) -> None:
+        self.path = path
+        self.include_text = include_text
+        self._lock = Lock()
+        self._f = None
+
+    def entry(self, metrics: queryMetrics, catalog: Optional[str], source: str) -> dict:
+        fp = fingerprint(metrics.query)
+        entry = {
+            "ts": datetime.fromtimestamp(metrics.start, timezone.utc).isoformat(),
+            "dsn": metrics.dsn,
+            "catalog": catalog,
+            "source": source,
+            "fingerprint": fp,
+            "fingerprint_id": fingerprint_id(fp),
+            "execute_s": _round(metrics.execute_time),
+            "first_row_s": _round(metrics.first_row_time),
+            "fetch_s": _round(metrics.fetch_time),
+            "format_cpu_s": _round(metrics.format_time),
+            "pager_s": _round(metrics.pager_time),
+            "rows": metrics.rows,
+            "bytes": metrics.nbytes,
+            "error_class": metrics.error_class
+        }
+        if self.include_text:
+            entry["query"] = metrics.query
+        return entry
+
+    def log(self, metrics: queryMetrics, catalog: Optional[str], source: str) -> None:
+        """ source: main, preview or batch.  Each statement is logged once,
+            later calls with the same metrics are ignored.  Failing to
+            write the log never fails the query; it is reported in the
+            application log instead. """
+        if metrics is None or metrics.logged:
+            return
+        metrics.logged = True
+        line = json.dumps(self.entry(metrics, catalog, source)) + "\n"
+        with self._lock:
+            try:
+                if self._f is None:
+                    ensure_dir_exists(self.path)
+                    self._f = open(self.path, "a", encoding = "utf-8")
+                self._f.write(line)
+                self._f.flush()
+            except OSError as e:
+                logger.warning("Unable to write query log %s: %s", self.path, str(e))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+def query_log_path(config) -> str:
+    path = config["main"]["query_log_file"]
+    if path == "default":
+        path = config_location() + "querylog.jsonl"
+    return expanduser(path)
+
+def get_query_log(config) -> Optional[queryLog]:
+    """ queryLog as configured, None if disabled """
+    if not config["main"].as_bool("query_log"):
+        return None
+    return queryLog(query_log_path(config),
+            include_text = config["main"].as_bool("query_log_text"))
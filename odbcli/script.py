@@ -0,0 +1,124 @@
+""" SQL scripts: splitting into batches on GO lines, and executing them one
+    after the other.  Scripts are read line by line, so that multi-megabyte
+    deployment scripts are never held in memory (or in a prompt_toolkit
+    buffer) all at once; only the batch being executed is. """
+import re
+from collections import namedtuple
+from time import time
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .conn import sqlConnection
+
+scriptBatch = namedtuple("scriptBatch", ["text", "line", "repeat"])
+
+# GO, alone on its line, optionally followed by a repeat count, as with
+# sqlcmd / SSMS
+_go_re = re.compile(r"^\s*go(?:\s+(\d+))?\s*(?:--.*)?$", re.IGNORECASE)
+
+def _scan(line: str, quote: Optional[str], depth: int) -> Tuple[Optional[str], int]:
+    """ Lexer state at the end of line, given the state at its start.
+        quote: closing character of the open string / quoted identifier;
+        depth: block comment nesting (T-SQL allows nested comments). """
+    i = 0
+    n = len(line)
+    while i < n:
+        c = line[i]
+        if depth:
+            if line.startswith("*/", i):
+                depth -= 1
+                i += 2
+                continue
+            if line.startswith("/*", i):
+                depth += 1
+                i += 2
+                continue
+        elif quote is not None:
+            if c == quote:
+                if i + 1 < n and line[i + 1] == quote:
+                    # Doubled: escaped, the quote stays open
+                    i += 2
+                    continue
+                quote = None
+        elif c == "'" or c == '"':
+            quote = c
+        elif c == "[":
+            quote = "]"
+        elif line.startswith("--", i):
+            break
+        elif line.startswith("/*", i):
+            depth += 1
+            i += 2
+            continue
+        i += 1
+    return quote, depth
+
+def split_batches(lines: Iterable[str]) -> Iterator[scriptBatch]:
+    """ Yields the batches of a script, given as an iterable of lines (an
+        open file, for example).  A line holding only GO ends a batch,
+        unless it is inside a string or block comment.  Scripts without GO
+        are a single batch. """
+    buf = []
+    start = 1
+    quote = None
+    depth = 0
+    for lineno, line in enumerate(lines, 1):
+        if quote is None and depth == 0:
+            m = _go_re.match(line)
+            if m is not None:
+                text = "".join(buf).strip()
+                if len(text):
+                    yield scriptBatch(text, start, int(m.group(1) or 1))
+                buf = []
+                continue
+        if not len(buf):
+            if not len(line.strip()):
+                continue
+            start = lineno
+        quote, depth = _scan(line, quote, depth)
+        buf.append(line)
+    text = "".join(buf).strip()
+    if len(text):
+        yield scriptBatch(text, start, 1)
+
+class scriptResult:
+    def __init__(self) -> None:
+        self.batches: int = 0
+        self.failed: int = 0
+        self.elapsed: float = 0
+        self.stopped: bool = False
+
+def run_script(
+        sql_conn: "sqlConnection",
+        lines: Iterable[str],
+        stop_on_error: bool = True,
+        on_result: Optional[Callable] = None,
+        progress: Optional[Callable] = None) -> scriptResult:
+    """ Execute the batches of a script one after another.  After each
+        execution, on_result(batch, crsr) is called, to consume any result
+        set (and it should, before the next batch runs; returning False
+        ends the run) and progress(n, batch, elapsed, error), to report on
+        it.  With stop_on_error, the first failing batch ends the run. """
+    res = scriptResult()
+    start = time()
+    for batch in split_batches(lines):
+        for _ in range(batch.repeat):
+            res.batches += 1
+            t = time()
+            crsr = sql_conn.async_execute(batch.text)
+            # Cleared by every execution; set if it failed
+            err = sql_conn.execution_err
+            carry_on = True
+            if on_result is not None:
+                carry_on = on_result(batch, crsr) is not False
+            sql_conn.close_cursor()
+            if progress is not None:
+                progress(res.batches, batch, time() - t, err)
+            if err is not None:
+                res.failed += 1
+            if not carry_on or (err is not None and stop_on_error):
+                res.stopped = True
+                res.elapsed = time() - start
+                return res
+    res.elapsed = time() - start
+    return res
@@ -0,0 +1,165 @@
+""" Slow query report over the JSON lines query log.
+
+    Parsing months of JSON on every report would get slow, so the log is
+    indexed, incrementally, into a small SQLite database next to it: each
+    run only reads what was appended since the last one.  Fingerprint text
+    is stored once; entries hold only the numbers the report needs. """
+import json
+import os
+import sqlite3
+from datetime import datetime
+from math import ceil
+from os.path import splitext
+from time import time
+from typing import List, Optional
+from cli_helpers.tabular_output import TabularOutputFormatter
+
+_schema = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    ts REAL NOT NULL,
+    dsn TEXT,
+    fingerprint_id TEXT NOT NULL,
+    latency REAL NOT NULL,
+    rows INTEGER NOT NULL,
+    error_class TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_group
+    ON entries (dsn, fingerprint_id, latency);
+CREATE TABLE IF NOT EXISTS indexed (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+"""
+
+def index_path(log_path: str) -> str:
+    return splitext(log_path)[0] + ".index.db"
+
+def _percentile(ordered: List[float], p: float) -> float:
+    """ Nearest-rank percentile of an ascending list """
+    k = max(ceil(p / 100 * len(ordered)) - 1, 0)
+    return ordered[min(k, len(ordered) - 1)]
+
+class slowLog:
+    def __init__(self, log_path: str, db_path: Optional[str] = None) -> None:
+        self.log_path = log_path
+        self.db = sqlite3.connect(db_path or index_path(log_path))
+        self.db.executescript(_schema)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def update(self, batch_size: int = 10000) -> int:
+        """ Index entries appended to the log since the last update.
+            Returns the number of entries added. """
+        if not os.path.exists(self.log_path):
+            return 0
+        row = self.db.execute(
+                "SELECT offset FROM indexed WHERE path = ?",
+                (self.log_path, )).fetchone()
+        offset = row[0] if row else 0
+        if os.path.getsize(self.log_path) < offset:
+            # Truncated or replaced: what was indexed stays, read it all
+            offset = 0
+        added = 0
+        fps = {}
+        entries = []
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partially written; picked up next time
+                    break
+                offset += len(line)
+                try:
+                    e = json.loads(line)
+                    ts = datetime.fromisoformat(e["ts"]).timestamp()
+                    latency = (e.get("execute_s") or 0) + (e.get("fetch_s") or 0)
+                    fps[e["fingerprint_id"]] = e["fingerprint"]
+                    entries.append((ts, e.get("dsn"), e["fingerprint_id"],
+                        latency, e.get("rows") or 0, e.get("error_class")))
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if len(entries) >= batch_size:
+                    added += self._insert(fps, entries, offset)
+                    fps = {}
+                    entries = []
+        added += self._insert(fps, entries, offset)
+        return added
+
+    def _insert(self, fps: dict, entries: list, offset: int) -> int:
+        with self.db:
+            self.db.executemany(
+                    "INSERT OR IGNORE INTO fingerprints (id, fingerprint) "
+                    "VALUES (?, ?)", fps.items())
+            self.db.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)", entries)
+            self.db.execute(
+                    "INSERT OR REPLACE INTO indexed (path, offset) VALUES (?, ?)",
+                    (self.log_path, offset))
+        return len(entries)
+
+    def report(self, since_days: float = 0, top: int = 20) -> List[tuple]:
+        """ Per DSN and fingerprint: (dsn, count, errors, p50, p95, max
+            latency, average rows, fingerprint), slowest p95 first.  Latency
+            is execute plus fetch time. """
+        since = time() - since_days * 86400 if since_days > 0 else 0
+        res = []
+        group = None
+        latencies = []
+        rows = errors = 0
+
+        def _flush():
+            if group is not None:
+                res.append((group[0], len(latencies), errors,
+                    _percentile(latencies, 50), _percentile(latencies, 95),
+                    latencies[-1], rows / len(latencies), group[1]))
+
+        for dsn, fp_id, latency, nrows, error_class in self.db.execute(
+                "SELECT dsn, fingerprint_id, latency, rows, error_class "
+                "FROM entries WHERE ts >= ? "
+                "ORDER BY dsn, fingerprint_id, latency", (since, )):
+            if group != (dsn, fp_id):
+                _flush()
+                group = (dsn, fp_id)
+                latencies = []
+                rows = errors = 0
+            latencies.append(latency)
+            rows += nrows
+            errors += error_class is not None
+        _flush()
+        res.sort(key = lambda r: r[4], reverse = True)
+        res = res[:top]
+        fps = dict(self.db.execute(
+                "SELECT id, fingerprint FROM fingerprints WHERE id IN (%s)" %
+                ", ".join("?" * len(res)), [r[7] for r in res]).fetchall()) \
+            if len(res) else {}
+        return [r[:7] + (fps.get(r[7], r[7]), ) for r in res]
+
+def format_report(rows: List[tuple], max_query_width: int = 80) -> str:
+    headers = ["dsn", "count", "errors", "p50 (s)", "p95 (s)", "max (s)",
+            "avg rows", "query"]
+    def _trunc(s):
+        return s if len(s) <= max_query_width else s[:max_query_width - 1] + "…"
+    data = [(r[0], r[1], r[2], "%0.3f" % r[3], "%0.3f" % r[4], "%0.3f" % r[5],
+        "%0.1f" % r[6], _trunc(r[7])) for r in rows]
+    return "\n".join(TabularOutputFormatter().format_output(
+        data, headers, format_name = "psql"))
+
+def slow_query_report(log_path: str, since_days: float = 0, top: int = 20) -> str:
+    """ Update the index and return the formatted report """
+    if not os.path.exists(log_path) and not os.path.exists(index_path(log_path)):
+        return "No query log at %s; see query_log in odbclirc." % log_path
+    sl = slowLog(log_path)
+    try:
+        sl.update()
+        rows = sl.report(since_days = since_days, top = top)
+    finally:
+        sl.close()
+    if not len(rows):
+        return "No queries logged%s." % (
+            " in the last %g days" % since_days if since_days > 0 else "")
+    return format_report(rows)
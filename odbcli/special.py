@@ -0,0 +1,556 @@
+""" Backslash commands entered in the main buffer.  These are intercepted in
+    cli.interactive before anything is sent to the database. """
+import re
+import sqlite3
+from collections import namedtuple
+from os.path import expanduser
+from time import time
+from sqlparse import parse as sqlparse_parse
+from sqlparse.tokens import Name
+from click import echo_via_pager, secho
+from cli_helpers.tabular_output import TabularOutputFormatter
+from .conn import connStatus, format_pages
+from .export import export_query, export_rows, ExportError
+from .fanout import fanoutQuery
+from .jobs import jobStatus
+from .load import load_file, LoadError
+from .querylog import query_log_path
+from .script import run_script
+from .slowlog import slow_query_report
+from .fetch import repage
+
+SpecialCommand = namedtuple(
+        "SpecialCommand", ["handler", "command", "syntax", "description"])
+
+COMMANDS = {}
+
+class CommandError(Exception):
+    pass
+
+def special_command(command: str, syntax: str, description: str):
+    def wrapper(handler):
+        COMMANDS[command] = SpecialCommand(handler, command, syntax, description)
+        return handler
+    return wrapper
+
+def is_special_command(text: str) -> bool:
+    return text.strip().startswith("\\")
+
+def parse_special_command(text: str):
+    parts = text.strip().split(None, 1)
+    cmd = parts[0]
+    arg = parts[1].strip() if len(parts) > 1 else ""
+    return cmd, arg
+
+def execute(my_app: "sqlApp", text: str):
+    """ Returns what the handler returns: None, or for commands executing
+        a query, the (sqlConnection, cursor) to display results from """
+    cmd, arg = parse_special_command(text)
+    if cmd not in COMMANDS.keys():
+        raise CommandError("Unknown command: %s.  Try \\?" % cmd)
+    return COMMANDS[cmd].handler(my_app, arg)
+
+def _require_conn(my_app: "sqlApp"):
+    sql_conn = my_app.active_conn
+    if sql_conn is None or not sql_conn.connected():
+        raise CommandError("Not connected.  Select a connection in the "
+                "object browser first.")
+    job = my_app.jobs.running_on(sql_conn)
+    if job is not None:
+        raise CommandError("%s is busy with background job %d; see \\jobs" %
+                (sql_conn.dsn, job.id))
+    return sql_conn
+
+def _release(sql_conn) -> None:
+    """ Reset sql_conn and close its cursor, on the worker thread: after
+        anything, a cancelled statement say, still running there """
+    def _close():
+        sql_conn.status = connStatus.IDLE
+        sql_conn.close_cursor()
+    sql_conn.submit(_close)
+
+def _interruptible(sql_conn, fn, *args, **kwargs):
+    """ fn(*args, **kwargs), waiting on a statement executed on sql_conn.
+        On Ctrl-C the statement is cancelled, sql_conn released, and
+        CommandError raised. """
+    try:
+        return fn(*args, **kwargs)
+    except KeyboardInterrupt:
+        secho("Cancelling query...", err = True, fg = "red")
+        sql_conn.cancel()
+        _release(sql_conn)
+        raise CommandError("Query cancelled.")
+
+@special_command("\\?", "\\?", "Show available commands.")
+def show_help(my_app: "sqlApp", arg: str) -> None:
+    for cmd in sorted(COMMANDS.keys()):
+        secho("%-40s %s" % (COMMANDS[cmd].syntax, COMMANDS[cmd].description))
+
+class progressLine:
+    """ Rewrites a single status line on stderr, at most every interval
+        seconds """
+    def __init__(self, interval: float = 0.5) -> None:
+        self.interval = interval
+        self._last = 0
+
+    def _due(self, final: bool) -> bool:
+        now = time()
+        if not final and now - self._last < self.interval:
+            return False
+        self._last = now
+        return True
+
+    def __call__(self, rows: int, nbytes: int, elapsed: float, final: bool = False) -> None:
+        if not self._due(final):
+            return
+        rate = rows / elapsed if elapsed > 0 else 0
+        secho("\r%d rows, %0.1f rows/s, %0.1f MB written " %
+                (rows, rate, nbytes / 1024 / 1024),
+                nl = final, err = True)
+
+@special_command(
+        "\\export",
+        "\\export file.{csv,tsv,jsonl,parquet,arrow} query",
+        "Stream the results of the query to a file.")
+def export(my_app: "sqlApp", arg: str) -> None:
+    parts = arg.split(None, 1)
+    if len(parts) < 2:
+        raise CommandError("Usage: \\export file.csv SELECT ...")
+    sql_conn = _require_conn(my_app)
+    path = expanduser(parts[0])
+    try:
+        export_query(
+            sql_conn,
+            query = parts[1],
+            path = path,
+            default_format = my_app.table_format,
+            batch_size = my_app.fetch_batch_size,
+            progress = progressLine())
+    except (ExportError, ValueError, OSError) as e:
+        raise CommandError(str(e))
+    except KeyboardInterrupt:
+        sql_conn.cancel()
+        raise CommandError("Export cancelled.")
+    finally:
+        _release(sql_conn)
+
+def _fanout_conns(my_app: "sqlApp", targets: str) -> list:
+    """ Connections to run on, leaving out, with a warning, any busy with
+        a background job: the query would only queue up behind the job on
+        the connection's worker """
+    connected = [obj.conn for obj in my_app.obj_list if obj.conn.connected()]
+    if targets == "*":
+        conns = connected
+    else:
+        by_dsn = dict((c.dsn, c) for c in connected)
+        conns = []
+        for dsn in targets.split(","):
+            dsn = dsn.strip()
+            if not len(dsn):
+                continue
+            if dsn not in by_dsn.keys():
+                raise CommandError("%s is not connected" % dsn)
+            if by_dsn[dsn] not in conns:
+                conns.append(by_dsn[dsn])
+    idle = []
+    for c in conns:
+        job = my_app.jobs.running_on(c)
+        if job is None:
+            idle.append(c)
+        else:
+            secho("Skipping %s, busy with background job %d; see \\jobs" %
+                    (c.dsn, job.id), err = True, fg = "red")
+    if not len(conns):
+        raise CommandError("No connected data sources")
+    if not len(idle):
+        raise CommandError("All data sources are busy with background jobs")
+    return idle
+
+@special_command(
+        "\\fanout",
+        "\\fanout {*|dsn1,dsn2,...} query",
+        "Run the query on several connections concurrently.")
+def fanout(my_app: "sqlApp", arg: str) -> None:
+    parts = arg.split(None, 1)
+    if len(parts) < 2:
+        raise CommandError("Usage: \\fanout * SELECT ...")
+    conns = _fanout_conns(my_app, parts[0])
+    fq = fanoutQuery(conns, parts[1], batch_size = my_app.fetch_batch_size)
+    secho("Executing on %d connections...Ctrl-c to cancel" % len(conns))
+    batches = iter(fq)
+    try:
+        # Pull the first batch so that the column names are known
+        first = next(batches, None)
+        if first is not None:
+            def _batches():
+                yield first
+                yield from batches
+            ht = my_app.application.output.get_size()[0]
+            page_size = max(ht - 3 - my_app.pager_reserve_lines, 1)
+            echo_via_pager(format_pages(
+                    repage(_batches(), page_size), fq.cols,
+                    my_app.table_format,
+                    max_col_width = my_app.max_column_width))
+    except KeyboardInterrupt:
+        secho("Cancelling query...", err = True, fg = "red")
+        fq.cancel()
+    finally:
+        batches.close()
+    _fanout_summary(fq.results)
+
+def _fanout_summary(results: list) -> None:
+    rows = [(r.dsn, r.status, r.rows, "%0.3f" % r.execute_time,
+        "%0.3f" % r.total_time, r.error or "") for r in results]
+    headers = ["dsn", "status", "rows", "execute (s)", "total (s)", "error"]
+    secho("\n".join(TabularOutputFormatter().format_output(
+        rows, headers, format_name = "psql")))
+
+class preparedStatement:
+    """ A statement registered with \\prepare, and its bound values """
+    def __init__(self, sql: str) -> None:
+        self.sql = sql
+        markers = [tok.value for tok in sqlparse_parse(sql)[0].flatten()
+                if tok.ttype in Name.Placeholder]
+        # Only ? markers are bound by the driver; $1, :name and the like
+        # would be sent to the server as they are
+        other = [m for m in markers if m != "?"]
+        if len(other):
+            raise CommandError("Unsupported parameter marker %s; use ?" % other[0])
+        self.nparams = len(markers)
+        self.values = None
+
+# Single quoted, SQL style ('' escapes a quote), or bare values, separated
+# by white space and / or commas
+_value_re = re.compile(r"\s*(?:'((?:[^']|'')*)'|([^\s,']+))\s*,?")
+
+def parse_values(text: str) -> list:
+    """ Bare NULL is None and bare integers are int; anything else,
+        including quoted values, is passed as a string and left for the
+        driver to convert """
+    values = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _value_re.match(text, pos)
+        if m is None or m.end() == pos:
+            raise CommandError("Unable to parse values at: %s" % text[pos:])
+        pos = m.end()
+        quoted, bare = m.groups()
+        if quoted is not None:
+            values.append(quoted.replace("''", "'"))
+        elif bare.upper() == "NULL":
+            values.append(None)
+        elif re.fullmatch(r"[-+]?\d+", bare):
+            values.append(int(bare))
+        else:
+            values.append(bare)
+    return values
+
+def _statement(my_app: "sqlApp", name: str) -> preparedStatement:
+    if name not in my_app.statements.keys():
+        raise CommandError("No prepared statement named %s" % name)
+    return my_app.statements[name]
+
+@special_command(
+        "\\prepare",
+        "\\prepare [name query]",
+        "Register a query with ? parameters under name; list them without arguments.")
+def prepare(my_app: "sqlApp", arg: str) -> None:
+    parts = arg.split(None, 1)
+    if len(parts) == 0:
+        for name in sorted(my_app.statements.keys()):
+            stmt = my_app.statements[name]
+            secho("%s (%d parameters%s): %s" % (
+                name, stmt.nparams,
+                "" if stmt.values is None else ", bound", stmt.sql))
+        return
+    if len(parts) < 2:
+        raise CommandError("Usage: \\prepare name SELECT ... WHERE col = ?")
+    my_app.statements[parts[0]] = stmt = preparedStatement(parts[1])
+    secho("Prepared %s (%d parameters)" % (parts[0], stmt.nparams))
+
+@special_command(
+        "\\bind",
+        "\\bind name value, ...",
+        "Bind values to a prepared statement's parameters, for \\exec.")
+def bind(my_app: "sqlApp", arg: str) -> None:
+    parts = arg.split(None, 1)
+    if len(parts) < 1:
+        raise CommandError("Usage: \\bind name value, ...")
+    stmt = _statement(my_app, parts[0])
+    values = parse_values(parts[1] if len(parts) > 1 else "")
+    if len(values) != stmt.nparams:
+        raise CommandError("%s takes %d parameters, %d given" %
+                (parts[0], stmt.nparams, len(values)))
+    stmt.values = values
+
+@special_command(
+        "\\exec",
+        "\\exec name [value, ...]",
+        "Execute a prepared statement, with the values given or bound.")
+def exec_prepared(my_app: "sqlApp", arg: str):
+    parts = arg.split(None, 1)
+    if len(parts) < 1:
+        raise CommandError("Usage: \\exec name [value, ...]")
+    stmt = _statement(my_app, parts[0])
+    if len(parts) > 1:
+        values = parse_values(parts[1])
+    else:
+        values = stmt.values if stmt.values is not None else []
+    if len(values) != stmt.nparams:
+        raise CommandError("%s takes %d parameters, %d given" %
+                (parts[0], stmt.nparams, len(values)))
+    sql_conn = _require_conn(my_app)
+    start = time()
+    crsr = _interruptible(sql_conn, sql_conn.async_execute,
+            stmt.sql, values if len(values) else None, prepared = True)
+    if my_app.timing_enabled:
+        print("Time: %0.03fs" % (time() - start))
+    return sql_conn, crsr
+
+class loadProgressLine(progressLine):
+    def __call__(self, rows: int, elapsed: float, final: bool = False) -> None:
+        if not self._due(final):
+            return
+        rate = rows / elapsed if elapsed > 0 else 0
+        secho("\r%d rows loaded, %0.1f rows/s " % (rows, rate),
+                nl = final, err = True)
+
+@special_command(
+        "\\load",
+        "\\load file.{csv,tsv,jsonl} into [schema.]table",
+        "Bulk insert the rows of a file into an existing table.")
+def load(my_app: "sqlApp", arg: str) -> None:
+    m = re.fullmatch(r"(.+?)\s+into\s+(\S+)", arg.strip(), flags = re.IGNORECASE)
+    if m is None:
+        raise CommandError("Usage: \\load file.csv into schema.table")
+    sql_conn = _require_conn(my_app)
+    try:
+        load_file(
+            sql_conn,
+            path = expanduser(m.group(1).strip().strip("'\"")),
+            table = m.group(2),
+            batch_size = my_app.load_batch_size,
+            commit_interval = my_app.load_commit_interval,
+            progress = loadProgressLine())
+    except (LoadError, OSError) as e:
+        raise CommandError(str(e))
+    finally:
+        sql_conn.status = connStatus.IDLE
+
+@special_command(
+        "\\i",
+        "\\i file.sql [continue]",
+        "Execute a script, batch by batch (split on GO lines), stopping at "
+        "the first error unless continue is given.")
+def include(my_app: "sqlApp", arg: str) -> None:
+    # Imported here: cli imports this module
+    from .cli import show_results
+    parts = arg.rsplit(None, 1)
+    stop_on_error = True
+    if len(parts) == 2 and parts[1].lower() == "continue":
+        stop_on_error = False
+        arg = parts[0]
+    path = expanduser(arg.strip().strip("'\""))
+    if not len(path):
+        raise CommandError("Usage: \\i file.sql [continue]")
+    sql_conn = _require_conn(my_app)
+
+    def _on_result(batch, crsr):
+        if crsr is not None and crsr.description:
+            show_results(my_app, sql_conn, crsr)
+        my_app.log_query(sql_conn, "main")
+
+    def _progress(n, batch, elapsed, err):
+        if err is None:
+            secho("Batch %d (line %d): %0.3fs" % (n, batch.line, elapsed))
+        else:
+            secho("Batch %d (line %d): %0.3fs, query error: %s" % (
+                n, batch.line, elapsed, err), err = True, fg = "red")
+
+    try:
+        with open(path, "r", encoding = "utf-8") as f:
+            res = run_script(sql_conn, f, stop_on_error = stop_on_error,
+                    on_result = _on_result, progress = _progress)
+    except OSError as e:
+        raise CommandError(str(e))
+    except KeyboardInterrupt:
+        sql_conn.cancel()
+        secho("Script interrupted", err = True, fg = "red")
+        return
+    finally:
+        sql_conn.close_cursor()
+        sql_conn.status = connStatus.IDLE
+    secho("%d batches, %d failed, %0.3fs%s" % (res.batches, res.failed,
+        res.elapsed, " (stopped)" if res.stopped else ""),
+        fg = "red" if res.failed else None)
+
+@special_command(
+        "\\timeout",
+        "\\timeout [seconds [query]]",
+        "Show or set the active connection's query timeout (0: none), or "
+        "run a single query with the given timeout.")
+def timeout(my_app: "sqlApp", arg: str):
+    sql_conn = _require_conn(my_app)
+    parts = arg.split(None, 1)
+    if len(parts) == 0:
+        if sql_conn.query_timeout > 0:
+            secho("Query timeout for %s: %gs" % (sql_conn.dsn, sql_conn.query_timeout))
+        else:
+            secho("No query timeout for %s" % sql_conn.dsn)
+        return None
+    try:
+        seconds = float(parts[0])
+    except ValueError:
+        raise CommandError("Usage: \\timeout [seconds [query]]")
+    if seconds < 0:
+        raise CommandError("Timeout can not be negative")
+    if len(parts) == 1:
+        sql_conn.query_timeout = seconds
+        return None
+    start = time()
+    crsr = _interruptible(sql_conn, sql_conn.async_execute,
+            parts[1], timeout = seconds)
+    if my_app.timing_enabled:
+        print("Time: %0.03fs" % (time() - start))
+    return sql_conn, crsr
+
+@special_command(
+        "\\timing",
+        "\\timing [on|off|verbose]",
+        "Toggle query timing; verbose adds an execute / fetch / format breakdown.")
+def timing(my_app: "sqlApp", arg: str) -> None:
+    arg = arg.strip().lower()
+    if arg == "":
+        my_app.timing_enabled = not my_app.timing_enabled
+        my_app.timing_verbose = False
+    elif arg in ("on", "off", "verbose"):
+        my_app.timing_enabled = arg != "off"
+        my_app.timing_verbose = arg == "verbose"
+    else:
+        raise CommandError("Usage: \\timing [on|off|verbose]")
+    secho("Timing is %s." % ("verbose" if my_app.timing_verbose
+        else "on" if my_app.timing_enabled else "off"))
+
+@special_command(
+        "\\slowlog",
+        "\\slowlog [top [days]]",
+        "Slowest statements in the query log, by 95th percentile latency.")
+def slowlog(my_app: "sqlApp", arg: str) -> None:
+    parts = arg.split()
+    try:
+        top = int(parts[0]) if len(parts) > 0 else 20
+        days = float(parts[1]) if len(parts) > 1 else 0
+    except ValueError:
+        raise CommandError("Usage: \\slowlog [top [days]]")
+    try:
+        report = slow_query_report(
+                query_log_path(my_app.config), since_days = days, top = top)
+    except (OSError, sqlite3.Error) as e:
+        raise CommandError("Unable to read the query log: %s" % str(e))
+    echo_via_pager(report)
+
+@special_command(
+        "\\refresh",
+        "\\refresh",
+        "Forget the active connection's cached catalog metadata, so that "
+        "completion reads it again.")
+def refresh(my_app: "sqlApp", arg: str) -> None:
+    sql_conn = my_app.active_conn
+    if sql_conn is None:
+        raise CommandError("Not connected.  Select a connection in the "
+                "object browser first.")
+    if my_app.metadata_cache is not None:
+        my_app.metadata_cache.clear(sql_conn.dsn)
+    my_app.completer.reset_completions()
+    secho("Metadata for %s will be read again" % sql_conn.dsn)
+
+@special_command(
+        "\\bg",
+        "\\bg query",
+        "Run the query in the background, spooling its results; see \\jobs.")
+def background(my_app: "sqlApp", arg: str) -> None:
+    if not len(arg.strip()):
+        raise CommandError("Usage: \\bg SELECT ...")
+    sql_conn = _require_conn(my_app)
+    job = my_app.jobs.submit(sql_conn, arg.strip())
+    secho("Started job %d on %s" % (job.id, sql_conn.dsn))
+
+def _job(my_app: "sqlApp", job_id: str):
+    try:
+        job = my_app.jobs.get(int(job_id))
+    except ValueError:
+        job = None
+    if job is None:
+        raise CommandError("No job %s" % job_id)
+    return job
+
+def _list_jobs(my_app: "sqlApp") -> None:
+    rows = [(job.id, job.dsn, job.status.value, "%0.1f" % job.elapsed,
+        job.rows, job.error or " ".join(job.query.split())[:60])
+        for job in my_app.jobs.jobs]
+    if not len(rows):
+        secho("No jobs")
+        return
+    headers = ["job", "dsn", "status", "elapsed (s)", "rows", "query / error"]
+    secho("\n".join(TabularOutputFormatter().format_output(
+        rows, headers, format_name = "psql")))
+
+@special_command(
+        "\\jobs",
+        "\\jobs [show|export|cancel|drop] [id] [row|file]",
+        "List background jobs; page through (from row), export, cancel or "
+        "drop one.")
+def jobs(my_app: "sqlApp", arg: str) -> None:
+    parts = arg.split(None, 2)
+    if len(parts) == 0:
+        _list_jobs(my_app)
+        my_app.jobs.seen()
+        return
+    if len(parts) < 2:
+        raise CommandError("Usage: \\jobs [show|export|cancel|drop] id [file]")
+    action = parts[0].lower()
+    job = _job(my_app, parts[1])
+    if action == "cancel":
+        my_app.jobs.cancel(job)
+        return
+    if not job.finished:
+        raise CommandError("Job %d is still running" % job.id)
+    if action == "drop":
+        my_app.jobs.drop(job)
+    elif action == "show":
+        if job.status == jobStatus.FAILED:
+            raise CommandError("Job %d failed: %s" % (job.id, job.error))
+        if not len(job.cols):
+            secho("No rows returned")
+            return
+        start = 0
+        if len(parts) > 2:
+            try:
+                start = int(parts[2]) - 1
+            except ValueError:
+                raise CommandError("Usage: \\jobs show id [row]")
+            if start < 0 or start >= job.rows:
+                raise CommandError("Job %d has %d rows" % (job.id, job.rows))
+        ht = my_app.application.output.get_size()[0]
+        page_size = max(ht - 3 - my_app.pager_reserve_lines, 1)
+        # Straight to the row from the spool's index, without reading
+        # the rows before it
+        echo_via_pager(format_pages(
+                repage(job.spool.batches(start), page_size), job.cols,
+                my_app.table_format, job.description,
+                max_col_width = my_app.max_column_width))
+    elif action == "export":
+        if len(parts) < 3:
+            raise CommandError("Usage: \\jobs export id file.csv")
+        if not len(job.cols):
+            raise CommandError("Job %d did not return a result set" % job.id)
+        try:
+            export_rows(job.spool.batches(), job.cols, job.description,
+                    path = expanduser(parts[2]),
+                    default_format = my_app.table_format,
+                    progress = progressLine())
+        except (ExportError, ValueError, OSError) as e:
+            raise CommandError(str(e))
+    else:
+        raise CommandError("Usage: \\jobs [show|export|cancel|drop] id [file]")
@@ -0,0 +1,94 @@
+""" On-disk storage for result sets, so that results of background queries
+    and scrollback do not have to be held in memory. """
+import mmap
+import os
+import pickle
+from array import array
+from bisect import bisect_right
+from tempfile import mkstemp
+from threading import Lock
+from typing import Iterator, Optional
+
+class rowSpool:
+    """ Append-only temporary file of row batches.  Batches are pickled,
+        preserving value types (Decimal, datetime, bytes ...).  The file is
+        removed by close.
+
+        An index of batch offsets, and of the number of the first row in
+        each batch, is kept in memory (16 bytes per batch), so that any
+        row can be read back without scanning the file: a binary search
+        finds its batch, which is unpickled from a memory map of the
+        file. """
+    def __init__(self, directory: Optional[str] = None) -> None:
+        fd, self.path = mkstemp(prefix = "odbcli-", suffix = ".spool", dir = directory)
+        self._f = os.fdopen(fd, "w+b")
+        self._lock = Lock()
+        self._offsets = array("Q")
+        self._first_rows = array("Q")
+        self._size: int = 0
+        self._mm: Optional[mmap.mmap] = None
+        self.rows: int = 0
+
+    def append(self, rows: list) -> None:
+        if not len(rows):
+            return
+        data = pickle.dumps([tuple(r) for r in rows], protocol = pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._f.seek(self._size)
+            self._f.write(data)
+            self._f.flush()
+            self._offsets.append(self._size)
+            self._first_rows.append(self.rows)
+            self._size += len(data)
+            self.rows += len(rows)
+
+    def _batch(self, i: int) -> list:
+        with self._lock:
+            start = self._offsets[i]
+            end = self._offsets[i + 1] if i + 1 < len(self._offsets) else self._size
+            if self._mm is None or len(self._mm) < end:
+                # Grown since last mapped
+                if self._mm is not None:
+                    self._mm.close()
+                self._mm = mmap.mmap(self._f.fileno(), 0, access = mmap.ACCESS_READ)
+            data = self._mm[start:end]
+        return pickle.loads(data)
+
+    def batches(self, start: int = 0) -> Iterator[list]:
+        """ Batches in the order they were appended, beginning with the row
+            numbered start (0 based).  Safe to call while rows are still
+            being appended: only what is there when called is read. """
+        with self._lock:
+            n = len(self._offsets)
+            rows = self.rows
+        if start >= rows:
+            return
+        i = bisect_right(self._first_rows, start) - 1
+        skip = start - self._first_rows[i]
+        for i in range(i, n):
+            rows = self._batch(i)
+            if skip:
+                rows = rows[skip:]
+                skip = 0
+            yield rows
+
+    def read(self, start: int, stop: int) -> list:
+        """ Rows start up to, but not including, stop """
+        res = []
+        if stop <= start:
+            return res
+        for rows in self.batches(start):
+            res.extend(rows[:stop - start - len(res)])
+            if len(res) >= stop - start:
+                break
+        return res
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+                os.unlink(self.path)
@@ -0,0 +1,225 @@
+""" Streaming table formatter.
+
+    cli_helpers' format_output re-runs its preprocessors, re-measures every
+    cell and recomputes column widths for every page it is handed, so columns
+    move around from one page to the next.  Here, column widths and
+    alignment are decided once per result set, from cursor.description and a
+    sample (the first page), after which every row is rendered by per-column
+    formatting functions.  With max_col_width > 0, values wider than their
+    column are truncated; otherwise a column is widened, for the page at
+    hand and all that follow, when a value does not fit. """
+from decimal import Decimal
+from typing import Callable, List, Optional
+from wcwidth import wcswidth
+
+NULL = "<null>"
+ELLIPSIS = "…"
+
+# (left, column separator, right, fill) for each kind of line; None means
+# the style does not draw that line.
+_line_styles = {
+    "psql": {
+        "top": ("+-", "-+-", "-+", "-"),
+        "header_sep": ("|-", "-+-", "-|", "-"),
+        "row_sep": None,
+        "bottom": ("+-", "-+-", "-+", "-"),
+        "row": ("| ", " | ", " |")
+    },
+    "grid": {
+        "top": ("+-", "-+-", "-+", "-"),
+        "header_sep": ("+=", "=+=", "=+", "="),
+        "row_sep": ("+-", "-+-", "-+", "-"),
+        "bottom": ("+-", "-+-", "-+", "-"),
+        "row": ("| ", " | ", " |")
+    },
+    "simple": {
+        "top": None,
+        "header_sep": ("", "  ", "", "-"),
+        "row_sep": None,
+        "bottom": None,
+        "row": ("", "  ", "")
+    },
+    "plain": {
+        "top": None,
+        "header_sep": None,
+        "row_sep": None,
+        "bottom": None,
+        "row": ("", "  ", "")
+    }
+}
+
+_numeric_types = (int, float, Decimal)
+
+def _width(s: str) -> int:
+    if s.isascii():
+        return len(s)
+    w = wcswidth(s)
+    return w if w >= 0 else len(s)
+
+def _to_str(value) -> str:
+    if value is None:
+        return NULL
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return value.decode("utf-8")
+        except UnicodeDecodeError:
+            return "0x" + value.hex()
+    return str(value)
+
+def _cell_formatter(
+        width: int,
+        right_align: bool,
+        overflow: Optional[Callable[[int], None]] = None) -> Callable:
+    """ Returns a function rendering a value into exactly width columns.
+        If overflow is given, values wider than that are not truncated:
+        they are returned as is, after calling overflow with their width. """
+    def fmt(value) -> str:
+        s = _to_str(value)
+        if "\n" in s or "\r" in s or "\t" in s:
+            s = s.replace("\r", " ").replace("\n", " ").replace("\t", " ")
+        if s.isascii():
+            n = len(s)
+            if n > width:
+                if overflow is not None:
+                    overflow(n)
+                    return s
+                return s[:width - 1] + ELLIPSIS
+            return s.rjust(width) if right_align else s.ljust(width)
+        n = _width(s)
+        if n > width and overflow is not None:
+            overflow(n)
+            return s
+        if n > width:
+            while n > width - 1:
+                s = s[:-1]
+                n = _width(s)
+            s = s + ELLIPSIS
+            n = n + 1
+        pad = " " * (width - n)
+        return pad + s if right_align else s + pad
+    return fmt
+
+class streamingTableFormatter:
+    styles = tuple(_line_styles.keys())
+    # Columns whose declared display size is at most this wide are sized
+    # to fit any value; wider ones are sized from the sample
+    trust_display_size = 30
+
+    def __init__(
+            self,
+            cols: List[str],
+            sample: list,
+            description: Optional[list] = None,
+            format_name: str = "psql",
+            max_col_width: int = 60) -> None:
+        self.cols = cols
+        self.truncate = max_col_width > 0
+        self.style = _line_styles[format_name]
+        self.widths = []
+        self.right_align = []
+        for i, name in enumerate(cols):
+            col_desc = description[i] if description else None
+            values = [row[i] for row in sample]
+            self.right_align.append(self._is_numeric(col_desc, values))
+            self.widths.append(
+                self._col_width(name, col_desc, values, max_col_width))
+        left, mid, right = self.style["row"]
+        self._left = left
+        self._mid = mid
+        self._right = right
+        # Borderless styles: no trailing padding, as with tabulate
+        self._strip = right == ""
+        # Column index -> width needed by a value that did not fit
+        self._overflow: dict = {}
+        self._layout()
+
+    def _layout(self) -> None:
+        """ Formatting functions, lines and header for the current widths """
+        if self.truncate:
+            self._fmts = [_cell_formatter(w, r)
+                    for w, r in zip(self.widths, self.right_align)]
+        else:
+            self._fmts = [_cell_formatter(w, r, self._overflow_fn(i))
+                    for i, (w, r) in enumerate(zip(self.widths, self.right_align))]
+        self._lines = dict(
+                (k, self._line(self.style[k]))
+                for k in ("top", "header_sep", "row_sep", "bottom"))
+        self._header = self.format_row(self.cols)
+
+    def _overflow_fn(self, i: int) -> Callable[[int], None]:
+        def _overflow(n: int) -> None:
+            self._overflow[i] = max(n, self._overflow.get(i, 0))
+        return _overflow
+
+    @staticmethod
+    def _is_numeric(col_desc, values: list) -> bool:
+        type_code = getattr(col_desc, "type_code", None)
+        if type_code in _numeric_types:
+            return True
+        non_null = [v for v in values if v is not None]
+        return len(non_null) > 0 and all(
+                isinstance(v, _numeric_types) and not isinstance(v, bool)
+                for v in non_null)
+
+    def _col_width(self, name: str, col_desc, values: list, max_col_width: int) -> int:
+        width = max([_width(_to_str(v)) for v in values] + [0])
+        display_size = getattr(col_desc, "display_size", 0) or 0
+        if 0 < display_size <= self.trust_display_size:
+            width = max(width, display_size, len(NULL))
+        if max_col_width > 0:
+            width = min(width, max_col_width)
+        return max(width, _width(name), 1)
+
+    def _line(self, spec) -> Optional[str]:
+        if spec is None:
+            return None
+        left, mid, right, fill = spec
+        return left + mid.join(fill * w for w in self.widths) + right
+
+    def format_row(self, row) -> str:
+        line = self._left + \
+            self._mid.join([f(v) for f, v in zip(self._fmts, row)]) + \
+            self._right
+        return line.rstrip() if self._strip else line
+
+    def format_page(self, rows: list) -> str:
+        """ A complete table (borders and header included) for rows.  Without
+            truncation, columns too narrow for the page are widened first. """
+        body = self.body_lines(rows)
+        if len(self._overflow):
+            for i, n in self._overflow.items():
+                self.widths[i] = n
+            self._overflow.clear()
+            self._layout()
+            body = self.body_lines(rows)
+        lines = self.header_lines()
+        lines.extend(body)
+        if self._lines["bottom"] is not None:
+            lines.append(self._lines["bottom"])
+        return "\n".join(lines)
+
+    def header_lines(self) -> List[str]:
+        lines = []
+        if self._lines["top"] is not None:
+            lines.append(self._lines["top"])
+        lines.append(self._header)
+        if self._lines["header_sep"] is not None:
+            lines.append(self._lines["header_sep"])
+        return lines
+
+    def body_lines(self, rows: list, continued: bool = False) -> List[str]:
+        """ continued: rows follow rows already rendered in the same table """
+        row_sep = self._lines["row_sep"]
+        fmt = self.format_row
+        if row_sep is None:
+            return [fmt(row) for row in rows]
+        lines = []
+        for i, row in enumerate(rows):
+            if i or continued:
+                lines.append(row_sep)
+            lines.append(fmt(row))
+        return lines
+
+    def footer_lines(self) -> List[str]:
+        bottom = self._lines["bottom"]
+        return [bottom] if bottom is not None else []
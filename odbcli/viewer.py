@@ -0,0 +1,228 @@
+""" In-application results window: queries are executed on the connection's
+    worker thread while the prompt_toolkit event loop keeps running, and
+    their results are paged through here, instead of exiting the
+    application to hand them to an external pager. """
+from asyncio import wrap_future
+from time import time
+from prompt_toolkit.document import Document
+from prompt_toolkit.filters import is_done
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout.containers import HSplit, VSplit, ConditionalContainer, Window
+from prompt_toolkit.layout.controls import FormattedTextControl
+from prompt_toolkit.layout.dimension import Dimension as D
+from prompt_toolkit.layout.processors import ConditionalProcessor, HighlightIncrementalSearchProcessor, HighlightSelectionProcessor
+from prompt_toolkit.filters import has_focus
+from prompt_toolkit.widgets import Button, TextArea, SearchToolbar, Frame, Shadow
+from .conn import connStatus, executionStatus, format_pages
+from .filters import ShowResults
+from .pagewindow import pageWindow
+
+class resultsViewer:
+    """ Frame displaying one page of the results of the last query executed
+        with run.  PageUp / PageDown page back and forth (rows read are
+        spooled, see pageWindow), Ctrl-C cancels the query, Escape closes
+        the window and releases the cursor. """
+    def __init__(self, my_app: "sqlApp") -> None:
+        self.my_app = my_app
+        self.sql_conn = None
+        self.window: pageWindow = None
+        self.cols = []
+        self.description = None
+        self.message = ""
+        self.opened: float = 0
+        self.execution: float = 0
+        # Guards against stale results of a query that was replaced
+        self._seq = 0
+
+        kb = KeyBindings()
+
+        @kb.add("pagedown")
+        @kb.add("enter")
+        def _(event):
+            " Next page "
+            self.page(1)
+
+        @kb.add("pageup")
+        def _(event):
+            " Previous page "
+            self.page(-1)
+
+        @kb.add("c-c")
+        def _(event):
+            " Cancel the query "
+            if self.sql_conn is not None:
+                self.sql_conn.cancel()
+
+        @kb.add("escape", eager = True)
+        def _(event):
+            " Close "
+            self.close()
+
+        search_field = SearchToolbar()
+        self.output_field = TextArea(style = "class:preview-output-field",
+                height = D(preferred = 50),
+                search_field = search_field,
+                wrap_lines = False,
+                focusable = True,
+                read_only = True,
+                preview_search = True,
+                input_processors = [
+                    ConditionalProcessor(
+                        processor = HighlightIncrementalSearchProcessor(),
+                        filter = has_focus(search_field.control),
+                        ),
+                    HighlightSelectionProcessor(),
+                ]
+                )
+        status = Window(FormattedTextControl(lambda: self.message), height = 1,
+                style = "class:preview-input-field")
+        frame = Shadow(
+                body = Frame(
+                    title = "Results",
+                    body = HSplit([
+                        VSplit([status, Button(text = "Done", handler = self.close)],
+                            padding = 1),
+                        Window(height = 1, char = "-", style = "class:preview-divider-line"),
+                        self.output_field,
+                        search_field],
+                        key_bindings = kb),
+                    style = "class:dialog.body",
+                    width = D(preferred = 180, min = 30),
+                    modal = True
+                )
+        )
+        self.container = ConditionalContainer(
+                content = frame,
+                filter = ShowResults(my_app) & ~is_done)
+
+    def __pt_container__(self):
+        return self.container
+
+    def _page_size(self) -> int:
+        info = self.output_field.window.render_info
+        if info is not None:
+            height = info.window_height
+        else:
+            height = self.my_app.application.output.get_size()[0] - 6
+        return max(height - 4, 1)
+
+    def _set_output(self, text: str) -> None:
+        self.output_field.buffer.set_document(Document(
+            text = text, cursor_position = 0), True)
+
+    def run(self, sql_conn, query: str) -> None:
+        """ Execute query on sql_conn, in the background, and show the
+            first page of results once there are any """
+        self.close(focus = False)
+        self._seq += 1
+        self.sql_conn = sql_conn
+        self.opened = time()
+        self.message = "Executing query... Ctrl-C to cancel"
+        self._set_output("")
+        self.my_app.show_results = True
+        self.my_app.application.layout.focus(self.output_field)
+        self.my_app.application.create_background_task(
+                self._execute(sql_conn, query, self._seq))
+
+    async def _execute(self, sql_conn, query: str, seq: int) -> None:
+        start = time()
+        try:
+            crsr = await wrap_future(sql_conn.submit(sql_conn.execute, query))
+        except Exception as e:
+            # Not a DatabaseError, which execute reports itself: lost
+            # connection and the like
+            if seq == self._seq:
+                self.message = "Query error"
+                self._set_output(str(e))
+            self._release(sql_conn, None)
+            return
+        execution = time() - start
+        if seq != self._seq:
+            # Closed, or replaced by another query, while executing
+            self._release(sql_conn, None)
+            return
+        if sql_conn.execution_status == executionStatus.FAIL:
+            self.message = "Query error"
+            self._set_output(sql_conn.execution_err)
+            self._release(sql_conn, None)
+            return
+        if not crsr.description:
+            self.message = "No rows returned (%0.3fs)" % execution
+            self._set_output("")
+            self._release(sql_conn, None)
+            return
+        self.cols = [col.name for col in crsr.description]
+        self.description = crsr.description
+        sql_conn.status = connStatus.FETCHING
+        self.window = pageWindow(
+                fetch = sql_conn.fetchmany,
+                spool_dir = self.my_app.spool_dir,
+                max_pages = self.my_app.preview_memory_pages)
+        self.execution = execution
+        await self._show(sql_conn, self.window, self.window.current, seq)
+
+    def page(self, step: int) -> None:
+        window = self.window
+        if window is None:
+            return
+        move = window.forward if step > 0 else window.back
+        self.my_app.application.create_background_task(
+                self._show(self.sql_conn, window, move, self._seq))
+
+    async def _show(self, sql_conn, window: pageWindow, move, seq: int) -> None:
+        """ Fetch the page, on the connection's worker thread, and show it """
+        if seq != self._seq:
+            # Closed before getting here; the window may be closed already
+            return
+        size = self._page_size()
+        try:
+            rows = await wrap_future(sql_conn.submit(move, size))
+        except Exception as e:
+            if seq != self._seq:
+                # Closed meanwhile, and released already
+                return
+            self.message = "Fetch error; Esc to close"
+            self._set_output(str(e))
+            self._release(sql_conn, window)
+            self.window = None
+            return
+        if seq != self._seq or rows is None:
+            return
+        self._set_output(next(format_pages(
+                [rows], self.cols, self.my_app.table_format, self.description,
+                max_col_width = self.my_app.max_column_width,
+                metrics = sql_conn.metrics)))
+        self.message = "Rows %d-%d%s  Execution: %0.3fs  PgUp/PgDn, Esc to close" % (
+                window.pos + 1 if len(rows) else 0, window.pos + len(rows),
+                " of %d" % window.fetched if window.complete else "",
+                self.execution)
+
+    def _release(self, sql_conn, window) -> None:
+        """ Log the query, and close its cursor, on the worker thread: a
+            fetch may still be queued there """
+        if sql_conn.metrics is not None:
+            sql_conn.metrics.pager_time = time() - self.opened
+        my_app = self.my_app
+
+        def _close():
+            my_app.log_query(sql_conn, "main")
+            sql_conn.status = connStatus.IDLE
+            sql_conn.close_cursor()
+            if window is not None:
+                window.close()
+        sql_conn.submit(_close)
+
+    def close(self, focus: bool = True) -> None:
+        # While executing, there is no window yet: cancel the query, and
+        # _execute releases the connection once it finds it has been closed
+        if self.window is None and self.sql_conn is not None and \
+                self.sql_conn.status == connStatus.EXECUTING:
+            self.sql_conn.cancel()
+        if self.window is not None:
+            self._release(self.sql_conn, self.window)
+            self.window = None
+        self.sql_conn = None
+        self._seq += 1
+        self.my_app.show_results = False
+        if focus:
+            self.my_app.application.layout.focus("defaultbuffer")
@@ -0,0 +1,74 @@
+import heapq
+from itertools import count
+from logging import getLogger
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable
+
+class watchdog:
+    """ Calls callbacks once their deadline has passed, unless they were
+        disarmed first.  A single daemon thread, started on first use,
+        serves any number of timers, kept in a heap ordered by deadline.
+
+        Used to enforce query timeouts: a timer is armed before a statement
+        is executed and disarmed once it returns; if it fires first, its
+        callback cancels the statement. """
+    def __init__(self, name: str = "watchdog") -> None:
+        self.name = name
+        self.logger = getLogger(__name__)
+        self._cond = Condition()
+        self._heap: list = []
+        self._armed: set = set()
+        self._seq = count()
+        self._thread: Thread = None
+
+    def arm(self, timeout: float, callback: Callable) -> int:
+        """ Returns a handle to pass to disarm """
+        with self._cond:
+            handle = next(self._seq)
+            heapq.heappush(self._heap, (monotonic() + timeout, handle, callback))
+            self._armed.add(handle)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(
+                        target = self._run, name = self.name, daemon = True)
+                self._thread.start()
+            self._cond.notify()
+        return handle
+
+    def disarm(self, handle: int) -> bool:
+        """ Returns False if the timer already fired """
+        with self._cond:
+            if handle not in self._armed:
+                return False
+            # Entry stays in the heap, and is skipped when it comes up
+            self._armed.discard(handle)
+            return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not len(self._heap):
+                    self._cond.wait()
+                deadline, handle, callback = self._heap[0]
+                if handle not in self._armed:
+                    heapq.heappop(self._heap)
+                    continue
+                wait = deadline - monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                self._armed.discard(handle)
+            try:
+                callback()
+            except Exception as e:
+                self.logger.warning("%s: callback raised %s", self.name, repr(e))
+
+_watchdog = None
+
+def get_watchdog() -> watchdog:
+    """ The process wide watchdog """
+    global _watchdog
+    if _watchdog is None:
+        _watchdog = watchdog()
+    return _watchdog
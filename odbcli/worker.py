@@ -0,0 +1,60 @@
+from concurrent.futures import Future
+from logging import getLogger
+from queue import Queue
+from threading import Lock, Thread
+from typing import Callable
+
+class connWorker:
+    """ Long lived worker thread executing, in submission order, the work
+        items handed to it; results are returned as futures.
+
+        We could use a single-threaded ThreadPoolExecutor here, however,
+        its threads are joined at interpreter exit, and a call stuck in the
+        driver would then prevent the client from exiting.  Our thread is a
+        daemon, started on first submit and stopped by shutdown (it is
+        restarted if work is submitted again).
+        """
+    def __init__(self, name: str = "connWorker") -> None:
+        self.name = name
+        self.logger = getLogger(__name__)
+        self._lock = Lock()
+        self._queue: Queue = None
+        self._thread: Thread = None
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        fut = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._queue = Queue()
+                self._thread = Thread(
+                        target = self._run,
+                        args = (self._queue, ),
+                        name = self.name,
+                        daemon = True)
+                self._thread.start()
+            self._queue.put((fut, fn, args, kwargs))
+        return fut
+
+    def shutdown(self) -> None:
+        """ Stop the thread once it is done with the work already queued """
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+            self._queue = None
+            self._thread = None
+
+    def _run(self, queue: Queue) -> None:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            fut, fn, args, kwargs = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                res = fn(*args, **kwargs)
+            except BaseException as e:
+                self.logger.debug("%s: work item raised %s", self.name, repr(e))
+                fut.set_exception(e)
+            else:
+                fut.set_result(res)
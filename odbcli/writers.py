@@ -0,0 +1,306 @@
+import csv
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import IO, List, Optional
+from cli_helpers.tabular_output import TabularOutputFormatter
+from .tableformat import streamingTableFormatter
+
+class rowWriter:
+    """ Writes a result set, one fetchmany batch at a time, to a text
+        stream.  Sub-classes implement a particular output format.  Nothing
+        is retained between batches. """
+    def __init__(self, stream: IO, cols: List[str]) -> None:
+        self.stream = stream
+        self.cols = cols
+        self.rows_written: int = 0
+
+    def write_header(self) -> None:
+        pass
+
+    def write_rows(self, rows: list) -> None:
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        self.stream.flush()
+
+class delimitedWriter(rowWriter):
+    delimiter = ","
+
+    def __init__(self, stream: IO, cols: List[str]) -> None:
+        super().__init__(stream, cols)
+        self._writer = csv.writer(
+                stream, delimiter = self.delimiter, lineterminator = "\n")
+
+    def write_header(self) -> None:
+        self._writer.writerow(self.cols)
+
+    def write_rows(self, rows: list) -> None:
+        self._writer.writerows(rows)
+        self.rows_written += len(rows)
+
+class csvWriter(delimitedWriter):
+    delimiter = ","
+
+class tsvWriter(delimitedWriter):
+    delimiter = "\t"
+
+def _json_default(obj):
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex()
+    return str(obj)
+
+class jsonlWriter(rowWriter):
+    """ One JSON object per row """
+    def write_rows(self, rows: list) -> None:
+        cols = self.cols
+        dumps = json.dumps
+        write = self.stream.write
+        for row in rows:
+            write(dumps(dict(zip(cols, row)), default = _json_default))
+            write("\n")
+        self.rows_written += len(rows)
+
+class tableWriter(rowWriter):
+    """ Fallback for every other format cli_helpers knows about; each batch
+        is formatted (and headed) independently. """
+    formatter = TabularOutputFormatter()
+
+    def __init__(
+            self,
+            stream: IO,
+            cols: List[str],
+            format_name: str = "psql") -> None:
+        super().__init__(stream, cols)
+        self.format_name = format_name
+
+    def write_rows(self, rows: list) -> None:
+        for line in self.formatter.format_output(
+                rows, self.cols, format_name = self.format_name):
+            self.stream.write(line)
+            self.stream.write("\n")
+        self.rows_written += len(rows)
+
+class streamingTableWriter(rowWriter):
+    """ A single table for the whole result set: header before the first
+        batch, which also fixes the column widths, and footer on close. """
+    def __init__(
+            self,
+            stream: IO,
+            cols: List[str],
+            format_name: str = "psql",
+            description: Optional[list] = None,
+            max_col_width: int = 60) -> None:
+        super().__init__(stream, cols)
+        self.format_name = format_name
+        self.description = description
+        self.max_col_width = max_col_width
+        self._table = None
+
+    def write_rows(self, rows: list) -> None:
+        if not len(rows):
+            return
+        lines = []
+        continued = self._table is not None
+        if not continued:
+            self._table = streamingTableFormatter(
+                    self.cols, rows, self.description,
+                    format_name = self.format_name,
+                    max_col_width = self.max_col_width)
+            lines = self._table.header_lines()
+        lines.extend(self._table.body_lines(rows, continued = continued))
+        self.stream.write("\n".join(lines))
+        self.stream.write("\n")
+        self.rows_written += len(rows)
+
+    def close(self) -> None:
+        if self._table is not None:
+            for line in self._table.footer_lines():
+                self.stream.write(line)
+                self.stream.write("\n")
+        super().close()
+
+def _import_pyarrow():
+    """ pyarrow is an optional dependency (pip install odbcli[arrow]) """
+    try:
+        import pyarrow
+    except ImportError:
+        raise ValueError(
+            "Parquet / Arrow output requires pyarrow: pip install pyarrow")
+    return pyarrow
+
+class columnarWriter(rowWriter):
+    """ Transposes every fetchmany batch into typed Arrow arrays.  Record
+        batches are buffered until row_group_size rows are pending, and then
+        written out, so memory use is bounded by row_group_size.  Column
+        types are taken from the Python type the driver reports in
+        cursor.description; anything else is written as strings, since a
+        type inferred from the first batch (all NULL, say, or a narrower
+        decimal) may not fit a later one.  Writes to a binary stream. """
+    def __init__(
+            self,
+            stream: IO,
+            cols: List[str],
+            description: Optional[list] = None,
+            row_group_size: int = 100000) -> None:
+        super().__init__(stream, cols)
+        self.pa = _import_pyarrow()
+        self.description = description
+        self.row_group_size = row_group_size
+        self.schema = None
+        # Per column, whether values are converted with str() first
+        self._as_str: List[bool] = []
+        self._sink = None
+        self._pending: list = []
+        self._pending_rows: int = 0
+
+    def _arrow_type(self, col_desc):
+        pa = self.pa
+        if col_desc is None:
+            return None
+        type_code = getattr(col_desc, "type_code", None)
+        if type_code is bool:
+            return pa.bool_()
+        if type_code is int:
+            return pa.int64()
+        if type_code is float:
+            return pa.float64()
+        if type_code is Decimal:
+            prec = getattr(col_desc, "precision", 0) or 0
+            scale = getattr(col_desc, "scale", 0) or 0
+            if 0 < prec <= 38 and 0 <= scale <= prec:
+                return pa.decimal128(prec, scale)
+            return pa.string()
+        if type_code is str:
+            return pa.string()
+        if type_code in (bytes, bytearray):
+            return pa.binary()
+        if type_code is datetime:
+            return pa.timestamp("us")
+        if type_code is date:
+            return pa.date32()
+        if type_code is time:
+            return pa.time64("us")
+        return None
+
+    def _make_schema(self):
+        pa = self.pa
+        fields = []
+        self._as_str = []
+        for i, name in enumerate(self.cols):
+            col_desc = self.description[i] if self.description else None
+            typ = self._arrow_type(col_desc)
+            type_code = getattr(col_desc, "type_code", None)
+            self._as_str.append(typ is None or
+                    (pa.types.is_string(typ) and type_code is not str))
+            if typ is None:
+                typ = pa.string()
+            fields.append(pa.field(name, typ))
+        return pa.schema(fields)
+
+    def _open_sink(self):
+        raise NotImplementedError()
+
+    def _write_batches(self, batches: list) -> None:
+        raise NotImplementedError()
+
+    def _flush(self) -> None:
+        if len(self._pending):
+            self._write_batches(self._pending)
+        self._pending = []
+        self._pending_rows = 0
+
+    def write_rows(self, rows: list) -> None:
+        if not len(rows):
+            return
+        pa = self.pa
+        columns = list(zip(*rows))
+        if self.schema is None:
+            self.schema = self._make_schema()
+            self._sink = self._open_sink()
+        arrays = []
+        for col, field, as_str in zip(columns, self.schema, self._as_str):
+            if as_str:
+                col = [v if v is None or isinstance(v, str) else str(v)
+                        for v in col]
+            try:
+                arrays.append(pa.array(col, type = field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError("Column %s: %s" % (field.name, str(e)))
+        self._pending.append(
+                pa.RecordBatch.from_arrays(arrays, schema = self.schema))
+        self._pending_rows += len(rows)
+        self.rows_written += len(rows)
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def close(self) -> None:
+        if self._sink is not None:
+            self._flush()
+            self._sink.close()
+        self.stream.flush()
+
+class parquetWriter(columnarWriter):
+    def _open_sink(self):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.stream, self.schema)
+
+    def _write_batches(self, batches: list) -> None:
+        # One row group per flush
+        table = self.pa.Table.from_batches(batches)
+        self._sink.write_table(table, row_group_size = table.num_rows)
+
+class arrowWriter(columnarWriter):
+    """ Arrow IPC file format (a.k.a. Feather V2) """
+    def _open_sink(self):
+        return self.pa.ipc.new_file(self.stream, self.schema)
+
+    def _write_batches(self, batches: list) -> None:
+        for batch in batches:
+            self._sink.write_batch(batch)
+
+writerClasses = {
+    "csv": csvWriter,
+    "tsv": tsvWriter,
+    "jsonl": jsonlWriter
+}
+
+# These write to a binary stream, and need the cursor description
+binaryWriterClasses = {
+    "parquet": parquetWriter,
+    "arrow": arrowWriter
+}
+
+def check_format(format_name: str) -> None:
+    """ Raises ValueError unless get_writer supports format_name; lets
+        callers reject it before executing anything """
+    if format_name in binaryWriterClasses.keys() or \
+            format_name in writerClasses.keys() or \
+            format_name in tableWriter.formatter.supported_formats:
+        return
+    raise ValueError("Unsupported output format: %s" % format_name)
+
+def get_writer(
+        format_name: str,
+        stream: IO,
+        cols: List[str],
+        description: Optional[list] = None,
+        max_col_width: int = 0) -> rowWriter:
+    """ max_col_width > 0 selects, where the format supports it, a single
+        streamed table with fixed (truncating) column widths. """
+    if format_name in binaryWriterClasses.keys():
+        return binaryWriterClasses[format_name](
+                stream, cols, description = description)
+    if format_name in writerClasses.keys():
+        return writerClasses[format_name](stream, cols)
+    if max_col_width > 0 and format_name in streamingTableFormatter.styles:
+        return streamingTableWriter(
+                stream, cols, format_name = format_name,
+                description = description, max_col_width = max_col_width)
+    if format_name not in tableWriter.formatter.supported_formats:
+        raise ValueError("Unsupported output format: %s" % format_name)
+    return tableWriter(stream, cols, format_name = format_name)
@@ -22,7 +22,8 @@ install_requirements = [
     'sqlparse >= 0.3.1',
     'configobj >= 5.0.6',
     'click >= 7.1.2',
-    'cli_helpers >= 2.0.1'
+    'cli_helpers >= 2.0.1',
+    'wcwidth >= 0.1.8'
 ]
 
 setuptools.setup(
@@ -35,6 +36,10 @@ setuptools.setup(
     long_description = long_description,
     long_description_content_type = "text/markdown",
     install_requires = install_requirements,
+    extras_require = {
+        # Parquet / Arrow IPC export
+        'arrow': ['pyarrow >= 1.0.0']
+    },
     url = "https://github.com/pypa/odbc-cli",
     scripts=[
         'odbc-cli'
@@ -46,6 +51,6 @@ setuptools.setup(
         "License :: OSI Approved :: BSD License",
         "Operating System :: OS Independent",
     ],
-    # As python prompt toolkit
-    python_requires = '>=3.6.1',
+    # str.isascii, time.thread_time
+    python_requires = '>=3.7',
 )
@@ -0,0 +1,137 @@
+""" Stand-ins for a cyanodbc connection, enough of it to drive sqlConnection
+    and the modules built on it without a driver, and for the
+    prompt_toolkit application the in-application windows run in """
+import asyncio
+from collections import namedtuple
+from threading import Event
+from types import SimpleNamespace
+from cyanodbc import DatabaseError
+
+stubColumn = namedtuple("stubColumn", "name type_code")
+
+
+class stubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rows = []
+        self.closed = False
+        self.cancelled = Event()
+
+    def execute(self, query, parameters = None):
+        assert not self.closed
+        if len(self.rows):
+            # Some drivers refuse to re-execute with results pending
+            raise DatabaseError("[24000] Invalid cursor state")
+        self.conn.executed.append((query, parameters))
+        if self.conn.on_execute is not None:
+            self.conn.on_execute(self, query)
+        if self.conn.hang:
+            self.conn.executing.set()
+            self.cancelled.wait(5)
+            raise DatabaseError("[HY008] Operation canceled")
+        if query in self.conn.errors:
+            raise DatabaseError(self.conn.errors[query])
+        cols, rows = self.conn.results.get(query, ([], []))
+        self.description = [stubColumn(c, str) for c in cols] or None
+        self.rows = list(rows)
+
+    def executemany(self, query, seq_of_parameters):
+        if query in self.conn.errors:
+            raise DatabaseError(self.conn.errors[query])
+        self.conn.inserted.extend(seq_of_parameters)
+
+    def fetchmany(self, size):
+        res = self.rows[:size]
+        self.rows = self.rows[size:]
+        return res
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows))
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def close(self):
+        self.closed = True
+
+
+class stubConn:
+    """ results maps a query to the (column names, rows) it returns, errors
+        to the message of the DatabaseError it raises.  With hang set,
+        execute blocks until cancelled. """
+    def __init__(self, results = None, errors = None, catalog = "db"):
+        self.results = results or {}
+        self.errors = errors or {}
+        self.hang = False
+        self.executing = Event()
+        self.on_execute = None
+        self.cursors = []
+        self.executed = []
+        self.inserted = []
+        self.calls = []
+        # Returned by find_tables / find_columns
+        self.tables = []
+        self.columns = []
+        self.catalog_name = catalog
+        self.autocommit = True
+        self.commits = 0
+        self.rollbacks = 0
+        self.is_connected = True
+
+    def cursor(self):
+        self.cursors.append(stubCursor(self))
+        return self.cursors[-1]
+
+    def connected(self):
+        return self.is_connected
+
+    def close(self):
+        self.is_connected = False
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def get_info(self, code):
+        return " "
+
+    def list_schemas(self):
+        self.calls.append(("list_schemas", ))
+        return []
+
+    def find_tables(self, **kwargs):
+        self.calls.append(("find_tables", kwargs))
+        return self.tables
+
+    def find_columns(self, **kwargs):
+        self.calls.append(("find_columns", kwargs))
+        return self.columns
+
+
+class stubApplication:
+    """ Collects background tasks, for run_tasks to run """
+    def __init__(self, height = 30):
+        self.tasks = []
+        self.layout = SimpleNamespace(focus = lambda *args: None)
+        self.output = SimpleNamespace(get_size = lambda: (height, 120))
+
+    def create_background_task(self, coroutine):
+        self.tasks.append(coroutine)
+
+    def run_tasks(self, during = None):
+        """ Run the tasks created so far, and those they create, to the
+            end; during(), if given, once they have all started """
+        async def _run():
+            first = True
+            while len(self.tasks):
+                running = [asyncio.ensure_future(t) for t in self.tasks]
+                self.tasks = []
+                if first and during is not None:
+                    await asyncio.sleep(0)
+                    await during()
+                first = False
+                await asyncio.gather(*running)
+        asyncio.run(_run())
@@ -0,0 +1,30 @@
+from odbcli.cache import resultCache
+
+
+def test_lru_eviction_by_bytes():
+    cache = resultCache(max_bytes = 10000)
+    for key in ("a", "b", "c"):
+        cache.start(key, ["x"])
+        cache.extend(key, [("x" * 100, )] * 20, complete = True)
+    # Each entry is ~2.5k+; touching "a" makes "b" the least recently used
+    assert cache.get("a") is not None
+    cache.start("d", ["x"])
+    cache.extend("d", [("x" * 100, )] * 30, complete = True)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_ttl():
+    cache = resultCache(ttl = -1)
+    cache.start("a", ["x"])
+    cache.extend("a", [(1, )])
+    assert cache.get("a") is None
+    assert cache.nbytes == 0
+
+
+def test_entry_larger_than_budget_is_dropped():
+    cache = resultCache(max_bytes = 100)
+    cache.start("a", ["x"])
+    cache.extend("a", [("x" * 1000, )])
+    assert cache.get("a") is None
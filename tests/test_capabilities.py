@@ -0,0 +1,24 @@
+from odbcli.capabilities import capabilityStore
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "sub" / "capabilities.json")
+    key = capabilityStore.key("dsn1", "libtdsodbc.so", "1.3", "15.00.2000")
+    store = capabilityStore(path)
+    assert store.get(key) is None
+    store.put(key, {"SQL_DBMS_NAME": "Microsoft SQL Server", "SQL_ASYNC_MODE": 1})
+    # A new store, as in the next session, reads it from disk
+    assert capabilityStore(path).get(key) == \
+        {"SQL_DBMS_NAME": "Microsoft SQL Server", "SQL_ASYNC_MODE": 1}
+    # Different server version, different profile
+    assert capabilityStore(path).get(
+        capabilityStore.key("dsn1", "libtdsodbc.so", "1.3", "16.00.1000")) is None
+
+
+def test_corrupt_file_ignored(tmp_path):
+    path = tmp_path / "capabilities.json"
+    path.write_text("{not json")
+    store = capabilityStore(str(path))
+    assert store.get("k") is None
+    store.put("k", {"a": 1})
+    assert capabilityStore(str(path)).get("k") == {"a": 1}
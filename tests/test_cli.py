@@ -0,0 +1,21 @@
+from click.testing import CliRunner
+from odbcli.cli import main
+
+
+def test_batch_options_without_batch():
+    runner = CliRunner()
+    res = runner.invoke(main, ["--format", "csv"])
+    assert res.exit_code == 2
+    assert "--format only apply with -e / -f" in res.output
+    res = runner.invoke(main, ["-o", "out.csv", "--on-error", "continue"])
+    assert res.exit_code == 2
+    assert "-o / --output, --on-error" in res.output
+
+
+def test_execute_and_file_conflict(tmp_path):
+    script = tmp_path / "script.sql"
+    script.write_text("select 1\n")
+    res = CliRunner().invoke(main,
+            ["--dsn", "x", "-e", "select 1", "-f", str(script)])
+    assert res.exit_code == 2
+    assert "-e and -f are mutually exclusive" in res.output
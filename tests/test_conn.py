@@ -0,0 +1,95 @@
+from odbcli.conn import sqlConnection, executionStatus
+from stubs import stubConn
+
+
+def test_reexecute_prepared_after_partial_fetch():
+    query = "select a from t where a > ?"
+    conn = stubConn(results = {query: (["a"], [(i, ) for i in range(5)])})
+    sql_conn = sqlConnection("test", conn = conn)
+    sql_conn.execute_prepared(query, (0, ))
+    assert sql_conn.fetchmany(2) == [(0, ), (1, )]
+    sql_conn.close_cursor()
+    # Results left pending: the cursor is closed, not kept for re-use
+    assert conn.cursors[0].closed
+    sql_conn.execute_prepared(query, (1, ))
+    assert sql_conn.execution_status == executionStatus.OK
+    assert len(conn.cursors) == 2
+    assert sql_conn.fetchmany(10) == [(i, ) for i in range(5)]
+    sql_conn.close_cursor()
+    # Read to the end: kept, and re-used
+    assert not conn.cursors[1].closed
+    sql_conn.execute_prepared(query, (2, ))
+    assert len(conn.cursors) == 2
+    sql_conn.close()
+
+
+def test_catalog_calls_go_to_metadata_conn(monkeypatch):
+    primary = stubConn()
+    md = stubConn()
+    monkeypatch.setattr("odbcli.conn.connect", lambda **kwargs: md)
+
+    def use(crsr, query):
+        primary.catalog_name = query.split()[1]
+    primary.on_execute = use
+    sql_conn = sqlConnection("test", conn = primary, metadata_conn = True)
+    sql_conn.find_tables(table = "t")
+    assert md.calls == [("find_tables",
+        dict(catalog = "db", schema = "", table = "t", type = ""))]
+    # The metadata connection stays in db; the current catalog is passed
+    sql_conn.execute("USE other")
+    sql_conn.close_cursor()
+    sql_conn.find_columns(table = "t")
+    assert md.calls[-1] == ("find_columns",
+        dict(catalog = "other", schema = "", table = "t", column = ""))
+    assert primary.calls == []
+    sql_conn.close()
+
+
+class _lateWatchdog:
+    """ Fires just after execute returns, before it is disarmed """
+    def arm(self, timeout, callback):
+        self.callback = callback
+        return 1
+
+    def disarm(self, handle):
+        self.callback()
+        return False
+
+
+def test_timeout_after_execute_returned(monkeypatch):
+    wd = _lateWatchdog()
+    monkeypatch.setattr("odbcli.conn.get_watchdog", lambda: wd)
+    conn = stubConn(results = {"select 1": (["a"], [(1, )])})
+    sql_conn = sqlConnection("test", conn = conn, query_timeout = 5)
+    sql_conn.execute("select 1")
+    assert conn.cursors[0].cancelled.is_set()
+    assert sql_conn.execution_status == executionStatus.FAIL
+    assert sql_conn.execution_err.startswith("Query cancelled after running for")
+    assert sql_conn.metrics.error_class == "timeout"
+    sql_conn.close()
+
+
+def test_catalog_reread_after_use_once_cursor_closed():
+    conn = stubConn(results = {"/* x */ USE other": (["a"], [(1, )])})
+
+    def use(crsr, query):
+        conn.catalog_name = "other"
+    conn.on_execute = use
+    sql_conn = sqlConnection("test", conn = conn)
+    assert sql_conn.current_catalog() == "db"
+    sql_conn.execute("/* x */ USE other")
+    # Results pending: not re-read yet
+    assert sql_conn.current_catalog() == "db"
+    sql_conn.close_cursor()
+    assert sql_conn.current_catalog() == "other"
+    # And in a batch, after a comment line
+    conn.on_execute = lambda crsr, query: setattr(conn, "catalog_name", "third")
+    sql_conn.execute("select 1;\n-- switch\nuse third")
+    sql_conn.close_cursor()
+    assert sql_conn.current_catalog() == "third"
+    # Not for statements that merely mention the words
+    conn.on_execute = lambda crsr, query: setattr(conn, "catalog_name", "x")
+    sql_conn.execute("select use, set_id from t")
+    sql_conn.close_cursor()
+    assert sql_conn.current_catalog() == "third"
+    sql_conn.close()
@@ -0,0 +1,62 @@
+from time import time
+from odbcli.conn import sqlConnection
+from odbcli.fanout import fanoutQuery
+from stubs import stubConn
+
+query = "select * from t"
+
+
+def _conns(*results):
+    return [sqlConnection(dsn, conn = stubConn(results = {query: res}))
+            for dsn, res in results]
+
+
+def _close(conns):
+    for c in conns:
+        c.close()
+
+
+def test_merge():
+    conns = _conns(
+            ("a", (["x", "y"], [(1, 2), (3, 4)])),
+            ("b", (["x", "y"], [(5, 6)])))
+    fq = fanoutQuery(conns, query, batch_size = 1)
+    rows = [r for batch in fq for r in batch]
+    assert fq.cols == ["dsn", "x", "y"]
+    assert sorted(rows) == [("a", 1, 2), ("a", 3, 4), ("b", 5, 6)]
+    assert [(r.dsn, r.status, r.rows) for r in fq.results] == \
+        [("a", "ok", 2), ("b", "ok", 1)]
+    _close(conns)
+
+
+def test_columns_mismatch():
+    conns = _conns(
+            ("a", (["x", "y"], [(1, 2)])),
+            ("b", (["x", "z"], [(5, 6)])))
+    fq = fanoutQuery(conns, query)
+    rows = [r for batch in fq for r in batch]
+    # Whichever arrives second is rejected, and its rows dropped
+    errors = [r for r in fq.results if r.status == "error"]
+    assert len(errors) == 1
+    assert "differ" in errors[0].error
+    assert set(r[0] for r in rows) == \
+        set(r.dsn for r in fq.results if r.status == "ok")
+    _close(conns)
+
+
+def test_early_close_cancels_executing():
+    conns = _conns(
+            ("a", (["x"], [(1, )])),
+            ("b", (["x"], [(2, )])))
+    conns[1].conn.hang = True
+    fq = fanoutQuery(conns, query)
+    batches = iter(fq)
+    assert next(batches) == [("a", 1)]
+    assert conns[1].conn.executing.wait(5)
+    start = time()
+    # As when the pager exits
+    batches.close()
+    assert time() - start < 2
+    assert conns[1].conn.cursors[0].cancelled.is_set()
+    assert fq.results[1].status == "cancelled"
+    _close(conns)
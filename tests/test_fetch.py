@@ -0,0 +1,77 @@
+import pytest
+from threading import Event
+from time import time
+from odbcli.fetch import fetchSizer, prefetch
+
+
+def test_grows_on_fast_round_trips():
+    sizer = fetchSizer(initial = 50, max_rows = 1000)
+    sizes = []
+    for _ in range(10):
+        sizes.append(sizer.size)
+        sizer.observe([(1, "a")] * sizer.size, 0.01)
+    assert sizes[:4] == [50, 100, 200, 400]
+    assert sizer.size == 1000
+
+
+def test_shrinks_on_slow_round_trips_but_not_below_page():
+    sizer = fetchSizer(initial = 50, target_latency = 0.1)
+    for _ in range(3):
+        sizer.observe([(1, )] * sizer.size, 0.01)
+    assert sizer.size == 400
+    sizer.observe([(1, )] * sizer.size, 1)
+    assert sizer.size == 200
+    for _ in range(5):
+        sizer.observe([(1, )] * sizer.size, 1)
+    assert sizer.size == 50
+
+
+def test_memory_cap():
+    row = ("x" * 1000, )
+    sizer = fetchSizer(initial = 10, max_bytes = 100 * 1000)
+    for _ in range(10):
+        sizer.observe([row] * sizer.size, 0.01)
+    assert sizer.size * sizer.row_bytes <= 100 * 1000
+    assert sizer.size >= 10
+
+
+def test_prefetch_yields_everything_in_order():
+    assert list(prefetch(iter(range(100)), 3)) == list(range(100))
+
+
+def test_prefetch_stays_bounded_and_stops_on_close():
+    produced = []
+    def source():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+    gen = prefetch(source(), 2)
+    assert next(gen) == 0
+    gen.close()
+    # One in hand, two queued, at most one more blocked on the queue
+    assert len(produced) <= 4
+
+
+def test_prefetch_propagates_errors():
+    def source():
+        yield 1
+        raise ValueError("fetch failed")
+    gen = prefetch(source(), 2)
+    assert next(gen) == 1
+    with pytest.raises(ValueError):
+        next(gen)
+
+
+def test_prefetch_cancels_busy_producer_on_close():
+    release = Event()
+    def source():
+        yield 0
+        # A slow fetch, only cut short by on_cancel
+        release.wait(5)
+        yield 1
+    gen = prefetch(source(), 2, on_cancel = release.set)
+    assert next(gen) == 0
+    start = time()
+    gen.close()
+    assert release.is_set()
+    assert time() - start < 1
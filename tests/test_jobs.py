@@ -0,0 +1,25 @@
+import os
+from odbcli.conn import sqlConnection
+from odbcli.jobs import jobManager, jobStatus
+from stubs import stubConn
+
+
+def test_close_cancels_running_jobs(tmp_path):
+    conn = stubConn(results = {"select 1": (["a"], [(1, )])})
+    busy = stubConn()
+    busy.hang = True
+    done_conn = sqlConnection("a", conn = conn)
+    busy_conn = sqlConnection("b", conn = busy)
+    jobs = jobManager(spool_dir = str(tmp_path))
+    done = jobs.submit(done_conn, "select 1")
+    done_conn.submit(lambda: None).result(timeout = 5)
+    assert done.status == jobStatus.DONE and done.rows == 1
+    running = jobs.submit(busy_conn, "select 2")
+    assert busy.executing.wait(5)
+    jobs.close()
+    busy_conn.submit(lambda: None).result(timeout = 5)
+    assert running.status == jobStatus.CANCELLED
+    # Spools of both removed
+    assert os.listdir(str(tmp_path)) == []
+    done_conn.close()
+    busy_conn.close()
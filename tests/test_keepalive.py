@@ -0,0 +1,66 @@
+from cyanodbc import ConnectError
+from odbcli.conn import sqlConnection, connStatus
+from odbcli.keepalive import keepalive
+from stubs import stubConn
+
+
+def test_backoff():
+    ka = keepalive(lambda: [], max_backoff = 10)
+    assert [ka.backoff(n) for n in range(1, 7)] == [1, 2, 4, 8, 10, 10]
+
+
+def _idle(conn):
+    sql_conn = sqlConnection("test", conn = conn)
+    sql_conn.status = connStatus.IDLE
+    return sql_conn
+
+
+def test_check_probes_idle_connections():
+    conn = stubConn(errors = {"SELECT 1": "[42000] Syntax error"})
+    sql_conn = _idle(conn)
+    ka = keepalive(lambda: [sql_conn], interval = 60)
+    ka.check(sql_conn.last_activity + 1)
+    assert conn.executed == []
+    # Answered, if with an error: not lost
+    ka.check(sql_conn.last_activity + 60)
+    assert [q for q, _ in conn.executed] == ["SELECT 1"]
+    assert sql_conn.status == connStatus.IDLE
+    assert sql_conn.conn is conn
+
+
+def test_lost_connection_is_reconnected(monkeypatch):
+    conn = stubConn(errors = {"SELECT 1": "[08S01] Communication link failure"})
+    sql_conn = _idle(conn)
+    sql_conn.suspect = True
+    attempts = []
+
+    def connect(**kwargs):
+        # Not holding up catalog calls while logging in
+        assert sql_conn._lock.acquire(blocking = False)
+        sql_conn._lock.release()
+        attempts.append(kwargs)
+        if len(attempts) < 3:
+            raise ConnectError("[08001] Unable to connect")
+        return stubConn()
+    monkeypatch.setattr("odbcli.conn.connect", connect)
+    changes = []
+    ka = keepalive(lambda: [sql_conn], on_change = lambda: changes.append(1))
+    now = sql_conn.last_activity
+    ka.check(now)
+    assert sql_conn.status == connStatus.RECONNECTING
+    assert not conn.connected()
+    assert len(attempts) == 1
+    # Backing off: 1s, then 2s
+    ka.check(now + 0.5)
+    assert len(attempts) == 1
+    ka.check(now + 1)
+    assert len(attempts) == 2
+    ka.check(now + 2.5)
+    assert len(attempts) == 2
+    ka.check(now + 3)
+    assert len(attempts) == 3
+    assert sql_conn.status == connStatus.IDLE
+    assert sql_conn.conn is not conn
+    assert sql_conn.reconnect_attempts == 0
+    assert len(changes) == 4
+    sql_conn.close()
@@ -0,0 +1,133 @@
+import io
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from odbcli.conn import sqlConnection
+from odbcli.load import parse_table_name, column_converter, read_rows, load_file, LoadError
+from odbcli.mdcache import metadataCache
+from stubs import stubConn
+import pytest
+
+
+def test_parse_table_name():
+    assert parse_table_name("t") == (None, None, "t")
+    assert parse_table_name("s.t") == (None, "s", "t")
+    assert parse_table_name('[c].s."t"') == ("c", "s", "t")
+    with pytest.raises(LoadError):
+        parse_table_name("s..t")
+    with pytest.raises(LoadError):
+        parse_table_name("a.b.c.d")
+
+
+def test_column_converters():
+    assert column_converter(4)(" 12 ") == 12
+    assert column_converter(4)("") is None
+    # Already typed, from JSON
+    assert column_converter(4)(7) == 7
+    assert column_converter(-7)("yes") == 1
+    with pytest.raises(ValueError):
+        column_converter(-7)("maybe")
+    assert column_converter(3)("1.50") == Decimal("1.50")
+    assert column_converter(91)("2020-01-02") == date(2020, 1, 2)
+    # Character columns keep empty strings
+    assert column_converter(12)("") == ""
+
+
+@pytest.mark.parametrize("format_name, text", [
+    ("csv", "a,b\n1,x\n2,\n"),
+    ("tsv", "a\tb\n1\tx\n2\t\n"),
+    ("jsonl", '{"a": "1", "b": "x"}\n\n{"a": "2", "b": ""}\n')])
+def test_read_rows(format_name, text):
+    cols, rows = read_rows(io.StringIO(text), format_name)
+    assert cols == ["a", "b"]
+    assert [list(r) for r in rows] == [["1", "x"], ["2", ""]]
+
+
+def test_read_rows_empty():
+    with pytest.raises(LoadError):
+        read_rows(io.StringIO(""), "csv")
+
+
+class _conn(stubConn):
+    """ Rollback interrupted by a second Ctrl-C, if interrupt is set """
+    interrupt = False
+
+    def rollback(self):
+        super().rollback()
+        if self.interrupt:
+            raise KeyboardInterrupt()
+
+
+def _load(tmp_path, text, metadata_cache = None, **kwargs):
+    conn = _conn()
+    conn.tables = [SimpleNamespace(schema = "dbo")]
+    conn.columns = [SimpleNamespace(column = "a", data_type = 4),
+            SimpleNamespace(column = "b", data_type = 12)]
+    sql_conn = sqlConnection("test", conn = conn, metadata_cache = metadata_cache)
+    path = tmp_path / "data.csv"
+    path.write_text(text)
+    return conn, sql_conn, lambda: load_file(sql_conn, str(path), "t", **kwargs)
+
+
+def test_commit_interval(tmp_path):
+    conn, sql_conn, load = _load(tmp_path,
+            "a,b\n" + "".join("%d,x\n" % i for i in range(5)),
+            batch_size = 2, commit_interval = 2)
+    assert load() == 5
+    assert conn.inserted == [(i, "x") for i in range(5)]
+    # Two full batches, then the remainder at the end
+    assert conn.commits == 3
+    assert conn.rollbacks == 0
+    assert conn.autocommit
+    sql_conn.close()
+
+
+def test_rollback_on_error(tmp_path):
+    conn, sql_conn, load = _load(tmp_path, "a,b\n1,x\n2,y\nthree,z\n",
+            batch_size = 2, commit_interval = 2)
+    with pytest.raises(LoadError) as e:
+        load()
+    assert "Row 3" in str(e.value)
+    assert "(2 rows committed)" in str(e.value)
+    assert conn.rollbacks == 1
+    assert conn.autocommit
+    sql_conn.close()
+
+
+def test_autocommit_restored_after_interrupted_rollback(tmp_path):
+    conn, sql_conn, load = _load(tmp_path, "a,b\n1,x\n", batch_size = 1)
+    conn.errors["INSERT INTO t (a, b) VALUES (?, ?)"] = "[23000] Duplicate key"
+    conn.interrupt = True
+    with pytest.raises(KeyboardInterrupt):
+        load()
+    assert conn.rollbacks == 1
+    assert conn.autocommit
+    sql_conn.close()
+
+
+def test_columns_not_from_metadata_cache(tmp_path):
+    cache = metadataCache(str(tmp_path / "metadata.db"))
+    conn, sql_conn, load = _load(tmp_path, "a,b\n1,x\n",
+            metadata_cache = cache)
+    # Cached before the table was altered: b was an int then
+    stale = SimpleNamespace(column = "b", data_type = 4)
+    conn.columns, columns = [conn.columns[0], stale], conn.columns
+    sql_conn.find_columns(catalog = "db", schema = "dbo", table = "t", column = "%")
+    conn.columns = columns
+    assert load() == 1
+    assert conn.inserted == [(1, "x")]
+    sql_conn.close()
+    cache.close()
+
+
+def test_autocommit_failure_is_a_load_error(tmp_path, monkeypatch):
+    from cyanodbc import DatabaseError
+    conn, sql_conn, load = _load(tmp_path, "a,b\n1,x\n")
+
+    def fail(on):
+        raise DatabaseError("[HYC00] Optional feature not implemented")
+    monkeypatch.setattr(sql_conn, "set_autocommit", fail)
+    with pytest.raises(LoadError):
+        load()
+    assert conn.inserted == []
+    sql_conn.close()
@@ -0,0 +1,80 @@
+import time
+from odbcli.mdcache import metadataCache
+
+
+def _fetcher(rows):
+    calls = []
+    def fetch():
+        calls.append(1)
+        return rows
+    return fetch, calls
+
+
+def test_lookup_caches_across_instances(tmp_path):
+    path = str(tmp_path / "metadata.db")
+    fetch, calls = _fetcher([["main", "dbo", "t", "TABLE", None]])
+    cache = metadataCache(path)
+    args = ["main", "", "dbo", "", "TABLE"]
+    assert cache.lookup("dsn1", "tables", args, fetch) == [["main", "dbo", "t", "TABLE", None]]
+    cache.close()
+    # Next session: served from disk
+    cache = metadataCache(path)
+    assert cache.lookup("dsn1", "tables", args, fetch) == [["main", "dbo", "t", "TABLE", None]]
+    assert len(calls) == 1
+    # Other DSN, other arguments: not cached
+    cache.lookup("dsn2", "tables", args, fetch)
+    cache.lookup("dsn1", "tables", ["main", "", "sales", "", "TABLE"], fetch)
+    assert len(calls) == 3
+    cache.close()
+
+
+def test_empty_results_not_cached(tmp_path):
+    cache = metadataCache(str(tmp_path / "metadata.db"))
+    fetch, calls = _fetcher([])
+    cache.lookup("dsn1", "schemas", [None], fetch)
+    cache.lookup("dsn1", "schemas", [None], fetch)
+    assert len(calls) == 2
+    cache.close()
+
+
+def test_stale_entries_refreshed_in_background(tmp_path):
+    cache = metadataCache(str(tmp_path / "metadata.db"), refresh_after = 60)
+    cache.put("dsn1", "catalogs", [], ["old"])
+    cache.expire("dsn1")
+    fetch, calls = _fetcher(["new"])
+    # Stale: still served, and re-fetched
+    assert cache.lookup("dsn1", "catalogs", [], fetch) == ["old"]
+    for _ in range(100):
+        if cache.get("dsn1", "catalogs", [])[0] == ["new"]:
+            break
+        time.sleep(0.01)
+    assert cache.lookup("dsn1", "catalogs", [], fetch) == ["new"]
+    assert len(calls) == 1
+    cache.clear("dsn1")
+    assert cache.get("dsn1", "catalogs", []) is None
+    cache.close()
+
+
+def test_stale_entries_refreshed_in_foreground(tmp_path):
+    cache = metadataCache(str(tmp_path / "metadata.db"), refresh_after = 60)
+    cache.put("dsn1", "catalogs", [], ["old"])
+    cache.expire("dsn1")
+    fetch, calls = _fetcher(["new"])
+    assert cache.lookup("dsn1", "catalogs", [], fetch, background = False) == ["new"]
+    assert cache.lookup("dsn1", "catalogs", [], fetch, background = False) == ["new"]
+    assert len(calls) == 1
+    # Nothing fetched: the stale rows are better than none
+    cache.expire("dsn1")
+    fetch, calls = _fetcher([])
+    assert cache.lookup("dsn1", "catalogs", [], fetch, background = False) == ["new"]
+    assert cache._executor is None
+    cache.close()
+
+
+def test_expired_entries_not_served(tmp_path):
+    cache = metadataCache(str(tmp_path / "metadata.db"), refresh_after = 0, max_age = 0)
+    cache.put("dsn1", "catalogs", [], ["old"])
+    time.sleep(0.01)
+    fetch, calls = _fetcher(["new"])
+    assert cache.lookup("dsn1", "catalogs", [], fetch) == ["new"]
+    cache.close()
@@ -0,0 +1,37 @@
+from odbcli.metrics import queryMetrics, sqlstate, error_class
+
+
+def test_record_fetch():
+    m = queryMetrics("dsn", "select 1")
+    assert m.first_row_time is None
+    m.record_fetch([(1, "a"), (2, "b")], 0.5)
+    first = m.first_row_time
+    assert first is not None
+    m.record_fetch([(3, "c")], 0.25)
+    m.record_fetch([], 0.1)
+    assert m.first_row_time == first
+    assert m.rows == 3
+    assert m.fetches == 3
+    assert abs(m.fetch_time - 0.85) < 1e-9
+    assert m.nbytes > 0
+
+
+def test_summary_without_rows():
+    m = queryMetrics("dsn", "delete from t")
+    m.execute_time = 0.25
+    summary = m.summary()
+    assert "Execute:   0.250s" in summary
+    assert "First row: -" in summary
+    assert "Pager" not in summary
+
+
+def test_sqlstate():
+    assert sqlstate(Exception("[08S01] Communication link failure")) == "08S01"
+    assert sqlstate(Exception("42S02: Invalid object name")) == "42S02"
+    assert sqlstate(Exception("connection closed")) is None
+    assert sqlstate(Exception("nanodbc.cpp:1046: 08001: [unixODBC]Can't connect")) == "08001"
+    assert sqlstate(Exception("('HYT00', '[HYT00] Timeout expired')")) == "HYT00"
+    # Not SQLSTATEs
+    assert sqlstate(Exception("ORA-00942: table or view does not exist")) is None
+    assert sqlstate(Exception("Error 18456 at line 12345 of batch")) is None
+    assert error_class(ValueError("no state")) == "ValueError"
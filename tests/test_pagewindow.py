@@ -0,0 +1,44 @@
+from odbcli.pagewindow import pageWindow
+
+
+class _result:
+    def __init__(self, n):
+        self.rows = [(i, ) for i in range(n)]
+        self.pos = 0
+        self.calls = 0
+
+    def fetch(self, n):
+        self.calls += 1
+        res = self.rows[self.pos:self.pos + n]
+        self.pos += len(res)
+        return res
+
+
+def test_back_and_forth(tmp_path):
+    res = _result(25)
+    fetched = []
+    w = pageWindow(res.fetch, spool_dir = str(tmp_path), max_pages = 1,
+            on_fetch = lambda rows, complete: fetched.append((len(rows), complete)))
+    assert w.current(10) == res.rows[0:10]
+    assert w.forward(10) == res.rows[10:20]
+    assert w.forward(10) == res.rows[20:25]
+    assert w.complete
+    assert w.forward(10) is None
+    calls = res.calls
+    # Back from the spool, without fetching again
+    assert w.back(10) == res.rows[10:20]
+    assert w.back(10) == res.rows[0:10]
+    assert w.back(10) is None
+    assert res.calls == calls
+    assert fetched == [(10, False), (10, False), (5, True)]
+    w.close()
+
+
+def test_start_past_first_page(tmp_path):
+    res = _result(8)
+    w = pageWindow(res.fetch, spool_dir = str(tmp_path))
+    w.pos = 5
+    assert w.current(5) == res.rows[5:8]
+    assert w.forward(5) is None
+    assert w.back(5) == res.rows[0:5]
+    w.close()
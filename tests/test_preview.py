@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+from prompt_toolkit.layout import Layout
+from prompt_toolkit.layout.controls import BufferControl
+from prompt_toolkit.widgets import Button
+from odbcli.conn import sqlConnection, connStatus
+from odbcli.preview import preview_element
+from stubs import stubConn, stubApplication
+
+
+def _preview(tmp_path, conn):
+    sql_conn = sqlConnection("test", conn = conn)
+    my_app = SimpleNamespace(
+            application = stubApplication(),
+            selected_object = SimpleNamespace(conn = sql_conn, parent = None, name = "t"),
+            preview_cache = None,
+            preview_limit_rows = 100,
+            preview_memory_pages = 2,
+            spool_dir = str(tmp_path),
+            jobs = SimpleNamespace(running_on = lambda sql_conn: None),
+            show_preview = True,
+            show_sidebar = False,
+            log_query = lambda sql_conn, kind: None)
+    layout = Layout(preview_element(my_app))
+    buffers = dict((w.content.buffer.name, w.content.buffer)
+            for w in layout.find_all_windows()
+            if isinstance(w.content, BufferControl))
+    # The Done button, by way of the control rendering it
+    text = [getattr(w.content, "text", None) for w in layout.find_all_windows()]
+    done = [t.__self__ for t in text
+            if isinstance(getattr(t, "__self__", None), Button)][0]
+    return my_app, sql_conn, buffers["previewbuffer"], buffers[""], done
+
+
+def _settle(sql_conn):
+    sql_conn.submit(lambda: None).result(timeout = 5)
+
+
+def test_error_is_shown(tmp_path):
+    conn = stubConn()
+
+    def drop(crsr, query):
+        raise RuntimeError("Connection reset by peer")
+    conn.on_execute = drop
+    my_app, sql_conn, input_buffer, output, done = _preview(tmp_path, conn)
+    input_buffer.accept_handler(input_buffer)
+    my_app.application.run_tasks()
+    assert "Connection reset by peer" in output.text
+    _settle(sql_conn)
+    assert sql_conn.status == connStatus.IDLE
+    assert sql_conn.cursor is None
+    sql_conn.close()
+
+
+def test_close_while_running(tmp_path):
+    conn = stubConn()
+    conn.hang = True
+    my_app, sql_conn, input_buffer, output, done = _preview(tmp_path, conn)
+    input_buffer.accept_handler(input_buffer)
+
+    async def close():
+        while not conn.executing.is_set():
+            await asyncio.sleep(0.01)
+        done.handler()
+    my_app.application.run_tasks(during = close)
+    assert conn.cursors[0].cancelled.is_set()
+    assert not my_app.show_preview
+    _settle(sql_conn)
+    assert sql_conn.status == connStatus.IDLE
+    assert sql_conn.cursor is None
+    sql_conn.close()
@@ -0,0 +1,52 @@
+import json
+from odbcli.metrics import queryMetrics
+from odbcli.querylog import fingerprint, fingerprint_id, queryLog
+
+
+def test_fingerprint_strips_literals_and_comments():
+    assert fingerprint("select * from t where a = 5 and b = 'x' -- why") == \
+        "SELECT * FROM t WHERE a = ? AND b = ?"
+    assert fingerprint("SELECT  a\n  FROM t\n WHERE id IN (1, 2,3);") == \
+        "SELECT a FROM t WHERE id IN (?)"
+
+
+def test_fingerprint_keeps_quoted_identifiers():
+    assert fingerprint('select "my col" from t where x = 1.5') == \
+        'SELECT "my col" FROM t WHERE x = ?'
+
+
+def test_same_statement_different_values():
+    a = fingerprint("select * from t where id in (1, 2) and name = 'a'")
+    b = fingerprint("SELECT *\nFROM t WHERE id IN (7) AND name = 'bcd'")
+    assert a == b
+    assert fingerprint_id(a) == fingerprint_id(b)
+
+
+def test_log_writes_once(tmp_path):
+    path = str(tmp_path / "sub" / "querylog.jsonl")
+    log = queryLog(path)
+    m = queryMetrics("dsn1", "select * from t where a = 1")
+    m.execute_time = 0.5
+    m.record_fetch([(1, )], 0.25)
+    log.log(m, "cat", "main")
+    log.log(m, "cat", "main")
+    log.close()
+    with open(path) as f:
+        lines = f.readlines()
+    assert len(lines) == 1
+    entry = json.loads(lines[0])
+    assert entry["dsn"] == "dsn1"
+    assert entry["source"] == "main"
+    assert entry["fingerprint"] == "SELECT * FROM t WHERE a = ?"
+    assert entry["rows"] == 1
+    assert entry["execute_s"] == 0.5
+    assert "query" not in entry
+
+
+def test_log_includes_text_when_asked(tmp_path):
+    path = str(tmp_path / "querylog.jsonl")
+    log = queryLog(path, include_text = True)
+    log.log(queryMetrics("dsn1", "select 1"), None, "batch")
+    log.close()
+    with open(path) as f:
+        assert json.loads(f.readline())["query"] == "select 1"
@@ -0,0 +1,65 @@
+import io
+from odbcli.script import split_batches, run_script
+
+
+def _split(text):
+    return list(split_batches(io.StringIO(text)))
+
+
+def test_no_go_is_one_batch():
+    batches = _split("\nselect 1;\nselect 2;\n")
+    assert len(batches) == 1
+    assert batches[0].text == "select 1;\nselect 2;"
+    assert batches[0].line == 2
+
+
+def test_split_on_go():
+    batches = _split("create table t (a int)\nGO\n\ninsert into t values (1)\ngo 3\nselect * from t\n")
+    assert [b.text for b in batches] == \
+        ["create table t (a int)", "insert into t values (1)", "select * from t"]
+    assert [b.line for b in batches] == [1, 4, 6]
+    assert [b.repeat for b in batches] == [1, 3, 1]
+
+
+def test_go_in_string_or_comment():
+    text = "select 'a\ngo\nb'\n/* outer /* inner */\ngo\n*/\nselect [x\ngo\n]\ngo -- done\nselect 2"
+    batches = _split(text)
+    assert len(batches) == 2
+    assert batches[0].text.endswith("select [x\ngo\n]")
+    assert batches[1].text == "select 2"
+
+
+def test_escaped_quotes_and_line_comments():
+    batches = _split("select 'it''s' -- it's\ngo\nselect 1\n")
+    assert [b.text for b in batches] == ["select 'it''s' -- it's", "select 1"]
+
+
+class _conn:
+    def __init__(self, fail):
+        self.fail = fail
+        self.executed = []
+        self.execution_err = None
+
+    def async_execute(self, query):
+        self.executed.append(query)
+        self.execution_err = "boom" if query in self.fail else None
+        return None
+
+    def close_cursor(self):
+        pass
+
+
+def test_run_script_error_policy():
+    script = "select 1\ngo\nbad\ngo\nselect 2\ngo 2\n"
+    conn = _conn(fail = ["bad"])
+    res = run_script(conn, io.StringIO(script))
+    assert conn.executed == ["select 1", "bad"]
+    assert res.failed == 1 and res.stopped
+
+    conn = _conn(fail = ["bad"])
+    seen = []
+    res = run_script(conn, io.StringIO(script), stop_on_error = False,
+            progress = lambda n, batch, elapsed, err: seen.append((n, err)))
+    assert conn.executed == ["select 1", "bad", "select 2", "select 2"]
+    assert seen == [(1, None), (2, "boom"), (3, None), (4, None)]
+    assert res.batches == 4 and res.failed == 1 and not res.stopped
@@ -0,0 +1,49 @@
+from odbcli.metrics import queryMetrics
+from odbcli.querylog import queryLog
+from odbcli.slowlog import slowLog, slow_query_report, _percentile
+
+
+def _log(log, dsn, query, latency, error_class = None):
+    m = queryMetrics(dsn, query)
+    m.execute_time = latency
+    m.error_class = error_class
+    log.log(m, None, "main")
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert _percentile(values, 50) == 50
+    assert _percentile(values, 95) == 95
+    assert _percentile([7], 95) == 7
+
+
+def test_incremental_index_and_report(tmp_path):
+    path = str(tmp_path / "querylog.jsonl")
+    log = queryLog(path)
+    for i in range(10):
+        _log(log, "dsn1", "select * from t where id = %d" % i, i / 10)
+    _log(log, "dsn2", "select * from t where id = 1", 5, "HYT00")
+    log.close()
+
+    sl = slowLog(path)
+    assert sl.update() == 11
+    assert sl.update() == 0
+    rows = sl.report()
+    assert [r[0] for r in rows] == ["dsn2", "dsn1"]
+    dsn, count, errors, p50, p95, mx, avg_rows, fp = rows[1]
+    assert (count, errors) == (10, 0)
+    assert abs(p50 - 0.4) < 1e-9
+    assert abs(mx - 0.9) < 1e-9
+    assert fp == "SELECT * FROM t WHERE id = ?"
+    assert rows[0][2] == 1
+
+    log = queryLog(path)
+    _log(log, "dsn1", "select 1", 0.1)
+    log.close()
+    assert sl.update() == 1
+    assert len(sl.report(top = 1)) == 1
+    sl.close()
+
+
+def test_report_without_log(tmp_path):
+    assert "No query log" in slow_query_report(str(tmp_path / "missing.jsonl"))
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+from odbcli.conn import sqlConnection, connStatus
+from odbcli.special import _fanout_conns, _interruptible, CommandError
+from stubs import stubConn
+import pytest
+
+
+class _conn:
+    def __init__(self, dsn):
+        self.dsn = dsn
+
+    def connected(self):
+        return True
+
+
+class _jobs:
+    def __init__(self, busy):
+        self.busy = busy
+
+    def running_on(self, sql_conn):
+        if sql_conn.dsn in self.busy:
+            return SimpleNamespace(id = 7, conn = sql_conn)
+        return None
+
+
+def _app(dsns, busy):
+    return SimpleNamespace(
+            obj_list = [SimpleNamespace(conn = _conn(d)) for d in dsns],
+            jobs = _jobs(busy))
+
+
+def test_fanout_skips_busy_connections(capsys):
+    my_app = _app(["a", "b", "c"], busy = ["b"])
+    assert [c.dsn for c in _fanout_conns(my_app, "*")] == ["a", "c"]
+    assert "Skipping b, busy with background job 7" in capsys.readouterr().err
+    assert [c.dsn for c in _fanout_conns(my_app, "a,b")] == ["a"]
+    with pytest.raises(CommandError):
+        _fanout_conns(my_app, "b")
+
+
+def test_interrupted_command_releases_its_conn():
+    conn = stubConn()
+    conn.hang = True
+    sql_conn = sqlConnection("b", conn = conn)
+
+    def wait():
+        # As if Ctrl-C was pressed while waiting on the statement
+        sql_conn.submit(sql_conn.execute, "select 1")
+        conn.executing.wait(5)
+        raise KeyboardInterrupt()
+    with pytest.raises(CommandError):
+        _interruptible(sql_conn, wait)
+    assert conn.cursors[0].cancelled.is_set()
+    sql_conn.submit(lambda: None).result(timeout = 5)
+    assert sql_conn.status == connStatus.IDLE
+    assert sql_conn.cursor is None
+    sql_conn.close()
@@ -0,0 +1,46 @@
+import os
+from datetime import date
+from decimal import Decimal
+from odbcli.spool import rowSpool
+
+
+def test_round_trip(tmp_path):
+    spool = rowSpool(str(tmp_path))
+    spool.append([(1, "a", Decimal("1.50")), (2, None, Decimal("0"))])
+    spool.append([])
+    spool.append([(3, "c", date(2024, 1, 31))])
+    assert spool.rows == 3
+    batches = list(spool.batches())
+    assert batches == [
+        [(1, "a", Decimal("1.50")), (2, None, Decimal("0"))],
+        [(3, "c", date(2024, 1, 31))]]
+    path = spool.path
+    spool.close()
+    assert not os.path.exists(path)
+
+
+def test_read_while_appending(tmp_path):
+    spool = rowSpool(str(tmp_path))
+    spool.append([(1, )])
+    it = spool.batches()
+    assert next(it) == [(1, )]
+    # Appended after the reader started: not part of this read
+    spool.append([(2, )])
+    assert list(it) == []
+    assert [r for b in spool.batches() for r in b] == [(1, ), (2, )]
+    spool.close()
+
+
+def test_random_access(tmp_path):
+    spool = rowSpool(str(tmp_path))
+    for b in range(10):
+        spool.append([(b * 7 + i, ) for i in range(7)])
+    assert spool.read(0, 3) == [(0, ), (1, ), (2, )]
+    assert spool.read(12, 16) == [(12, ), (13, ), (14, ), (15, )]
+    assert spool.read(65, 100) == [(i, ) for i in range(65, 70)]
+    assert spool.read(70, 80) == []
+    assert next(spool.batches(30)) == [(i, ) for i in range(30, 35)]
+    # Appending after reads remaps the file
+    spool.append([(70, )])
+    assert spool.read(69, 71) == [(69, ), (70, )]
+    spool.close()
@@ -0,0 +1,51 @@
+from collections import namedtuple
+from cli_helpers.tabular_output import TabularOutputFormatter
+from odbcli.tableformat import streamingTableFormatter
+import pytest
+
+Col = namedtuple("Col", "name type_code display_size internal_size precision scale null_ok")
+
+
+@pytest.mark.parametrize("format_name", ["psql", "grid", "simple", "plain"])
+def test_matches_cli_helpers_on_sample(format_name):
+    rows = [(1, None, "abc"), (22, "x", "de")]
+    cols = ["a", "b", "c"]
+    table = streamingTableFormatter(cols, rows, format_name = format_name)
+    expected = "\n".join(TabularOutputFormatter().format_output(
+        rows, cols, format_name = format_name))
+    assert table.format_page(rows) == expected
+
+
+def test_widths_fixed_across_pages():
+    table = streamingTableFormatter(["s"], [("abcd", )], max_col_width = 5)
+    first = table.format_page([("ab", )])
+    second = table.format_page([("a much longer value", )])
+    assert [len(l) for l in first.split("\n")] == \
+        [len(l) for l in second.split("\n")]
+    assert "| a m… |" in second
+
+
+def test_small_display_size_is_trusted():
+    desc = [Col("d", str, 10, 10, 0, 0, True)]
+    table = streamingTableFormatter(["d"], [("2020", )], desc)
+    assert table.widths == [10]
+    assert "2020-01-01" in table.format_page([("2020-01-01", )])
+
+
+def test_no_truncation_widens_column():
+    table = streamingTableFormatter(["s"], [("abcd", )], max_col_width = 0)
+    assert table.format_page([("ab", )]).split("\n")[1] == "| s    |"
+    second = table.format_page([("a much longer value", )])
+    assert "| a much longer value |" in second
+    assert len(set(len(l) for l in second.split("\n"))) == 1
+    # Stays that wide
+    assert table.widths == [19]
+    assert "| ab                  |" in table.format_page([("ab", )])
+
+
+def test_format_pages_fixes_widths_without_truncation():
+    from odbcli.conn import format_pages
+    pages = list(format_pages([[(11, "abcdef")], [(2, "x")]], ["a", "b"], "psql"))
+    assert [len(l) for l in pages[0].split("\n")] == \
+        [len(l) for l in pages[1].split("\n")]
+    assert "abcdef" in pages[0]
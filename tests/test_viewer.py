@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+from odbcli.conn import sqlConnection, connStatus
+from odbcli.viewer import resultsViewer
+from stubs import stubConn, stubApplication
+
+
+def _viewer(tmp_path, conn):
+    my_app = SimpleNamespace(
+            application = stubApplication(),
+            spool_dir = str(tmp_path),
+            preview_memory_pages = 2,
+            table_format = "psql",
+            max_column_width = 0,
+            show_results = False,
+            log_query = lambda sql_conn, kind: None)
+    return my_app, resultsViewer(my_app), sqlConnection("test", conn = conn)
+
+
+def _settle(sql_conn):
+    sql_conn.submit(lambda: None).result(timeout = 5)
+
+
+def test_pages_through_results(tmp_path):
+    conn = stubConn(results = {"q": (["a"], [(i, ) for i in range(50)])})
+    my_app, viewer, sql_conn = _viewer(tmp_path, conn)
+    viewer.run(sql_conn, "q")
+    my_app.application.run_tasks()
+    assert viewer.message.startswith("Rows 1-")
+    viewer.page(1)
+    my_app.application.run_tasks()
+    assert viewer.window.pos > 0
+    viewer.close()
+    _settle(sql_conn)
+    assert sql_conn.status == connStatus.IDLE
+    assert sql_conn.cursor is None
+    sql_conn.close()
+
+
+def test_error_is_shown(tmp_path):
+    conn = stubConn()
+
+    def drop(crsr, query):
+        raise RuntimeError("Connection reset by peer")
+    conn.on_execute = drop
+    my_app, viewer, sql_conn = _viewer(tmp_path, conn)
+    viewer.run(sql_conn, "q")
+    my_app.application.run_tasks()
+    assert viewer.message == "Query error"
+    assert "Connection reset by peer" in viewer.output_field.text
+    _settle(sql_conn)
+    assert sql_conn.status == connStatus.IDLE
+    assert sql_conn.cursor is None
+    sql_conn.close()
+
+
+def test_close_while_running(tmp_path):
+    conn = stubConn()
+    conn.hang = True
+    my_app, viewer, sql_conn = _viewer(tmp_path, conn)
+    viewer.run(sql_conn, "q")
+
+    async def close():
+        while not conn.executing.is_set():
+            await asyncio.sleep(0.01)
+        viewer.close()
+    my_app.application.run_tasks(during = close)
+    # Cancelled, rather than waited for
+    assert conn.cursors[0].cancelled.is_set()
+    assert not my_app.show_results
+    _settle(sql_conn)
+    assert sql_conn.status == connStatus.IDLE
+    assert sql_conn.cursor is None
+    sql_conn.close()
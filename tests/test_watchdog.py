@@ -0,0 +1,39 @@
+from threading import Event
+from odbcli.watchdog import watchdog
+
+
+def test_fires_after_deadline():
+    wd = watchdog()
+    fired = Event()
+    wd.arm(0.05, fired.set)
+    assert fired.wait(timeout = 5)
+
+
+def test_disarmed_timer_does_not_fire():
+    wd = watchdog()
+    fired = Event()
+    later = Event()
+    handle = wd.arm(0.05, fired.set)
+    assert wd.disarm(handle)
+    # A later timer firing means the disarmed one was skipped
+    wd.arm(0.1, later.set)
+    assert later.wait(timeout = 5)
+    assert not fired.is_set()
+
+
+def test_fires_in_deadline_order():
+    wd = watchdog()
+    order = []
+    done = Event()
+    wd.arm(0.15, lambda: (order.append("slow"), done.set()))
+    wd.arm(0.05, lambda: order.append("fast"))
+    assert done.wait(timeout = 5)
+    assert order == ["fast", "slow"]
+
+
+def test_disarm_after_firing():
+    wd = watchdog()
+    fired = Event()
+    handle = wd.arm(0, fired.set)
+    assert fired.wait(timeout = 5)
+    assert not wd.disarm(handle)
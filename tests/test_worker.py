@@ -0,0 +1,35 @@
+from threading import current_thread
+from odbcli.worker import connWorker
+import pytest
+
+
+def test_submit_runs_in_order_on_one_thread():
+    worker = connWorker(name = "test-worker")
+    seen = []
+    def work(i):
+        seen.append((i, current_thread().name))
+        return i * 2
+    futs = [worker.submit(work, i) for i in range(5)]
+    assert [f.result(timeout = 5) for f in futs] == [0, 2, 4, 6, 8]
+    assert [i for i, _ in seen] == list(range(5))
+    assert set(name for _, name in seen) == {"test-worker"}
+    worker.shutdown()
+
+
+def test_exception_propagates_to_future():
+    worker = connWorker()
+    def work():
+        raise ValueError("boom")
+    with pytest.raises(ValueError):
+        worker.submit(work).result(timeout = 5)
+    # Worker survives the failed work item
+    assert worker.submit(lambda: 1).result(timeout = 5) == 1
+    worker.shutdown()
+
+
+def test_restarts_after_shutdown():
+    worker = connWorker()
+    assert worker.submit(lambda: "a").result(timeout = 5) == "a"
+    worker.shutdown()
+    assert worker.submit(lambda: "b").result(timeout = 5) == "b"
+    worker.shutdown()
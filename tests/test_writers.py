@@ -0,0 +1,75 @@
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+from odbcli.writers import get_writer, check_format, tableWriter
+import pytest
+
+Col = namedtuple("Col", "name type_code display_size internal_size precision scale null_ok")
+
+
+def test_csv_writer():
+    out = StringIO()
+    writer = get_writer("csv", out, ["a", "b"])
+    writer.write_header()
+    writer.write_rows([(1, "x,y"), (2, None)])
+    writer.close()
+    assert out.getvalue() == 'a,b\n1,"x,y"\n2,\n'
+    assert writer.rows_written == 2
+
+
+def test_jsonl_writer():
+    out = StringIO()
+    writer = get_writer("jsonl", out, ["a", "d", "n"])
+    writer.write_rows([(1, date(2020, 1, 2), Decimal("1.50"))])
+    assert out.getvalue() == '{"a": 1, "d": "2020-01-02", "n": "1.50"}\n'
+
+
+def test_table_format_fallback():
+    writer = get_writer("psql", StringIO(), ["a"])
+    assert isinstance(writer, tableWriter)
+    with pytest.raises(ValueError):
+        get_writer("no-such-format", StringIO(), ["a"])
+    check_format("psql")
+    check_format("jsonl")
+    with pytest.raises(ValueError):
+        check_format("no-such-format")
+
+
+def test_parquet_writer_types():
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = BytesIO()
+    desc = [
+        Col("i", int, 10, 10, 10, 0, True),
+        Col("n", Decimal, 10, 10, 10, 2, True),
+        Col("s", None, 10, 10, 0, 0, True)]
+    writer = get_writer("parquet", out, ["i", "n", "s"], desc)
+    writer.write_rows([(1, Decimal("1.25"), "a"), (None, None, None)])
+    writer.write_rows([(3, Decimal("3.00"), "c")])
+    writer.close()
+    out.seek(0)
+    table = pq.read_table(out)
+    assert table.num_rows == 3
+    assert str(table.schema.field("i").type) == "int64"
+    assert str(table.schema.field("n").type) == "decimal128(10, 2)"
+    assert str(table.schema.field("s").type) == "string"
+
+
+def test_parquet_writer_null_first_batch():
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = BytesIO()
+    desc = [
+        Col("i", int, 10, 10, 10, 0, True),
+        Col("u", None, 10, 10, 0, 0, True),
+        Col("n", Decimal, 0, 0, 0, 0, True)]
+    writer = get_writer("parquet", out, ["i", "u", "n"], desc)
+    writer.write_rows([(None, None, None)] * 2)
+    writer.write_rows([(1, 2, Decimal("1.5")), (2, date(2020, 1, 2), Decimal("10.25"))])
+    writer.close()
+    out.seek(0)
+    table = pq.read_table(out)
+    assert table.num_rows == 4
+    assert str(table.schema.field("i").type) == "int64"
+    # Not described usably: written as strings, whatever turns up later
+    assert table.column("u").to_pylist() == [None, None, "2", "2020-01-02"]
+    assert table.column("n").to_pylist() == [None, None, "1.5", "10.25"]